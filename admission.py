@@ -0,0 +1,106 @@
+import os
+import time
+import itertools
+import threading
+
+import metrics
+
+# =============================
+# Admission Control
+# =============================
+# Report generation holds a Streamlit script thread for up to a minute. Each
+# replica runs at most MAX_ACTIVE_CONSULTATIONS of them at once; further
+# sessions get a ticket and a waiting view that polls for its turn, so script
+# threads stay free for cheap reruns (calculators, analytics, navigation).
+#
+# Waiting tickets are served fairly per client: each client's tickets queue
+# in order, and clients take turns, so one user with several tabs can't push
+# everyone else back. A client is its network address (client_key): every
+# tab has its own session and usually its own random profile id, but tabs
+# share the address. Tickets whose session stops polling expire after
+# TICKET_TTL seconds; admitted ones are reclaimed after ACTIVE_TTL in case a
+# script thread died without releasing its slot.
+
+MAX_ACTIVE_CONSULTATIONS = int(os.getenv("MAX_ACTIVE_CONSULTATIONS", "8"))
+ADMISSION_POLL_SECONDS = float(os.getenv("ADMISSION_POLL_SECONDS", "2"))
+TICKET_TTL = ADMISSION_POLL_SECONDS * 5
+ACTIVE_TTL = 300
+
+
+def client_key(forwarded_for, ip_address, fallback):
+    """Fairness key for a session: its address as seen by the load balancer, else its own
+
+    The load balancer appends the address it saw to X-Forwarded-For; earlier
+    entries come from the client and may be forged. Without either address
+    (local development) each fallback, e.g. a profile id, is its own client.
+    """
+    if forwarded_for:
+        address = forwarded_for.split(",")[-1].strip()
+        if address:
+            return f"ip:{address}"
+    if ip_address:
+        return f"ip:{ip_address}"
+    return f"id:{fallback}"
+
+
+class AdmissionControl:
+    def __init__(self, capacity=MAX_ACTIVE_CONSULTATIONS):
+        self.capacity = capacity
+        self.active = {}  # ticket -> (client, admitted_at)
+        self.waiting = {}  # ticket -> {"client", "seq", "queued_at", "seen_at"}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for ticket in [t for t, w in self.waiting.items() if now - w["seen_at"] > TICKET_TTL]:
+            del self.waiting[ticket]
+            metrics.inc("admission_decisions_total", result="abandoned")
+        for ticket in [t for t, (_, at) in self.active.items() if now - at > ACTIVE_TTL]:
+            del self.active[ticket]
+            metrics.inc("admission_decisions_total", result="reclaimed")
+
+    def _order(self):
+        """Waiting tickets in service order: clients take turns, each in arrival order
+
+        A client's running consultations count as turns already taken.
+        """
+        running = {}
+        for client, _ in self.active.values():
+            running[client] = running.get(client, 0) + 1
+        turns = {}
+        ranked = []
+        for ticket, entry in sorted(self.waiting.items(), key=lambda item: item[1]["seq"]):
+            client = entry["client"]
+            turn = turns.get(client, running.get(client, 0))
+            turns[client] = turn + 1
+            ranked.append((turn, entry["seq"], ticket))
+        return [ticket for _, _, ticket in sorted(ranked)]
+
+    def enter(self, client, ticket):
+        """0 once the ticket may run, otherwise its 1-based place in line; call again to keep it"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if ticket in self.active:
+                return 0
+            entry = self.waiting.setdefault(ticket, {"client": client, "seq": next(self._seq), "queued_at": now})
+            entry["seen_at"] = now
+            position = self._order().index(ticket)
+            if position < self.capacity - len(self.active):
+                del self.waiting[ticket]
+                self.active[ticket] = (client, now)
+                metrics.inc("admission_decisions_total", result="admitted" if now == entry["queued_at"] else "admitted_after_wait")
+                metrics.observe("admission_wait_seconds", now - entry["queued_at"])
+                return 0
+            if now == entry["queued_at"]:
+                metrics.inc("admission_decisions_total", result="queued")
+            return position + 1
+
+    def leave(self, ticket):
+        with self._lock:
+            self.active.pop(ticket, None)
+            self.waiting.pop(ticket, None)
+
+    def snapshot(self):
+        with self._lock:
+            return {"capacity": self.capacity, "active": len(self.active), "waiting": len(self.waiting)}
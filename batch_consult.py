@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import metrics
+from consultation import GroqError, request_report, parse_report_sections, generate_report_download
+
+# =============================
+# Offline Batch Consultations
+# =============================
+# Runs the consultation pipeline (get_specialty_prompt -> Groq -> report)
+# headlessly over a JSONL file of cases:
+#
+#   {"id": "case-1", "specialty": "Physician", "problem": "...", "answers": ["...", "..."]}
+#
+# Reports are streamed to an output JSONL as they complete. The output file
+# doubles as the checkpoint: on restart, cases whose id already has a
+# successful result are skipped, so an interrupted overnight run resumes
+# where it stopped.
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads (requests per minute)"""
+
+    def __init__(self, per_minute, burst=1):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) * self.interval
+            time.sleep(wait_for)
+
+    def pause(self, seconds):
+        """Hold every worker back, e.g. after a 429 with Retry-After"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0) - seconds / self.interval if self.interval else self.tokens
+
+
+def read_cases(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                case = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number}: invalid JSON ({e})", file=sys.stderr)
+                continue
+            case.setdefault("id", f"line-{line_number}")
+            case["id"] = str(case["id"])
+            yield case
+
+
+def load_checkpoint(path, retry_errors=False):
+    """Ids already present in the output file (only successful ones when retry_errors is set)"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interruption
+            if not retry_errors or result.get("status") == "ok":
+                done.add(str(result.get("id")))
+    return done
+
+
+def run_case(case, api_key, limiter, max_retries):
+    """Run one consultation with retries; returns the structured result dict"""
+    specialty = case.get("specialty") or "General"
+    problem = case.get("problem") or ""
+    answers = case.get("answers") or []
+    result = {"id": case["id"], "specialty": specialty, "problem": problem, "answers": answers}
+
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        limiter.acquire()
+        try:
+            report = request_report(api_key, specialty, case.get("user_data") or {}, problem, answers, priority="batch")
+            break
+        except GroqError as e:
+            retryable = e.status is None or e.status in RETRYABLE_STATUS
+            if not retryable or attempt > max_retries:
+                result.update(status="error", error=str(e), http_status=e.status, attempts=attempt,
+                              latency_s=round(time.monotonic() - start, 3))
+                return result
+            delay = e.retry_after if e.retry_after is not None else min(60.0, 2 ** attempt) * (0.5 + random.random())
+            if e.status == 429:
+                limiter.pause(delay)
+            metrics.inc("llm_retries_total", kind="report", status=str(e.status))
+            time.sleep(delay)
+
+    report_text, filename = generate_report_download(report, specialty)
+    result.update(
+        status="ok",
+        attempts=attempt,
+        latency_s=round(time.monotonic() - start, 3),
+        report=report,
+        sections=[{"title": title, "content": content} for title, content in parse_report_sections(report)],
+        report_text=report_text,
+        filename=filename
+    )
+    return result
+
+
+def run_batch(input_path, output_path, api_key, concurrency=4, per_minute=30, max_retries=5, retry_errors=False, limit=None):
+    done = load_checkpoint(output_path, retry_errors=retry_errors)
+    limiter = RateLimiter(per_minute, burst=concurrency)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    started = time.monotonic()
+
+    # Make sure appended results start on a fresh line after an interrupted write
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if needs_newline:
+            out.write("\n")
+
+        def write(result):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[result["status"]] += 1
+            total = counts["ok"] + counts["error"]
+            rate = total / max(time.monotonic() - started, 1e-9) * 60
+            print(f"\r{total} done ({counts['error']} errors, {counts['skipped']} skipped)  {rate:.1f}/min", end="", file=sys.stderr, flush=True)
+
+        # Only a bounded number of cases is in flight, so huge inputs are never held in memory
+        pending = set()
+        submitted = 0
+        for case in read_cases(input_path):
+            if case["id"] in done:
+                counts["skipped"] += 1
+                continue
+            if limit is not None and submitted >= limit:
+                break
+            pending.add(pool.submit(run_case, case, api_key, limiter, max_retries))
+            submitted += 1
+            if len(pending) >= concurrency * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+        for future in pending:
+            write(future.result())
+
+    print(file=sys.stderr)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run consultations from a JSONL case file and write structured reports to JSONL.")
+    parser.add_argument("input", help="JSONL file with one case per line (id, specialty, problem, answers)")
+    parser.add_argument("output", help="JSONL file to append reports to; also used as the resume checkpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum simultaneous Groq requests")
+    parser.add_argument("--rpm", type=float, default=30, help="Request rate limit per minute (0 disables)")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries for timeouts, 429 and 5xx responses")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-run cases whose previous result was an error")
+    parser.add_argument("--limit", type=int, help="Stop after this many new cases")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GROQ_API_KEY", "")
+    if not api_key:
+        parser.error("GROQ_API_KEY environment variable is not set")
+    metrics.start_exporters()
+
+    try:
+        counts = run_batch(
+            args.input, args.output, api_key,
+            concurrency=args.concurrency,
+            per_minute=args.rpm,
+            max_retries=args.max_retries,
+            retry_errors=args.retry_errors,
+            limit=args.limit
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun the same command to resume.", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if metrics.METRICS_FILE:
+            metrics.dump_to_file(metrics.METRICS_FILE)
+    print(f"Finished: {counts['ok']} ok, {counts['error']} errors, {counts['skipped']} already done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+# =============================
+# End-to-end Consultation Benchmark
+# =============================
+# Drives full user journeys through bot.py with Streamlit's AppTest against
+# a local mock Groq server (mock_groq.py, run as a separate process so its
+# CPU is not counted against the app):
+#
+#   consultation: home -> checkups -> specialty -> problem -> up to 3 answers -> report -> download
+#   lab:          home -> lab -> BMI -> body fat -> calories -> analytics
+#
+# Per-step wall time and server CPU, LLM calls per consultation and
+# p50/p95/p99 are written as JSON. With --budget, the run exits non-zero
+# when any configured limit is exceeded:
+#
+#   python bench_consultation.py --iterations 20 --output bench_results.json --budget bench_budget.json
+#
+# To benchmark against real Groq latencies offline, record a --live run once
+# (no mock: requests go to GROQ_URL, Groq itself by default, with
+# GROQ_API_KEY) and replay it with the same --iterations, so the requests
+# match the recording:
+#
+#   GROQ_TRANSPORT=record GROQ_FIXTURES=fixtures/bench.jsonl python bench_consultation.py --live --iterations 5
+#   python bench_consultation.py --iterations 5 --replay fixtures/bench.jsonl --replay-speed 1
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+MOCK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_groq.py")
+
+SPECIALTIES = ["Physician", "Nutritionist", "Mental Health", "Orthopedic", "Dentist"]
+PROBLEM = "I've been experiencing persistent headaches for the past week, especially in the afternoons."
+ANSWERS = ["About a week, mostly afternoons", "Screens and skipping lunch make it worse", "No other medications"]
+
+
+class Recorder:
+    """Collects wall time and process CPU for each named step of a journey"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def step(self, name, action):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = action()
+        self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+        return result
+
+    def add(self, name, wall, cpu):
+        entry = self.samples.setdefault(name, {"wall": [], "cpu": []})
+        entry["wall"].append(wall)
+        entry["cpu"].append(cpu)
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {}
+    return {
+        "count": int(len(values)),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max())
+    }
+
+
+def check(at, step):
+    if at.exception:
+        raise RuntimeError(f"{step}: app raised {at.exception[0].message}")
+    return at
+
+
+# =============================
+# Journeys
+# =============================
+def consultation_journey(rec, specialty, timeout, problem=PROBLEM):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    rec.step("consultation.home", lambda: check(at.run(), "home"))
+    rec.step("consultation.open_checkups", lambda: check(at.button(key="checkups_btn").click().run(), "open_checkups"))
+    rec.step("consultation.select_specialty", lambda: check(at.button(key=f"spec_{specialty}").click().run(), "select_specialty"))
+    # Entering the problem triggers the first follow-up question
+    rec.step("consultation.problem", lambda: check(at.text_area[0].input(problem).run(), "problem"))
+    for i, answer in enumerate(ANSWERS):
+        # Adaptive questioning may move on to the report before every answer is used
+        if not any(widget.key == f"q_{i}" for widget in at.text_input):
+            break
+        at.text_input(key=f"q_{i}").input(answer)
+        # The last answer triggers report generation
+        rec.step(f"consultation.answer_{i + 1}", lambda i=i: check(at.button(key=f"submit_{i}").click().run(), f"answer_{i + 1}"))
+
+    def download():
+        # Imported late: AppTest shares this process's modules, and consultation
+        # reads GROQ_URL on import, after run_benchmark has pointed it at the mock
+        from consultation import generate_report_download
+        if not at.get("download_button"):
+            raise RuntimeError("download: report download button missing")
+        report_text, _ = generate_report_download(at.session_state.ai_report, specialty)
+        if not report_text.strip():
+            raise RuntimeError("download: empty report file")
+
+    rec.step("consultation.download", download)
+    if at.session_state.ai_report in (None, "API Error"):
+        raise RuntimeError("report: no report was generated")
+
+
+def lab_journey(rec, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    rec.step("lab.home", lambda: check(at.run(), "home"))
+    rec.step("lab.open_lab", lambda: check(at.button(key="lab_btn").click().run(), "open_lab"))
+    rec.step("lab.bmi", lambda: check(at.button(key="bmi_calc").click().run(), "bmi"))
+    rec.step("lab.body_fat", lambda: check(at.button(key="bf_calc").click().run(), "body_fat"))
+    rec.step("lab.calories", lambda: check(at.button(key="cal_calc").click().run(), "calories"))
+    rec.step("lab.analytics_monthly", lambda: check(at.radio(key="analytics_period").set_value("Monthly").run(), "analytics"))
+
+
+# =============================
+# Mock server process
+# =============================
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(latency, port):
+    proc = subprocess.Popen(
+        [sys.executable, MOCK_PATH, "--port", str(port), "--latency", latency],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            mock_stats(port)
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("mock Groq server did not start")
+
+
+def mock_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=2) as r:
+        return json.load(r)["stats"]
+
+
+# =============================
+# Budgets
+# =============================
+def check_budget(results, budget):
+    """Compare results with a budget such as
+
+    {"consultation.total": {"p95": 3.0}, "lab.bmi.cpu": {"p50": 0.2}, "llm_calls_per_consultation": {"max": 4}}
+
+    Step names refer to wall time; append ".cpu" for server CPU. Returns a list of failures.
+    """
+    measurements = dict(results["journeys"])
+    measurements["llm_calls_per_consultation"] = results["llm_calls_per_consultation"]
+    for name, step in results["steps"].items():
+        measurements[name] = step["wall"]
+        measurements[f"{name}.cpu"] = step["cpu"]
+
+    failures = []
+    for name, limits in budget.items():
+        for stat, limit in limits.items():
+            value = measurements.get(name, {}).get(stat)
+            if value is None:
+                failures.append(f"{name}.{stat}: no measurement")
+            elif value > limit:
+                failures.append(f"{name}.{stat} = {value:.3f} exceeds budget {limit}")
+    return failures
+
+
+def llm_call_count(port):
+    if port is None:
+        # Live or replaying: AppTest runs bot.py in this process, so ask its transport
+        import consultation
+        return consultation._transport.served
+    return mock_stats(port)["requests"]
+
+
+def run_benchmark(iterations, latency, timeout, specialties=SPECIALTIES, replay=None, replay_speed=1.0, live=False):
+    port = mock = None
+    if replay:
+        # Recorded Groq traffic (GROQ_TRANSPORT=record) stands in for the mock
+        os.environ.update(GROQ_TRANSPORT="replay", GROQ_FIXTURES=replay, GROQ_REPLAY_SPEED=str(replay_speed))
+    elif live:
+        # The real endpoint (GROQ_URL, Groq by default) and key, usually with GROQ_TRANSPORT=record
+        api_key = os.environ.get("BENCH_GROQ_API_KEY") or os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            raise RuntimeError("--live needs GROQ_API_KEY (or BENCH_GROQ_API_KEY)")
+        os.environ["GROQ_API_KEY"] = api_key
+    else:
+        port = free_port()
+        mock = start_mock(latency, port)
+        os.environ["GROQ_URL"] = f"http://127.0.0.1:{port}/openai/v1/chat/completions"
+    if not live:
+        # The mock and replays only need some key to be set
+        os.environ["GROQ_API_KEY"] = os.environ.get("BENCH_GROQ_API_KEY", "bench-key")
+    data_dir = tempfile.mkdtemp(prefix="bench_health_")
+    os.environ.update(
+        HEALTH_DB_PATH=os.path.join(data_dir, "health.db"),
+        HISTORY_DB_PATH=os.path.join(data_dir, "history.db"),
+        SHARED_CACHE_PATH=os.path.join(data_dir, "cache.db"),
+        SIMILAR_DB_PATH=os.path.join(data_dir, "similar.db"),
+        NEAR_DUPLICATE_THRESHOLD="2",
+        # Three answers per journey so step budgets stay comparable; ADAPTIVE_QUESTIONS=1 measures early stopping
+        ADAPTIVE_QUESTIONS=os.environ.get("ADAPTIVE_QUESTIONS", "0")
+    )
+    rec = Recorder()
+    journeys = {"consultation.total": [], "lab.total": []}
+    llm_calls = []
+    errors = []
+    try:
+        # One untimed warm-up pass so imports and caches don't skew the first sample
+        consultation_journey(Recorder(), specialties[0], timeout, f"{PROBLEM} (warm-up)")
+        lab_journey(Recorder(), timeout)
+
+        for i in range(iterations):
+            specialty = specialties[i % len(specialties)]
+            before = llm_call_count(port)
+            start = time.perf_counter()
+            try:
+                # A distinct problem per iteration so LLM calls miss the shared cache
+                # (near-duplicate reuse is switched off in run_benchmark)
+                consultation_journey(rec, specialty, timeout, f"{PROBLEM} (case {i})")
+                journeys["consultation.total"].append(time.perf_counter() - start)
+                llm_calls.append(llm_call_count(port) - before)
+            except Exception as e:
+                errors.append(f"consultation[{specialty}]: {e}")
+
+            start = time.perf_counter()
+            try:
+                lab_journey(rec, timeout)
+                journeys["lab.total"].append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(f"lab: {e}")
+            print(f"\riteration {i + 1}/{iterations}", end="", file=sys.stderr, flush=True)
+        print(file=sys.stderr)
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    return {
+        "iterations": iterations,
+        "mock_latency": f"replay:{replay}@{replay_speed}x" if replay else "live" if live else latency,
+        "steps": {
+            name: {"wall": percentiles(s["wall"]), "cpu": percentiles(s["cpu"])}
+            for name, s in rec.samples.items()
+        },
+        "journeys": {name: percentiles(values) for name, values in journeys.items()},
+        "llm_calls_per_consultation": percentiles(llm_calls),
+        "errors": errors
+    }
+
+
+def print_table(results):
+    print(f"{'step':34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'cpu p50':>9}")
+    for name, s in list(results["steps"].items()) + [(n, {"wall": j, "cpu": {}}) for n, j in results["journeys"].items()]:
+        wall, cpu = s["wall"], s["cpu"]
+        if not wall:
+            continue
+        cpu_p50 = f"{cpu['p50'] * 1000:9.1f}" if cpu else f"{'':>9}"
+        print(f"{name:34} {wall['p50'] * 1000:9.1f} {wall['p95'] * 1000:9.1f} {wall['p99'] * 1000:9.1f} {cpu_p50}")
+    calls = results["llm_calls_per_consultation"]
+    if calls:
+        print(f"LLM calls per consultation: mean {calls['mean']:.2f}, max {calls['max']:.0f}")
+    for error in results["errors"]:
+        print(f"ERROR {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full consultation and lab journeys against a mock, live or replayed LLM.")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--latency", default="fixed:0.05", help="Mock LLM latency distribution (see mock_groq.py)")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-rerun AppTest timeout in seconds")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--budget", help="JSON regression budget; exit 1 when any limit is exceeded")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--live", action="store_true", help="Call GROQ_URL (Groq by default) with GROQ_API_KEY instead of the mock; combine with GROQ_TRANSPORT=record")
+    source.add_argument("--replay", help="Replay a Groq fixture file (recorded with GROQ_TRANSPORT=record) instead of the mock")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Replay pace: 1 = recorded timings, 0 = instant")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.iterations, args.latency, args.timeout, replay=args.replay, replay_speed=args.replay_speed, live=args.live)
+    failures = []
+    if args.budget:
+        with open(args.budget, encoding="utf-8") as f:
+            failures = check_budget(results, json.load(f))
+    results["budget_failures"] = failures
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(f"BUDGET EXCEEDED {failure}")
+    if failures or results["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,49 @@
 import streamlit as st
-import requests
-import re
 import datetime
 import math
 import time
-import random
+import uuid
 import pandas as pd
 import altair as alt
 import os
+import hmac
+
+from consultation import (
+    GroqError, REPORT_MAX_TOKENS, REPORT_TIMEOUT, request_report,
+    get_specialty_prompt, request_follow_up, fallback_question,
+    ADAPTIVE_QUESTIONS, MAX_FOLLOW_UP_QUESTIONS,
+    groq_chat, generate_report_download, problem_fingerprint,
+    report_html, REPORT_HTML_VERSION
+)
+from health_store import HealthStore
+from consultation_history import ConsultationHistory
+from downsampling import CHART_POINT_BUDGET, lttb, bucket_aggregate
+from health_import import import_export, ImportFormatError
+from health_stats import generate_insights
+from token_budget import TokenGovernor, BudgetExceeded
+from admission import AdmissionControl, ADMISSION_POLL_SECONDS, client_key
+from shared_cache import create_cache, make_key
+from similar_reports import SimilarityIndex, consultation_text, refresh_in_background
+from report_chat import (
+    CHAT_WINDOW_MESSAGES, CHAT_FOLD_BATCH, CHAT_DISPLAY_MESSAGES,
+    report_digest, request_chat_reply, fold_summary
+)
+import metrics
+import profiling
+import warmup
+
+# Per-page rerun timing; exporters start once per process when metrics are enabled
+rerun_started = metrics.start_rerun()
+metrics.start_exporters()
+
+# Admin-only diagnostics are unlocked with ?admin=<ADMIN_TOKEN>; an admin can
+# then profile their own reruns with ?profile=1 (PROFILE_RERUNS=1 profiles all)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+is_admin = bool(ADMIN_TOKEN) and hmac.compare_digest(st.query_params.get("admin", ""), ADMIN_TOKEN)
+profiling.start(
+    st.session_state.get("current_page", "home"),
+    enabled=profiling.PROFILE_RERUNS or (is_admin and st.query_params.get("profile") == "1")
+)
 
 # Set page configuration
 st.set_page_config(
@@ -20,111 +56,47 @@ st.set_page_config(
 # =============================
 # Custom CSS for Animations and Styling
 # =============================
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Montserrat:wght@400;500;600;700&display=swap');
-
-:root {
-    --primary: #2563eb;
-    --secondary: #0ea5e9;
-    --accent: #8b5cf6;
-    --success: #10b981;
-    --warning: #f59e0b;
-    --danger: #ef4444;
-    --dark: #1e293b;
-    --light: #f8fafc;
-}
-
-* {
-    font-family: 'Montserrat', sans-serif;
-}
-
-.stApp {
-    background: linear-gradient(135deg, #f0f9ff 0%, #e0f2fe 100%);
-}
-
-/* Style for calculator result containers */
-[data-testid="stVerticalBlock"] {
-    background-color: var(--light);
-    border-radius: 16px;
-    padding: 1rem;
-}
-
-/* Style for text within the result containers, avoiding buttons */
-[data-testid="stVerticalBlock"] [data-testid="stMarkdownContainer"] p,
-[data-testid="stVerticalBlock"] [data-testid="stMarkdownContainer"] li,
-[data-testid="stVerticalBlock"] [data-testid="stMarkdownContainer"] h3 {
-    color: var(--dark) !important;
-}
-
-[data-testid="stMetricValue"] {
-    color: var(--dark) !important;
-}
-[data-testid="stMetricLabel"] {
-    color: var(--dark) !important;
-}
-
-/* Header styling */
-h1, h2, h3, h4, h5, h6 {
-    color: var(--dark) !important;
-}
-
-/* Modern Streamlit button styling (scoped to Streamlit buttons only) */
-.stButton > button,
-.stDownloadButton > button {
-    background: var(--primary) !important;
-    color: #ffffff !important;
-    border: none !important;
-    border-radius: 10px !important;
-    padding: 0.6rem 1.1rem !important;
-}
-
-.card h3 {
-    color: var(--primary) !important;
-    margin-top: 0;
-}
-
-.card-icon {
-    font-size: 2.5rem;
-    margin-bottom: 16px;
-    color: var(--primary);
-}
-
-/* Fix for follow-up question text color */
-.stTextInput > label {
-    color: var(--dark) !important;
-    font-weight: 600 !important;
-}
-
-
-</style>
-""", unsafe_allow_html=True)
+# Theme colours and the font stack are set in .streamlit/config.toml;
+# the remaining rules live in static/theme.css, which the browser fetches once and
+# caches instead of receiving a <style> block on every rerun. The mtime query
+# string makes an edited stylesheet bypass the cached copy.
+THEME_CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "theme.css")
+THEME_CSS_URL = f"app/static/theme.css?v={int(os.path.getmtime(THEME_CSS_PATH))}"
+st.markdown(f'<link rel="stylesheet" href="{THEME_CSS_URL}">', unsafe_allow_html=True)
 
 # =============================
 # Configure Groq API
 # =============================
-try:
-    GROQ_API_KEY = st.secrets.get("GROQ_API_KEY", "")
-except Exception:
-    GROQ_API_KEY = ""
+@st.cache_resource(show_spinner=False)
+def resolve_groq_config():
+    """Resolve the key once per process and start the warm-up (no-op if serve.py already ran it)"""
+    api_key = warmup.resolve_api_key()
+    warmup.ensure_warm(api_key)
+    return api_key
 
-# Fallback to environment variable if not in Streamlit secrets
-if not GROQ_API_KEY:
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
-GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+GROQ_API_KEY = resolve_groq_config()
 
-# Proactive warning if key is missing
+# Proactive warning if key is missing or was rejected during warm-up
 if not GROQ_API_KEY:
     st.error("Groq API key not set. Please add GROQ_API_KEY to Streamlit secrets or environment variables.")
+elif warmup.key_rejected():
+    st.error("The configured Groq API key was rejected. Please check GROQ_API_KEY.")
 
 # =============================
 # SESSION STATE INIT
 # =============================
 # Handle app reset for a true one-click Main Menu experience
 if st.session_state.get("reset_app", False): 
+    # Keep the analytics profile so stored measurements stay linked to this user,
+    # and the session id so a reset doesn't also reset the token budget
+    user_id = st.session_state.get("user_id")
+    session_id = st.session_state.get("session_id")
     st.session_state.clear()
+    if user_id:
+        st.session_state.user_id = user_id
+    if session_id:
+        st.session_state.session_id = session_id
     # Reinitialize keys after clearing
     for key, val in {
         'current_page': 'home',
@@ -136,11 +108,22 @@ if st.session_state.get("reset_app", False):
         'problem': "",
         'chat_started': False,
         'ai_report': None,  # Store the final AI report
+        'consultation_id': None,  # History id once the report is saved
+        'report_match': None,  # Similarity when the report was reused from a near-duplicate
+        'problem_key': None,  # Fingerprint of the problem the questions were asked for
+        'consultation_steps': {},  # Questions, answers and reports by step key
         'in_checkups': False  # Track if we're in the checkups section
     }.items():
         st.session_state[key] = val
     st.session_state["reset_app"] = False
 
+def reset_report_chat():
+    """Forget the follow-up chat about the current report"""
+    st.session_state.chat_log = []  # [{"role", "content"}], capped at CHAT_DISPLAY_MESSAGES
+    st.session_state.chat_folded = 0  # messages at the start of chat_log already in chat_summary
+    st.session_state.chat_summary = ""
+    st.session_state.chat_digest = None
+
 # Handle fresh start for specialty (single-click reset)
 if st.session_state.get("trigger_fresh_start", False):
     specialty = st.session_state.get("specialty", "")
@@ -151,6 +134,13 @@ if st.session_state.get("trigger_fresh_start", False):
     st.session_state.questions = []
     st.session_state.problem = ""
     st.session_state.ai_report = None
+    st.session_state.consultation_id = None
+    st.session_state.report_match = None
+    st.session_state.skip_similar = False
+    st.session_state.problem_key = None
+    st.session_state.consultation_steps = {}
+    st.session_state.pop("consultation_started", None)
+    reset_report_chat()
     
     # Clear the trigger flag
     st.session_state["trigger_fresh_start"] = False
@@ -165,255 +155,483 @@ for key, val in {
     'problem': "",
     'chat_started': False,
     'ai_report': None,
+    'consultation_id': None,
+    'report_match': None,
+    'problem_key': None,
+    'consultation_steps': {},
     'in_checkups': False
 }.items():
     if key not in st.session_state:
         st.session_state[key] = val
 
+if "chat_log" not in st.session_state:
+    reset_report_chat()
+
+# Profile used to key stored health measurements (shareable via ?user=...)
+if "user_id" not in st.session_state:
+    st.session_state.user_id = st.query_params.get("user") or uuid.uuid4().hex[:12]
+
+# Key for this browser session's token budget
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # =============================
-# Enhanced Prompt Engineering
+# Health Measurement Store
 # =============================
-def get_specialty_prompt(specialty, user_data, problem, answers):
-    # Enhanced base instructions for detailed, professional responses
-    base_task = """
-    TASK:
-    As a healthcare professional, provide a comprehensive, personalized assessment based on the user's problem and answers. 
-    Your response MUST be structured with the following markdown headings and include the specified details:
-
-    ### 📝 Initial Assessment
-    - Provide a detailed clinical summary of the problem based on the user's input
-    - Include potential underlying causes and risk factors
-    - Mention relevant clinical observations based on the information provided
-
-    ### 💡 Professional Recommendations
-    - Offer 3-5 specific, evidence-based recommendations
-    - Include lifestyle modifications, home care, and preventive measures
-    - Provide clear rationales for each recommendation
-    - Use bullet points for readability
-
-    ### 💊 Comprehensive Management Plan
-    - Outline a step-by-step 4-week action plan with specific timelines
-    - Include dietary modifications, exercises, medications, or therapies as appropriate
-    - Specify monitoring parameters and follow-up schedule
-    - Provide detailed instructions for each phase of the plan
-
-    ### ⚠️ Critical Considerations
-    - List red flags that require immediate medical attention
-    - Include important contraindications or precautions
-    - Specify when to seek professional medical help
-    - Add a strong disclaimer that this is AI-generated advice and not a substitute for professional consultation
-    """
-
-    # Specialty-specific enhancements
-    if specialty == "Nutritionist":
-        return f"""
-        ROLE: Certified Clinical Nutritionist with 15+ years experience
-        HEALTH CONCERN: {problem}
-        ADDITIONAL INPUT: {answers}
-        
-        SPECIAL INSTRUCTIONS:
-        - Focus on evidence-based nutritional interventions
-        - Include specific food recommendations and meal timing
-        - Address micronutrient deficiencies if relevant
-        - Provide supplement recommendations with dosing guidelines
-        - Include metabolic considerations
-        
-        {base_task}
-        """
-    elif specialty == "Physician":
-        return f"""
-        ROLE: Board-Certified Physician with 20+ years clinical experience
-        PATIENT COMPLAINT: {problem}
-        RESPONSES: {answers}
-        
-        SPECIAL INSTRUCTIONS:
-        - Conduct a thorough differential diagnosis
-        - Discuss both pharmacological and non-pharmacological approaches
-        - Include diagnostic considerations and potential tests
-        - Address comorbidities and polypharmacy risks
-        - Provide detailed medication guidance including dosing and side effects
-        
-        {base_task}
-        """
-    elif specialty == "Mental Health":
-        return f"""
-        ROLE: Licensed Clinical Psychologist specializing in cognitive-behavioral therapy
-        CONCERN: {problem}
-        RESPONSES: {answers}
-        
-        SPECIAL INSTRUCTIONS:
-        - Include cognitive restructuring techniques
-        - Provide specific mindfulness exercises
-        - Outline behavioral activation strategies
-        - Address coping mechanisms for acute distress
-        - Include therapeutic homework assignments
-        
-        {base_task}
-        """
-    elif specialty == "Orthopedic":
-        return f"""
-        ROLE: Senior Orthopedic Surgeon specializing in sports medicine
-        COMPLAINT: {problem}
-        RESPONSES: {answers}
-        
-        SPECIAL INSTRUCTIONS:
-        - Provide detailed rehabilitation protocols
-        - Include specific exercises with proper form instructions
-        - Discuss surgical and non-surgical options
-        - Address pain management strategies
-        - Include return-to-activity guidelines
-        
-        {base_task}
-        """
-    elif specialty == "Dentist":
-        return f"""
-        ROLE: Prosthodontist with expertise in restorative dentistry
-        DENTAL ISSUE: {problem}
-        RESPONSES: {answers}
-        
-        SPECIAL INSTRUCTIONS:
-        - Provide detailed oral hygiene protocols
-        - Include specific techniques for brushing and flossing
-        - Discuss preventive strategies for common dental issues
-        - Address pain management and emergency care
-        - Include professional treatment options with timelines
-        
-        {base_task}
-        """
-    return f"""
-    ROLE: Senior Healthcare Consultant
-    ISSUE: {problem}
-    ANSWERS: {answers}
+@st.cache_resource
+def get_health_store():
+    return HealthStore()
+
+def record_measurements(values):
+    """Append calculator results for the current profile to the analytics store"""
+    try:
+        store = get_health_store()
+        now = datetime.datetime.now()
+        with metrics.timer("measurement_write_seconds"):
+            for metric, value in values.items():
+                store.add_measurement(st.session_state.user_id, metric, value, ts=now)
+    except Exception as e:
+        st.warning(f"Could not save measurement to your health history: {str(e)}")
+
+@st.cache_resource
+def get_shared_cache():
+    return create_cache()
+
+def load_trend(user_id, metric, resolution, start=None, bars=False):
+    """Load a metric series for charting, capped at CHART_POINT_BUDGET points"""
+    # Shared across replicas; the store version changes whenever readings are added
+    key = make_key("trend", user_id, metric, resolution, start, bars, get_health_store().version(user_id, metric))
+    return get_shared_cache().get_or_compute(key, lambda: build_trend(user_id, metric, resolution, start, bars), ttl=24 * 3600)
+
+def build_trend(user_id, metric, resolution, start=None, bars=False):
+    store = get_health_store()
+    if resolution == "raw":
+        points = store.get_measurements(user_id, metric, start=start)
+        x = [ts.timestamp() for ts, _ in points]
+        y = [value for _, value in points]
+        counts = None
+    else:
+        rollups = store.get_rollups(user_id, metric, resolution, start=start)
+        x = [pd.Timestamp(r["bucket"]).timestamp() for r in rollups]
+        y = [r["mean"] for r in rollups]
+        counts = [r["count"] for r in rollups]
     
-    SPECIAL INSTRUCTIONS:
-    - Provide comprehensive health guidance
-    - Address both acute and chronic aspects
-    - Include holistic approaches
-    - Focus on preventive strategies
+    if len(x) > CHART_POINT_BUDGET:
+        # Readings per point no longer apply once points are merged or dropped
+        counts = None
+        x, y = bucket_aggregate(x, y) if bars else lttb(x, y)
     
-    {base_task}
-    """
+    frame = pd.DataFrame({
+        "Date": pd.to_datetime(list(x), unit="s"),
+        "Value": [round(v, 1) for v in y]
+    })
+    if counts is not None:
+        frame["Readings"] = counts
+    return frame
 
 # =============================
-# Dynamic Question Generation
+# Token Budget
 # =============================
-def generate_follow_up_question(specialty, problem, previous_answers, question_number):
-    """Generate a relevant follow-up question using LLM based on the problem and specialty"""
-    prompt = f"""
-    You are a {specialty} assistant. A patient has described their problem as: "{problem}"
-    
-    Previous answers given: {previous_answers if previous_answers else "None yet"}
-    
-    Generate ONE specific, relevant follow-up question (question #{question_number}) that would help you better understand their condition and provide better advice. 
-    
-    The question must be:
-    - Very short (around 6-7 words).
-    - A single line.
-    - Directly related to their problem.
-    - Professional and empathetic.
-    - Specific to your specialty area.
+@st.cache_resource
+def get_token_governor():
+    return TokenGovernor()
+
+def session_budget():
+    return get_token_governor().scope(st.session_state.session_id)
+
+def render_budget_caption():
+    """Show how much of the hourly token budget this session has left"""
+    remaining = session_budget().remaining()
+    governor = get_token_governor()
+    if remaining["session"] is not None:
+        share = remaining["session"] / governor.session_limit
+        st.caption(f"🔋 Consultation budget: {share:.0%} left this hour")
+    if remaining["global"] is not None and remaining["global"] < governor.global_limit * 0.1:
+        st.caption("⏳ The service is busy; responses may be shorter or slower than usual.")
+
+# =============================
+# Admission Control
+# =============================
+@st.cache_resource
+def get_admission():
+    return AdmissionControl()
+
+def admit_report_generation():
+    """True when this session may generate its report now; otherwise it keeps its place in line"""
+    if "admission_ticket" not in st.session_state:
+        st.session_state.admission_ticket = uuid.uuid4().hex
+    client = client_key(st.context.headers.get("X-Forwarded-For"), st.context.ip_address, st.session_state.user_id)
+    position = get_admission().enter(client, st.session_state.admission_ticket)
+    st.session_state.queue_position = position
+    return position == 0
+
+def release_admission():
+    ticket = st.session_state.pop("admission_ticket", None)
+    if ticket:
+        get_admission().leave(ticket)
+
+@st.fragment(run_every=ADMISSION_POLL_SECONDS)
+def render_waiting_room():
+    """Queue position, refreshed by polling only this fragment; a full rerun starts the report"""
+    if admit_report_generation():
+        st.rerun()
+    st.info(
+        f"⏳ Many patients are being assessed right now. You are number {st.session_state.queue_position} in line; "
+        "your assessment will start automatically. The Medical Lab stays available in the meantime."
+    )
+
+# =============================
+# Report Display
+# =============================
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_report_html(report, version=REPORT_HTML_VERSION):
+    return report_html(report)
+
+def render_report(report):
+    """Show an assessment report as one pre-rendered, escaped HTML element"""
+    with metrics.timer("report_render_seconds"):
+        st.html(cached_report_html(report))
+
+# =============================
+# Change-aware Consultation State
+# =============================
+# Questions, answers and reports are remembered per session under keys that
+# chain their inputs: question i is keyed by the specialty, the problem's
+# fingerprint and the answers before it; the report by everything it is built
+# from. When the problem text changes, the consultation is rebuilt from those
+# entries: cosmetic edits (case, spacing, punctuation) keep the fingerprint
+# and change nothing, a substantive edit drops every step that depended on
+# the old wording, and returning to an earlier wording restores its
+# questions, answers and report without new LLM calls.
+CONSULTATION_STEPS_KEPT = 64
+
+def step_key(answers):
+    return make_key("step", st.session_state.specialty, st.session_state.problem_key, tuple(answers))
+
+def report_key():
+    return make_key(
+        "report", st.session_state.specialty, st.session_state.user_data,
+        st.session_state.problem_key, tuple(st.session_state.answers)
+    )
+
+def remember_step(key, **values):
+    steps = st.session_state.consultation_steps
+    entry = steps.pop(key, {})
+    entry.update(values)
+    steps[key] = entry
+    while len(steps) > CONSULTATION_STEPS_KEPT:
+        steps.pop(next(iter(steps)))
+
+def remember_report():
+    if st.session_state.ai_report in (None, "API Error"):
+        return
+    remember_step(
+        report_key(),
+        report=st.session_state.ai_report,
+        consultation_id=st.session_state.consultation_id,
+        report_match=st.session_state.report_match
+    )
+
+# Buckets for consultation_questions, which counts questions rather than seconds
+QUESTION_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10)
+
+def record_consultation_metrics(max_questions):
+    """Questions asked and end-to-end time for a consultation whose report just arrived"""
+    answers = st.session_state.answers
+    if st.session_state.consultation_steps.get(step_key(answers), {}).get("sufficient"):
+        end = "sufficient"
+    elif len(answers) >= max_questions:
+        end = "limit"
+    else:
+        end = "skipped"
+    mode = "adaptive" if ADAPTIVE_QUESTIONS else "fixed"
+    metrics.observe("consultation_questions", len(answers), buckets=QUESTION_COUNT_BUCKETS, mode=mode, end=end)
+    started = st.session_state.pop("consultation_started", None)
+    if started is not None:
+        metrics.observe("consultation_seconds", time.monotonic() - started, mode=mode)
+
+def store_problem():
+    st.session_state.problem = st.session_state.problem_input
+
+def sync_consultation(max_questions):
+    """Rebuild questions, answers and report when the problem changed substantively"""
+    key = problem_fingerprint(st.session_state.problem)
+    if key == st.session_state.problem_key:
+        return
+    st.session_state.problem_key = key
+    steps = st.session_state.consultation_steps
+    questions, answers = [], []
+    sufficient = False
+    while len(questions) < max_questions:
+        step = steps.get(step_key(answers), {})
+        sufficient = step.get("sufficient", False)
+        if "question" not in step:
+            break
+        questions.append(step["question"])
+        if "answer" not in step:
+            break
+        answers.append(step["answer"])
+    st.session_state.questions = questions
+    st.session_state.answers = answers
+
+    report = steps.get(report_key())
+    previous_report = st.session_state.ai_report
+    if report:
+        st.session_state.ai_report = report["report"]
+        st.session_state.consultation_id = report["consultation_id"]
+        st.session_state.report_match = report["report_match"]
+        st.session_state.question_phase = max_questions
+    else:
+        st.session_state.ai_report = None
+        st.session_state.consultation_id = None
+        st.session_state.report_match = None
+        st.session_state.question_phase = max_questions if sufficient else len(answers)
+    if st.session_state.ai_report != previous_report:
+        reset_report_chat()
+
+# =============================
+# Consultation History
+# =============================
+@st.cache_resource
+def get_history():
+    return ConsultationHistory()
+
+def save_consultation():
+    """Move the finished consultation into history once its report is ready"""
+    if st.session_state.consultation_id is not None or st.session_state.ai_report in (None, "API Error"):
+        return
+    try:
+        st.session_state.consultation_id = get_history().save(
+            st.session_state.user_id,
+            st.session_state.session_id,
+            st.session_state.specialty,
+            st.session_state.problem,
+            st.session_state.questions,
+            st.session_state.answers,
+            st.session_state.ai_report,
+            st.session_state.user_data
+        )
+    except Exception as e:
+        st.warning(f"Could not save this consultation to your history: {str(e)}")
+
+def render_history(specialty_icons):
+    """Past consultations, read from the history store only while the list is open"""
+    st.markdown("### 📚 Consultation History")
+    if not st.toggle("Show past consultations", key="history_open"):
+        return
+    history = get_history()
+    # Keyed on the server-issued session id; the profile id is user-settable
+    session_id = st.session_state.session_id
+    filter_specialty = st.selectbox("Specialist", ["All"] + list(specialty_icons), key="history_specialty")
+    filter_specialty = None if filter_specialty == "All" else filter_specialty
+    entries = history.recent(session_id, filter_specialty, limit=st.session_state.get("history_limit", 10))
+    if not entries:
+        st.info("No saved consultations yet. Finished consultations appear here.")
+        return
     
-    Return ONLY the question text, nothing else.
-    """
+    for entry in entries:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.markdown(f"{specialty_icons.get(entry['specialty'], '🩺')} **{entry['specialty']}** · {entry['created_at']:%Y-%m-%d %H:%M} — {entry['title']}")
+        with col2:
+            if st.button("Open", key=f"history_open_{entry['id']}", use_container_width=True):
+                st.session_state.history_view = entry["id"]
+    if len(entries) < history.count(session_id, filter_specialty):
+        if st.button("Show more", key="history_more"):
+            st.session_state.history_limit = st.session_state.get("history_limit", 10) + 10
+            st.rerun()
     
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": [
-            {"role": "system", "content": "You are a helpful medical assistant that generates relevant follow-up questions."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 30
-    }
+    # Only the opened consultation is decompressed, and it isn't kept in session state
+    consultation = history.load(session_id, st.session_state.get("history_view")) if st.session_state.get("history_view") else None
+    if consultation:
+        with st.container(border=True):
+            st.markdown(f"#### {specialty_icons.get(consultation['specialty'], '🩺')} {consultation['specialty']} · {consultation['created_at']:%Y-%m-%d %H:%M}")
+            st.markdown(f"**Concern:** {consultation['problem']}")
+            for question, answer in zip(consultation["questions"], consultation["answers"]):
+                st.markdown(f"- *{question}* — {answer}")
+            render_report(consultation["report"])
+            report_text, filename = generate_report_download(consultation["report"], consultation["specialty"])
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("📥 Download Report", data=report_text, file_name=filename, mime="text/plain",
+                                   key=f"history_download_{consultation['id']}", use_container_width=True)
+            with col2:
+                if st.button("Close", key="history_close", use_container_width=True):
+                    st.session_state.history_view = None
+                    st.rerun()
+
+# =============================
+# Near-duplicate Reports
+# =============================
+@st.cache_resource
+def get_similarity_index():
+    return SimilarityIndex()
+
+def find_similar_report():
+    """Reuse the report of a near-identical earlier consultation, refreshing it in the background if stale"""
+    if st.session_state.get("skip_similar"):
+        return None
+    specialty = st.session_state.specialty
+    problem = st.session_state.problem
+    answers = list(st.session_state.answers)
+    user_data = dict(st.session_state.user_data)
+    text = consultation_text(problem, answers)
+    try:
+        match = get_similarity_index().find(specialty, text)
+    except Exception:
+        return None
+    if match and GROQ_API_KEY:
+        budget = get_token_governor().scope("background-refresh")
+        refresh_in_background(
+            get_similarity_index(), match, specialty, text,
+            lambda: request_report(GROQ_API_KEY, specialty, user_data, problem, answers, budget=budget, priority="background")
+        )
+    return match
+
+def index_report(report):
+    """Make a freshly generated report available to near-duplicate consultations"""
+    if report in (None, "API Error"):
+        return
+    try:
+        get_similarity_index().add(
+            st.session_state.specialty,
+            consultation_text(st.session_state.problem, st.session_state.answers),
+            report
+        )
+    except Exception as e:
+        st.warning(f"Could not index this report for reuse: {str(e)}")
+
+# =============================
+# Follow-up Chat on the Report
+# =============================
+def ask_about_report(question):
+    """Answer a follow-up question with a bounded context; None if the call failed"""
+    if not GROQ_API_KEY:
+        st.error("Groq API key is missing; cannot answer follow-up questions.")
+        return None
+    if st.session_state.chat_digest is None:
+        st.session_state.chat_digest = report_digest(st.session_state.ai_report)
+    window = st.session_state.chat_log[st.session_state.chat_folded:]
+    try:
+        return request_chat_reply(
+            GROQ_API_KEY,
+            st.session_state.specialty,
+            st.session_state.chat_digest,
+            st.session_state.chat_summary,
+            window,
+            question,
+            budget=session_budget()
+        )
+    except BudgetExceeded as e:
+        st.warning(str(e))
+    except GroqError as e:
+        st.error(f"Groq API Error: {str(e)}")
+    return None
+
+def update_chat_summary():
+    """Fold messages that slid out of the window into the running summary"""
+    log = st.session_state.chat_log
+    window = log[st.session_state.chat_folded:]
+    if len(window) >= CHAT_WINDOW_MESSAGES + CHAT_FOLD_BATCH:
+        evicted = window[:len(window) - CHAT_WINDOW_MESSAGES]
+        st.session_state.chat_summary = fold_summary(GROQ_API_KEY, st.session_state.chat_summary, evicted, budget=session_budget())
+        st.session_state.chat_folded += len(evicted)
+    # Summarized messages beyond the display limit leave session state
+    overflow = min(len(log) - CHAT_DISPLAY_MESSAGES, st.session_state.chat_folded)
+    if overflow > 0:
+        del log[:overflow]
+        st.session_state.chat_folded -= overflow
+
+def render_report_chat():
+    st.markdown("### 💬 Ask About Your Assessment")
+    for message in st.session_state.chat_log:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+    question = st.chat_input("Ask a follow-up question, e.g. \"Can I take ibuprofen with this?\"", key="report_chat_input")
+    if question:
+        with st.chat_message("user"):
+            st.markdown(question)
+        with st.chat_message("assistant"):
+            with st.spinner("Thinking..."):
+                reply = ask_about_report(question)
+            if reply:
+                st.markdown(reply)
+        if reply:
+            st.session_state.chat_log += [{"role": "user", "content": question}, {"role": "assistant", "content": reply}]
+            update_chat_summary()
+
+# =============================
+# Rerun Diagnostics
+# =============================
+def render_profiler_panel():
+    """Admin sidebar panel with the top hotspots of recently profiled reruns"""
+    with st.sidebar.expander("🛠️ Rerun Profiler", expanded=False):
+        summary = profiling.summary()
+        if not summary:
+            st.caption("No profiles yet. Add ?profile=1 to the URL or set PROFILE_RERUNS=1.")
+            return
+        page = st.selectbox("Page", list(summary), key="admin_profile_page")
+        sort = st.radio("Sort by", ["tottime", "cumtime"], horizontal=True, key="admin_profile_sort")
+        page_summary = summary[page]
+        st.caption(f"Last {page_summary['count']} reruns: mean {page_summary['mean_ms']:.0f} ms, max {page_summary['max_ms']:.0f} ms (times in ms per rerun)")
+        hotspots = pd.DataFrame(profiling.hotspots(page, sort=sort))
+        st.dataframe(hotspots.round(2), hide_index=True, use_container_width=True)
+        if st.button("Dump profiles to disk", key="admin_profile_dump"):
+            paths = profiling.dump_profiles()
+            st.success(f"Wrote {len(paths)} profile(s) to {profiling.PROFILE_DIR}")
+
+def finish_rerun():
+    """Close out this rerun's profile and timing; call before st.stop() too"""
+    profiling.stop()
+    if is_admin:
+        render_profiler_panel()
+    metrics.finish_rerun(rerun_started, st.session_state.current_page)
+
+# =============================
+# Dynamic Question Generation
+# =============================
+def generate_follow_up(specialty, problem, previous_answers, question_number, max_questions):
+    """Next follow-up question from the LLM as {"question", "sufficient"}, or a fallback question"""
+    fallback = {"question": fallback_question(problem), "sufficient": False}
     # Guard: missing API key
     if not GROQ_API_KEY:
         st.error("Groq API key is missing; cannot generate follow-up question.")
-        return f"Can you tell me more about your {problem.lower()}?"
+        return fallback
 
     try:
-        r = requests.post(GROQ_URL, headers=headers, json=payload, timeout=30)
-        if r.status_code != 200:
-            # Show detailed server response to help diagnose 400 errors
-            try:
-                err_detail = r.json()
-            except Exception:
-                err_detail = r.text
-            st.error(f"Error generating question: HTTP {r.status_code} - {err_detail}")
-            return f"Can you tell me more about your {problem.lower()}?"
-        return r.json()['choices'][0]['message']['content'].strip()
-    except requests.Timeout:
-        st.error("Error generating question: Request to Groq timed out.")
-        return f"Can you tell me more about your {problem.lower()}?"
-    except Exception as e:
+        return request_follow_up(
+            GROQ_API_KEY, specialty, problem, previous_answers, question_number, max_questions,
+            budget=session_budget(), cache=get_shared_cache()
+        )
+    except BudgetExceeded as e:
+        st.warning(str(e))
+        return fallback
+    except GroqError as e:
         st.error(f"Error generating question: {str(e)}")
-        return f"Can you tell me more about your {problem.lower()}?"
+        return fallback
 
 # =============================
 # Groq API Integration
 # =============================
 def get_groq_response(prompt):
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": [
-            {"role": "system", "content": "You are a helpful health assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 4096  # Increased for more detailed responses
-    }
     # Guard: missing API key
     if not GROQ_API_KEY:
         st.error("Groq API key is missing; cannot contact Groq API.")
         return "API Error"
 
+    messages = [
+        {"role": "system", "content": "You are a helpful health assistant."},
+        {"role": "user", "content": prompt}
+    ]
     try:
-        r = requests.post(GROQ_URL, headers=headers, json=payload, timeout=60)
-        if r.status_code != 200:
-            try:
-                err_detail = r.json()
-            except Exception:
-                err_detail = r.text
-            st.error(f"Groq API Error: HTTP {r.status_code} - {err_detail}")
-            return "API Error"
-        return r.json()['choices'][0]['message']['content']
-    except requests.Timeout:
-        st.error("Groq API Error: Request to Groq timed out.")
+        return groq_chat(GROQ_API_KEY, messages, max_tokens=REPORT_MAX_TOKENS, timeout=REPORT_TIMEOUT, kind="report", budget=session_budget(), cache=get_shared_cache())
+    except BudgetExceeded as e:
+        st.warning(str(e))
         return "API Error"
-    except Exception as e:
+    except GroqError as e:
         st.error(f"Groq API Error: {str(e)}")
         return "API Error"
 
-# =============================
-# Report Download Function
-# =============================
-def generate_report_download(report_content, specialty):
-    """Generate a downloadable report file"""
-    # Create a timestamp for the filename
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{specialty}_Report_{timestamp}.txt"
-    
-    # Format the report content for download
-    formatted_report = f"AI SMART HOSPITAL - Medical Consultation Report\n"
-    formatted_report += f"Specialty: {specialty}\n"
-    formatted_report += f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-    formatted_report += "="*50 + "\n\n"
-    
-    # Remove markdown syntax for plain text report
-    clean_report = re.sub(r'#{1,6}\s*', '', report_content)  # Remove headings
-    clean_report = re.sub(r'\*{1,2}(.*?)\*{1,2}', r'\1', clean_report)  # Remove bold/italic
-    clean_report = re.sub(r'-\s+', '* ', clean_report)  # Convert dashes to bullets
-    formatted_report += clean_report
-    
-    return formatted_report, filename
-
 # =============================
 # Calculator Functions
 # =============================
@@ -799,8 +1017,15 @@ elif st.session_state.current_page == 'checkups':
                     st.session_state.answers = []
                     st.session_state.problem = ""
                     st.session_state.user_data = {}
+                    st.session_state.problem_key = None
+                    st.session_state.consultation_steps = {}
+                    st.session_state.pop("consultation_started", None)
                     st.session_state.chat_started = True
                     st.rerun()
+        
+        st.markdown("---")
+        render_history(specialty_icons)
+        finish_rerun()
         st.stop()
     
     # Specialty chat page
@@ -818,35 +1043,52 @@ elif st.session_state.current_page == 'checkups':
             st.session_state.chat_started = False
             st.session_state.specialty = None
             st.rerun()
+    render_budget_caption()
     
     # Show problem input for all specialties
     st.markdown("### 📝 Describe Your Health Concern")
-    st.session_state.problem = st.text_area(
+    # A fixed key keeps the widget's id stable across edits (with value= the id
+    # changed with every edit and the next edit was dropped); resets still go
+    # through st.session_state.problem and are copied in before rendering
+    if st.session_state.get("problem_input") != st.session_state.problem:
+        st.session_state.problem_input = st.session_state.problem
+    st.text_area(
         "Please describe your symptoms or health concern in detail:", 
-        value=st.session_state.problem,
+        key="problem_input",
+        on_change=store_problem,
         placeholder="Example: I've been experiencing persistent headaches for the past week, especially in the afternoons...",
         height=150
     )
+    max_questions = MAX_FOLLOW_UP_QUESTIONS
+    sync_consultation(max_questions)
     
     # For all specialties, including Nutritionist
     if st.session_state.problem:
         st.markdown("---")
         st.markdown("### 📋 Follow-up Questions")
         
-        # Generate questions dynamically based on problem and specialty
-        max_questions = 3  # Limit to 3 questions for better UX
-        
         if st.session_state.question_phase < max_questions:
             # Generate current question dynamically
             if st.session_state.question_phase >= len(st.session_state.questions):
+                if "consultation_started" not in st.session_state:
+                    st.session_state.consultation_started = time.monotonic()
                 with st.spinner("🔍 Generating relevant question..."):
-                    new_question = generate_follow_up_question(
+                    step = generate_follow_up(
                         st.session_state.specialty,
                         st.session_state.problem,
                         st.session_state.answers,
-                        st.session_state.question_phase + 1
+                        st.session_state.question_phase + 1,
+                        max_questions
                     )
-                    st.session_state.questions.append(new_question)
+                if step["sufficient"]:
+                    # Enough information already; go straight to the report
+                    remember_step(step_key(st.session_state.answers), sufficient=True)
+                    st.session_state.question_phase = max_questions
+                    st.rerun()
+                new_question = step["question"]
+                st.session_state.questions.append(new_question)
+                if new_question != fallback_question(st.session_state.problem):
+                    remember_step(step_key(st.session_state.answers), question=new_question)
             
             # Display current question
             st.markdown(f"<div class='pulse' style='font-size: 1.2rem; padding: 16px; background: #2563eb; color: white; border-radius: 12px; margin-bottom: 16px;'>{st.session_state.questions[st.session_state.question_phase]}</div>", unsafe_allow_html=True)
@@ -859,6 +1101,7 @@ elif st.session_state.current_page == 'checkups':
             with col1:
                 if st.button("✅ Submit & Continue", key=f"submit_{st.session_state.question_phase}", help="Submit your answer and continue", use_container_width=True):
                     if answer.strip():
+                        remember_step(step_key(st.session_state.answers), answer=answer)
                         st.session_state.answers.append(answer)
                         st.session_state.question_phase += 1
                         st.session_state.question_advance_rerun = True
@@ -873,88 +1116,85 @@ elif st.session_state.current_page == 'checkups':
                 st.rerun()
         else:
             if st.session_state.ai_report is None:
-                with st.spinner("🧠 Analyzing your case with professional expertise..."):
-                    # Add a small delay to simulate processing
-                    time.sleep(1.5)
-                    prompt = get_specialty_prompt(
-                        st.session_state.specialty,
-                        st.session_state.user_data,
-                        st.session_state.problem,
-                        st.session_state.answers
-                    )
-                    result = get_groq_response(prompt)
-                    st.session_state.ai_report = result
+                match = find_similar_report()
+                if match:
+                    st.session_state.ai_report = match["report"]
+                    st.session_state.report_match = match["similarity"]
+                    save_consultation()
+                    remember_report()
+                    record_consultation_metrics(max_questions)
+            if st.session_state.ai_report is None and admit_report_generation():
+                try:
+                    with st.spinner("🧠 Analyzing your case with professional expertise..."):
+                        # Add a small delay to simulate processing
+                        time.sleep(1.5)
+                        prompt = get_specialty_prompt(
+                            st.session_state.specialty,
+                            st.session_state.user_data,
+                            st.session_state.problem,
+                            st.session_state.answers
+                        )
+                        result = get_groq_response(prompt)
+                        st.session_state.ai_report = result
+                        st.session_state.skip_similar = False
+                        save_consultation()
+                        remember_report()
+                        index_report(result)
+                        if result != "API Error":
+                            record_consultation_metrics(max_questions)
+                finally:
+                    release_admission()
             
-            st.markdown("---")
-            st.markdown("## 🧠 Professional Medical Assessment")
+            if st.session_state.ai_report is None:
+                render_waiting_room()
+            else:
+                st.markdown("---")
+                st.markdown("## 🧠 Professional Medical Assessment")
+                if st.session_state.report_match:
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.info(f"♻️ This assessment comes from a very similar earlier consultation ({st.session_state.report_match:.0%} match).")
+                    with col2:
+                        if st.button("Generate a fresh assessment", key="fresh_report", use_container_width=True):
+                            st.session_state.consultation_steps.pop(report_key(), None)
+                            st.session_state.ai_report = None
+                            st.session_state.report_match = None
+                            st.session_state.consultation_id = None
+                            st.session_state.skip_similar = True
+                            reset_report_chat()
+                            st.rerun()
             
-            # Create a container for the report with a border
-            with st.container(border=True):
-                # Process and display the structured response
-                try:
-                    # Split the response into sections
-                    sections = re.split(r'###\s+', st.session_state.ai_report)
-                    sections = [s.strip() for s in sections if s.strip()]
-                    
-                    # Display each section in the report container
-                    for section in sections:
-                        if section:
-                            # Split into title and content
-                            lines = section.split('\n', 1)
-                            title = lines[0].strip()
-                            content = lines[1].strip() if len(lines) > 1 else ""
-                            
-                            # Special formatting for certain sections
-                            # The #1e293b color is the --dark variable
-                            if "Initial Assessment" in title:
-                                st.subheader(f"📝 {title}")
-                                st.markdown(f"<div style='color: #1e293b;'>{content}</div>", unsafe_allow_html=True)
-                            elif "Recommendations" in title:
-                                st.subheader(f"💡 {title}")
-                                st.markdown(f"<div style='color: #1e293b;'>{content}</div>", unsafe_allow_html=True)
-                            elif "Management Plan" in title:
-                                st.subheader(f"📋 {title}")
-                                st.markdown(f"<div style='color: #1e293b;'>{content}</div>", unsafe_allow_html=True)
-                            elif "Critical Considerations" in title:
-                                # Combine everything into a single HTML block for proper styling
-                                st.markdown(f"""
-                                <div style='padding: 16px; background: #fffbeb; border-radius: 12px;'>
-                                    <h3 style='color: #1e293b;'>⚠️ {title}</h3>
-                                    <div style='color: #1e293b;'>{content}</div>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            else:
-                                st.subheader(title)
-                                st.markdown(f"<div style='color: #1e293b;'>{content}</div>", unsafe_allow_html=True)
-                except:
-                    # Fallback if parsing fails
-                    st.markdown(f"<div style='color: #1e293b;'>{st.session_state.ai_report}</div>", unsafe_allow_html=True)
+                render_report(st.session_state.ai_report)
             
-            st.markdown("---")
+                st.markdown("---")
             
-            # Download button for the report
-            if st.session_state.ai_report:
-                report_text, filename = generate_report_download(
-                    st.session_state.ai_report, 
-                    st.session_state.specialty
-                )
-                
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    st.info("💡 You can download your full medical assessment report")
-                with col2:
-                    st.download_button(
-                        label="📥 Download Full Report",
-                        data=report_text,
-                        file_name=filename,
-                        mime="text/plain",
-                        help="Download your complete medical assessment report",
-                        use_container_width=True
+                # Download button for the report
+                if st.session_state.ai_report:
+                    report_text, filename = generate_report_download(
+                        st.session_state.ai_report, 
+                        st.session_state.specialty
                     )
+                
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.info("💡 You can download your full medical assessment report")
+                    with col2:
+                        st.download_button(
+                            label="📥 Download Full Report",
+                            data=report_text,
+                            file_name=filename,
+                            mime="text/plain",
+                            help="Download your complete medical assessment report",
+                            use_container_width=True
+                        )
+            
+                if st.session_state.ai_report and st.session_state.ai_report != "API Error":
+                    st.markdown("---")
+                    render_report_chat()
     
     # New consultation button
     st.markdown("---")
-    if st.button("🔄 Start New Consultation", help="Start a new consultation with the same specialist", use_container_width=True):
+    if st.button("🔄 Start New Consultation", help="Start a new consultation with the same specialist; finished reports stay in your history", use_container_width=True):
         # Use a flag to trigger reset at the top of the script
         st.session_state["trigger_fresh_start"] = True
         st.rerun()
@@ -992,9 +1232,11 @@ elif st.session_state.current_page == 'lab':
             gender = st.selectbox("Gender", ["Male", "Female", "Other"], key="bmi_gender")
         
         if st.button("Calculate BMI", type="primary", key="bmi_calc", use_container_width=True):
-            bmi, category, advice, color = calculate_bmi(weight, height)
+            with metrics.timer("calculator_seconds", calculator="bmi"):
+                bmi, category, advice, color = calculate_bmi(weight, height)
             
             if bmi:
+                record_measurements({"weight": weight, "bmi": bmi})
                 st.markdown("---")
                 st.subheader("Your BMI Results")
                 
@@ -1046,9 +1288,11 @@ elif st.session_state.current_page == 'lab':
                 st.info("👤 Hip measurement not required for men")
         
         if st.button("Calculate Body Fat %", type="primary", key="bf_calc", use_container_width=True):
-            body_fat, category, color = calculate_body_fat(gender, waist, neck, height, hip)
+            with metrics.timer("calculator_seconds", calculator="body_fat"):
+                body_fat, category, color = calculate_body_fat(gender, waist, neck, height, hip)
             
             if body_fat:
+                record_measurements({"body_fat": body_fat})
                 st.markdown("---")
                 st.subheader("Your Body Fat Results")
                 
@@ -1105,11 +1349,13 @@ elif st.session_state.current_page == 'lab':
             ], key="cal_activity")
         
         if st.button("Calculate Calorie Needs", type="primary", key="cal_calc", use_container_width=True):
-            maintain, mild_loss, loss, extreme_loss = calculate_calorie_needs(
-                gender, age, weight, height, activity_level
-            )
+            with metrics.timer("calculator_seconds", calculator="calories"):
+                maintain, mild_loss, loss, extreme_loss = calculate_calorie_needs(
+                    gender, age, weight, height, activity_level
+                )
             
             if maintain:
+                record_measurements({"calories": maintain})
                 st.markdown("---")
                 st.subheader("Your Daily Calorie Needs")
                 
@@ -1147,56 +1393,117 @@ elif st.session_state.current_page == 'lab':
         st.subheader("Health Trend Analytics")
         st.markdown("Visualize and track your health metrics over time.")
         
-        # Sample health data
-        dates = pd.date_range(start="2023-01-01", periods=12, freq="M")
-        weight_data = [72, 71.5, 70.8, 70.2, 69.7, 69.5, 69.0, 68.5, 68.0, 67.8, 67.5, 67.0]
-        bmi_data = [round(w / (1.75**2), 1) for w in weight_data]
-        calorie_data = [random.randint(1800, 2200) for _ in range(12)]
+        # Profile selection so users can come back to their stored history
+        profile = st.text_input(
+            "Profile ID",
+            value=st.session_state.user_id,
+            key="analytics_profile",
+            help="Results from the calculators are saved under this ID. Reuse it to see your health trends; past consultations stay with this browser session."
+        ).strip()
+        if profile and profile != st.session_state.user_id:
+            st.session_state.user_id = profile
+        st.query_params["user"] = st.session_state.user_id
         
-        # Create data frame
-        health_df = pd.DataFrame({
-            "Month": dates,
-            "Weight (kg)": weight_data,
-            "BMI": bmi_data,
-            "Calories": calorie_data
-        })
+        # Import wearable / fitness exports into the store
+        with st.expander("📥 Import wearable or fitness data"):
+            st.markdown("Upload an Apple Health export (`export.zip` or `export.xml`), a Google Fit file, or a CSV/JSON export with a date column.")
+            st.caption(
+                f"Uploads are limited to {st.get_option('server.maxUploadSize')} MB. Larger exports can be imported "
+                f"on the server with `python health_import.py <file> --user {st.session_state.user_id}`."
+            )
+            upload = st.file_uploader(
+                "Export file",
+                type=["zip", "xml", "csv", "json", "jsonl", "ndjson"],
+                key="analytics_import_file"
+            )
+            if upload is not None and st.button("Import Data", key="analytics_import_btn", use_container_width=True):
+                progress_bar = st.progress(0.0, text="Importing...")
+                
+                def show_progress(done, total, imported, duplicates):
+                    fraction = min(done / total, 1.0) if total else 0.0
+                    progress_bar.progress(fraction, text=f"Imported {imported:,} readings ({duplicates:,} duplicates skipped)")
+                
+                try:
+                    summary = import_export(
+                        get_health_store(),
+                        st.session_state.user_id,
+                        upload,
+                        upload.name,
+                        total_bytes=upload.size,
+                        progress=show_progress
+                    )
+                    progress_bar.progress(1.0, text="Import complete")
+                    st.success(f"✅ Imported {summary['imported']:,} readings ({summary['duplicates']:,} duplicates skipped).")
+                except (ImportFormatError, ValueError) as e:
+                    st.error(f"Could not import this file: {str(e)}")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            range_label = st.selectbox(
+                "Date range",
+                ["Last 30 days", "Last 90 days", "Last year", "All time"],
+                index=3,
+                key="analytics_range"
+            )
+        with col2:
+            resolution_label = st.radio("Aggregate by", ["Daily", "Weekly", "Monthly"], horizontal=True, index=1, key="analytics_period")
+        range_days = {"Last 30 days": 30, "Last 90 days": 90, "Last year": 365}.get(range_label)
+        # Day-aligned so the range (and its cached charts) is stable across reruns
+        start = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=range_days), datetime.time()) if range_days else None
+        resolution = {"Daily": "raw", "Weekly": "week", "Monthly": "month"}[resolution_label]
+        
+        # Rollups or raw points from the measurement store, downsampled to a fixed budget
+        user_id = st.session_state.user_id
+        weight_df = load_trend(user_id, "weight", resolution, start)
+        bmi_df = load_trend(user_id, "bmi", resolution, start)
+        calorie_df = load_trend(user_id, "calories", resolution, start, bars=True)
+        
+        if weight_df.empty and bmi_df.empty and calorie_df.empty:
+            st.info("📭 No measurements yet. Use the BMI or Calorie calculators and your results will appear here.")
+        
+        def trend_tooltip(df):
+            return ['Date:T', 'Value:Q'] + (['Readings:Q'] if 'Readings' in df else [])
         
         # Weight chart
-        st.markdown("#### Weight Trend")
-        weight_chart = alt.Chart(health_df).mark_line(point=True).encode(
-            x=alt.X('Month:T', axis=alt.Axis(title='Date')),
-            y=alt.Y('Weight (kg):Q', axis=alt.Axis(title='Weight (kg)')),
-            tooltip=['Month', 'Weight (kg)']
-        ).properties(height=300)
-        st.altair_chart(weight_chart, use_container_width=True)
+        if not weight_df.empty:
+            st.markdown("#### Weight Trend")
+            weight_chart = alt.Chart(weight_df).mark_line(point=len(weight_df) <= 60).encode(
+                x=alt.X('Date:T', axis=alt.Axis(title='Date')),
+                y=alt.Y('Value:Q', axis=alt.Axis(title='Weight (kg)'), scale=alt.Scale(zero=False)),
+                tooltip=trend_tooltip(weight_df)
+            ).properties(height=300)
+            st.altair_chart(weight_chart, use_container_width=True)
         
         # BMI chart
-        st.markdown("#### BMI Trend")
-        bmi_chart = alt.Chart(health_df).mark_line(point=True, color='orange').encode(
-            x=alt.X('Month:T', axis=alt.Axis(title='Date')),
-            y=alt.Y('BMI:Q', axis=alt.Axis(title='BMI')),
-            tooltip=['Month', 'BMI']
-        ).properties(height=300)
-        st.altair_chart(bmi_chart, use_container_width=True)
+        if not bmi_df.empty:
+            st.markdown("#### BMI Trend")
+            bmi_chart = alt.Chart(bmi_df).mark_line(point=len(bmi_df) <= 60, color='orange').encode(
+                x=alt.X('Date:T', axis=alt.Axis(title='Date')),
+                y=alt.Y('Value:Q', axis=alt.Axis(title='BMI'), scale=alt.Scale(zero=False)),
+                tooltip=trend_tooltip(bmi_df)
+            ).properties(height=300)
+            st.altair_chart(bmi_chart, use_container_width=True)
         
         # Calories chart
-        st.markdown("#### Daily Calorie Intake")
-        calorie_chart = alt.Chart(health_df).mark_bar().encode(
-            x=alt.X('Month:T', axis=alt.Axis(title='Date')),
-            y=alt.Y('Calories:Q', axis=alt.Axis(title='Calories')),
-            tooltip=['Month', 'Calories'],
-            color=alt.value('#8b5cf6')
-        ).properties(height=300)
-        st.altair_chart(calorie_chart, use_container_width=True)
+        if not calorie_df.empty:
+            st.markdown("#### Daily Calorie Needs")
+            calorie_chart = alt.Chart(calorie_df).mark_bar().encode(
+                x=alt.X('Date:T', axis=alt.Axis(title='Date')),
+                y=alt.Y('Value:Q', axis=alt.Axis(title='Calories')),
+                tooltip=trend_tooltip(calorie_df),
+                color=alt.value('#8b5cf6')
+            ).properties(height=300)
+            st.altair_chart(calorie_chart, use_container_width=True)
         
-        # Health insights
-        st.markdown("#### Health Insights")
-        st.markdown("""
-        - Your weight has shown a consistent downward trend over the past year
-        - BMI has decreased from 23.5 to 21.9, moving toward the optimal range
-        - Calorie intake has remained relatively stable with minor fluctuations
-        - Continue your current regimen for continued progress
-        """)
+        # Health insights from the incrementally maintained rolling statistics
+        insights = generate_insights({
+            metric: store_stats
+            for metric in ("weight", "bmi", "body_fat", "calories")
+            if (store_stats := get_health_store().get_stats(user_id, metric))
+        })
+        if insights:
+            st.markdown("#### Health Insights")
+            st.markdown("\n".join(f"- {insight}" for insight in insights))
     
     # Coming Soon Section
     st.markdown("---")
@@ -1211,3 +1518,6 @@ elif st.session_state.current_page == 'lab':
     """)
 
     st.info("Check back soon for these new features!")
+
+# Reruns cut short by st.rerun() are not timed; the full rerun that follows is
+finish_rerun()
@@ -0,0 +1,521 @@
+import os
+import re
+import html
+import json
+import time
+import hashlib
+import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from shared_cache import make_key
+from llm_transport import create_transport
+from llm_scheduler import LLMScheduler, QueueTimeout, priority_for
+
+# =============================
+# Consultation Pipeline
+# =============================
+# Prompt building, Groq calls and report formatting shared by the Streamlit
+# app (bot.py) and headless tools such as batch_consult.py. Nothing in here
+# touches Streamlit; failures are raised as GroqError for the caller to show.
+
+# GROQ_URL can point at a local stand-in such as mock_groq.py for offline testing
+GROQ_URL = os.getenv("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+
+QUESTION_MAX_TOKENS = 30
+ADAPTIVE_QUESTION_MAX_TOKENS = 60  # room for the JSON wrapper around the question
+REPORT_MAX_TOKENS = 4096  # Increased for more detailed responses
+QUESTION_TIMEOUT = 30
+REPORT_TIMEOUT = 60
+
+# Follow-up questions: with ADAPTIVE_QUESTIONS each request also reports whether
+# the answers so far suffice, and the consultation moves on to the report as
+# soon as they do (after at least MIN_FOLLOW_UP_QUESTIONS)
+ADAPTIVE_QUESTIONS = os.getenv("ADAPTIVE_QUESTIONS", "1") != "0"
+MAX_FOLLOW_UP_QUESTIONS = int(os.getenv("MAX_FOLLOW_UP_QUESTIONS", "3"))
+MIN_FOLLOW_UP_QUESTIONS = int(os.getenv("MIN_FOLLOW_UP_QUESTIONS", "1"))
+
+# How long identical prompts are answered from the shared cache
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+
+
+class GroqError(Exception):
+    """A failed Groq call. `status` is the HTTP status (None for network errors)."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# Pooled keep-alive connections, shared by every caller in this process
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+# Live by default; GROQ_TRANSPORT=record/replay captures or serves fixture files
+_transport = create_transport(_session)
+
+# Orders calls by priority class before they reach the transport (see llm_scheduler)
+_scheduler = LLMScheduler()
+
+
+# =============================
+# Enhanced Prompt Engineering
+# =============================
+def get_specialty_prompt(specialty, user_data, problem, answers):
+    # Enhanced base instructions for detailed, professional responses
+    base_task = """
+    TASK:
+    As a healthcare professional, provide a comprehensive, personalized assessment based on the user's problem and answers. 
+    Your response MUST be structured with the following markdown headings and include the specified details:
+
+    ### 📝 Initial Assessment
+    - Provide a detailed clinical summary of the problem based on the user's input
+    - Include potential underlying causes and risk factors
+    - Mention relevant clinical observations based on the information provided
+
+    ### 💡 Professional Recommendations
+    - Offer 3-5 specific, evidence-based recommendations
+    - Include lifestyle modifications, home care, and preventive measures
+    - Provide clear rationales for each recommendation
+    - Use bullet points for readability
+
+    ### 💊 Comprehensive Management Plan
+    - Outline a step-by-step 4-week action plan with specific timelines
+    - Include dietary modifications, exercises, medications, or therapies as appropriate
+    - Specify monitoring parameters and follow-up schedule
+    - Provide detailed instructions for each phase of the plan
+
+    ### ⚠️ Critical Considerations
+    - List red flags that require immediate medical attention
+    - Include important contraindications or precautions
+    - Specify when to seek professional medical help
+    - Add a strong disclaimer that this is AI-generated advice and not a substitute for professional consultation
+    """
+
+    # Specialty-specific enhancements
+    if specialty == "Nutritionist":
+        return f"""
+        ROLE: Certified Clinical Nutritionist with 15+ years experience
+        HEALTH CONCERN: {problem}
+        ADDITIONAL INPUT: {answers}
+        
+        SPECIAL INSTRUCTIONS:
+        - Focus on evidence-based nutritional interventions
+        - Include specific food recommendations and meal timing
+        - Address micronutrient deficiencies if relevant
+        - Provide supplement recommendations with dosing guidelines
+        - Include metabolic considerations
+        
+        {base_task}
+        """
+    elif specialty == "Physician":
+        return f"""
+        ROLE: Board-Certified Physician with 20+ years clinical experience
+        PATIENT COMPLAINT: {problem}
+        RESPONSES: {answers}
+        
+        SPECIAL INSTRUCTIONS:
+        - Conduct a thorough differential diagnosis
+        - Discuss both pharmacological and non-pharmacological approaches
+        - Include diagnostic considerations and potential tests
+        - Address comorbidities and polypharmacy risks
+        - Provide detailed medication guidance including dosing and side effects
+        
+        {base_task}
+        """
+    elif specialty == "Mental Health":
+        return f"""
+        ROLE: Licensed Clinical Psychologist specializing in cognitive-behavioral therapy
+        CONCERN: {problem}
+        RESPONSES: {answers}
+        
+        SPECIAL INSTRUCTIONS:
+        - Include cognitive restructuring techniques
+        - Provide specific mindfulness exercises
+        - Outline behavioral activation strategies
+        - Address coping mechanisms for acute distress
+        - Include therapeutic homework assignments
+        
+        {base_task}
+        """
+    elif specialty == "Orthopedic":
+        return f"""
+        ROLE: Senior Orthopedic Surgeon specializing in sports medicine
+        COMPLAINT: {problem}
+        RESPONSES: {answers}
+        
+        SPECIAL INSTRUCTIONS:
+        - Provide detailed rehabilitation protocols
+        - Include specific exercises with proper form instructions
+        - Discuss surgical and non-surgical options
+        - Address pain management strategies
+        - Include return-to-activity guidelines
+        
+        {base_task}
+        """
+    elif specialty == "Dentist":
+        return f"""
+        ROLE: Prosthodontist with expertise in restorative dentistry
+        DENTAL ISSUE: {problem}
+        RESPONSES: {answers}
+        
+        SPECIAL INSTRUCTIONS:
+        - Provide detailed oral hygiene protocols
+        - Include specific techniques for brushing and flossing
+        - Discuss preventive strategies for common dental issues
+        - Address pain management and emergency care
+        - Include professional treatment options with timelines
+        
+        {base_task}
+        """
+    return f"""
+    ROLE: Senior Healthcare Consultant
+    ISSUE: {problem}
+    ANSWERS: {answers}
+    
+    SPECIAL INSTRUCTIONS:
+    - Provide comprehensive health guidance
+    - Address both acute and chronic aspects
+    - Include holistic approaches
+    - Focus on preventive strategies
+    
+    {base_task}
+    """
+
+# =============================
+# Dynamic Question Generation
+# =============================
+def get_follow_up_prompt(specialty, problem, previous_answers, question_number):
+    return f"""
+    You are a {specialty} assistant. A patient has described their problem as: "{problem}"
+    
+    Previous answers given: {previous_answers if previous_answers else "None yet"}
+    
+    Generate ONE specific, relevant follow-up question (question #{question_number}) that would help you better understand their condition and provide better advice. 
+    
+    The question must be:
+    - Very short (around 6-7 words).
+    - A single line.
+    - Directly related to their problem.
+    - Professional and empathetic.
+    - Specific to your specialty area.
+    
+    Return ONLY the question text, nothing else.
+    """
+
+def get_adaptive_follow_up_prompt(specialty, problem, previous_answers, question_number, max_questions):
+    return f"""
+    You are a {specialty} assistant. A patient has described their problem as: "{problem}"
+    
+    Previous answers given: {previous_answers if previous_answers else "None yet"}
+    Questions answered so far: {len(previous_answers)} of at most {max_questions}
+    
+    First decide whether you already have enough information to give a useful assessment.
+    If you do not, write ONE follow-up question (question #{question_number}) that would help most.
+    
+    The question must be:
+    - Very short (around 6-7 words).
+    - A single line.
+    - Directly related to their problem.
+    - Professional and empathetic.
+    - Specific to your specialty area.
+    
+    Reply with ONLY this JSON object, nothing else:
+    {{"sufficient": true or false, "question": "the question, or an empty string if sufficient"}}
+    """
+
+def fallback_question(problem):
+    return f"Can you tell me more about your {problem.lower()}?"
+
+def parse_follow_up(reply):
+    """(question, sufficient) from an adaptive reply; a plain-text reply counts as a question
+
+    The reply is structured only if its {...} part parses as a JSON object.
+    JSON that doesn't (e.g. cut off at max_tokens) gives no question, so the
+    caller asks fallback_question instead of showing the raw reply; other text
+    is kept, braces and all. Only a JSON true or "true" counts as sufficient.
+    """
+    match = re.search(r"\{.*\}", reply, re.DOTALL)
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        sufficient = data.get("sufficient")
+        sufficient = sufficient is True or (isinstance(sufficient, str) and sufficient.strip().lower() == "true")
+        return str(data.get("question") or "").strip(), sufficient
+    text = reply.strip()
+    if text.startswith(("{", "```")) or '"sufficient"' in text:
+        return "", False
+    return text.strip('"'), False
+
+def request_follow_up_question(api_key, specialty, problem, previous_answers, question_number, budget=None, cache=None):
+    """Ask Groq for one short follow-up question; raises GroqError on failure"""
+    messages = [
+        {"role": "system", "content": "You are a helpful medical assistant that generates relevant follow-up questions."},
+        {"role": "user", "content": get_follow_up_prompt(specialty, problem, previous_answers, question_number)}
+    ]
+    return groq_chat(api_key, messages, max_tokens=QUESTION_MAX_TOKENS, timeout=QUESTION_TIMEOUT, kind="question", budget=budget, cache=cache).strip()
+
+def request_follow_up(api_key, specialty, problem, previous_answers, question_number, max_questions=MAX_FOLLOW_UP_QUESTIONS, adaptive=ADAPTIVE_QUESTIONS, budget=None, cache=None):
+    """The next step of the questioning as {"question", "sufficient"}; raises GroqError on failure
+
+    `sufficient` is True when the model has enough to write the report, in
+    which case there is no question. It is never True before
+    MIN_FOLLOW_UP_QUESTIONS answers, nor without `adaptive`.
+    """
+    if not adaptive:
+        question = request_follow_up_question(api_key, specialty, problem, previous_answers, question_number, budget=budget, cache=cache)
+        return {"question": question, "sufficient": False}
+    messages = [
+        {"role": "system", "content": "You are a helpful medical assistant that generates relevant follow-up questions."},
+        {"role": "user", "content": get_adaptive_follow_up_prompt(specialty, problem, previous_answers, question_number, max_questions)}
+    ]
+    reply = groq_chat(api_key, messages, max_tokens=ADAPTIVE_QUESTION_MAX_TOKENS, timeout=QUESTION_TIMEOUT, kind="question", budget=budget, cache=cache)
+    question, sufficient = parse_follow_up(reply)
+    if sufficient and len(previous_answers) >= MIN_FOLLOW_UP_QUESTIONS:
+        return {"question": "", "sufficient": True}
+    if not question:
+        question = fallback_question(problem)
+    return {"question": question, "sufficient": False}
+
+# =============================
+# Groq API Integration
+# =============================
+def llm_has_room(kind, priority=None):
+    """True if a call of this kind would get a scheduler slot without queueing"""
+    return _scheduler.has_room(priority_for(kind, priority))
+
+def groq_completion(api_key, messages, max_tokens=REPORT_MAX_TOKENS, temperature=0.7, timeout=REPORT_TIMEOUT, url=None, model=None, kind="chat", budget=None, priority=None, deadline=None):
+    """Send a chat completion request; returns (content, usage) where usage is Groq's token counts
+
+    `budget` (a token_budget.BudgetScope) may lower max_tokens, switch model or
+    wait before the call, and is settled with the reported usage afterwards.
+    The call waits for a scheduler slot of its `priority` class (by default
+    derived from `kind`); `timeout` bounds the wait and the request together.
+    """
+    if not api_key:
+        metrics.inc("llm_requests_total", kind=kind, status="no_key")
+        raise GroqError("Groq API key is missing")
+    deadline = deadline or time.monotonic() + timeout
+    if budget is not None:
+        grant = budget.acquire(messages, max_tokens, model or GROQ_MODEL)
+        try:
+            content, usage = groq_completion(api_key, messages, grant.max_tokens, temperature, timeout, url, grant.model, kind, priority=priority, deadline=deadline)
+        except GroqError:
+            budget.release(grant)
+            raise
+        budget.settle(grant, usage)
+        usage = dict(usage, budget_adjusted=grant.max_tokens < max_tokens or grant.model != (model or GROQ_MODEL))
+        return content, usage
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model or GROQ_MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    try:
+        with _scheduler.slot(priority_for(kind, priority), deadline) as remaining:
+            with metrics.timer("llm_request_seconds", kind=kind):
+                try:
+                    r = _transport.post(url or GROQ_URL, headers=headers, json=payload, timeout=remaining)
+                except requests.Timeout:
+                    metrics.inc("llm_requests_total", kind=kind, status="timeout")
+                    raise GroqError("Request to Groq timed out.")
+                except requests.RequestException as e:
+                    metrics.inc("llm_requests_total", kind=kind, status="network_error")
+                    raise GroqError(str(e))
+    except QueueTimeout as e:
+        metrics.inc("llm_requests_total", kind=kind, status="queue_timeout")
+        raise GroqError(str(e), status=503, retry_after=e.retry_after)
+    _scheduler.note_response(r.status_code, r.headers)
+    metrics.inc("llm_requests_total", kind=kind, status=str(r.status_code))
+    if r.status_code != 200:
+        # Keep the server's error body to help diagnose 400 errors
+        try:
+            err_detail = r.json()
+        except Exception:
+            err_detail = r.text
+        retry_after = r.headers.get("retry-after")
+        raise GroqError(
+            f"HTTP {r.status_code} - {err_detail}",
+            status=r.status_code,
+            retry_after=float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else None
+        )
+    try:
+        data = r.json()
+        content = data['choices'][0]['message']['content']
+    except (ValueError, KeyError, IndexError) as e:
+        raise GroqError(f"Unexpected response from Groq: {str(e)}")
+    usage = data.get("usage") or {}
+    metrics.inc("llm_tokens_total", usage.get("prompt_tokens", 0), kind=kind, direction="in")
+    metrics.inc("llm_tokens_total", usage.get("completion_tokens", 0), kind=kind, direction="out")
+    return content, usage
+
+def groq_chat(api_key, messages, max_tokens=REPORT_MAX_TOKENS, temperature=0.7, timeout=REPORT_TIMEOUT, url=None, model=None, kind="chat", budget=None, cache=None, priority=None):
+    """Send a chat completion request and return the message content
+
+    With a shared_cache backend as `cache`, identical requests are answered
+    from the cache and only one replica calls Groq for a missing entry.
+    Answers cut down by the token budget are not cached.
+    """
+    if cache is None:
+        return groq_completion(api_key, messages, max_tokens, temperature, timeout, url, model, kind, budget, priority)[0]
+
+    def compute():
+        content, usage = groq_completion(api_key, messages, max_tokens, temperature, timeout, url, model, kind, budget, priority)
+        return content, not usage.get("budget_adjusted")
+
+    key = make_key("llm", model or GROQ_MODEL, messages, max_tokens, temperature)
+    return cache.get_or_compute(key, compute, ttl=LLM_CACHE_TTL, store_if=lambda result: result[1])[0]
+
+def request_report(api_key, specialty, user_data, problem, answers, budget=None, priority=None):
+    """Generate the full assessment report for a consultation; raises GroqError on failure"""
+    messages = [
+        {"role": "system", "content": "You are a helpful health assistant."},
+        {"role": "user", "content": get_specialty_prompt(specialty, user_data, problem, answers)}
+    ]
+    return groq_chat(api_key, messages, max_tokens=REPORT_MAX_TOKENS, timeout=REPORT_TIMEOUT, kind="report", budget=budget, priority=priority)
+
+def normalize_problem(problem):
+    """Problem text without case, spacing or punctuation, so cosmetic edits compare equal"""
+    return " ".join(re.findall(r"\w+", problem.lower()))
+
+
+def problem_fingerprint(problem):
+    return hashlib.sha256(normalize_problem(problem).encode("utf-8")).hexdigest()[:16]
+
+# =============================
+# Report Formatting
+# =============================
+def parse_report_sections(report):
+    """Split a markdown report into (title, content) pairs on its ### headings"""
+    sections = re.split(r'###\s+', report)
+    parsed = []
+    for section in sections:
+        section = section.strip()
+        if not section:
+            continue
+        lines = section.split('\n', 1)
+        title = lines[0].strip()
+        content = lines[1].strip() if len(lines) > 1 else ""
+        parsed.append((title, content))
+    return parsed
+
+# Bump when report_html's output changes so cached renderings are replaced
+REPORT_HTML_VERSION = 2
+
+SECTION_ICONS = {
+    "Initial Assessment": "📝",
+    "Recommendations": "💡",
+    "Management Plan": "📋",
+    "Critical Considerations": "⚠️"
+}
+
+def _inline_html(text):
+    """Escape text, then apply the markdown emphasis reports use (**bold**, *italic*)"""
+    text = html.escape(text, quote=False)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])", r"<em>\1</em>", text)
+    return text
+
+def markdown_html(content):
+    """HTML for a section body: paragraphs and (nested) bullet or numbered lists
+
+    Everything is escaped first, so model output can't inject markup.
+    """
+    out = []
+    lists = []  # open lists as (tag, indent)
+    paragraph = []
+    blank = False  # a blank line came right before this one
+
+    def close_paragraph():
+        if paragraph:
+            out.append("<p>" + "<br>".join(paragraph) + "</p>")
+            paragraph.clear()
+
+    def close_lists(indent=-1):
+        while lists and lists[-1][1] > indent:
+            out.append(f"</li></{lists.pop()[0]}>")
+
+    for line in content.splitlines():
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        item = re.match(r"(?:([-*•+])|(\d+)[.)])\s+(.*)", stripped)
+        if item:
+            close_paragraph()
+            tag = "ul" if item.group(1) else "ol"
+            close_lists(indent)
+            if lists and lists[-1][1] == indent and lists[-1][0] == tag:
+                out.append("</li>")
+            else:
+                if lists and lists[-1][1] == indent:
+                    close_lists(indent - 1)
+                out.append(f"<{tag}>")
+                lists.append((tag, indent))
+            out.append("<li>" + _inline_html(item.group(3)))
+        elif not stripped:
+            close_paragraph()
+            blank = True
+            continue
+        elif stripped.startswith("#"):
+            close_paragraph()
+            close_lists()
+            out.append(f"<h4>{_inline_html(stripped.lstrip('#').strip())}</h4>")
+        else:
+            if blank:
+                # After a blank line, text only stays in lists it is indented under
+                close_lists(indent - 1)
+            if lists:
+                # Continuation of the current list item
+                out.append("<br>" + _inline_html(stripped))
+            else:
+                paragraph.append(_inline_html(stripped))
+        blank = False
+    close_paragraph()
+    close_lists()
+    return "".join(out)
+
+def report_html(report):
+    """The whole report as one block of styled HTML (classes in static/theme.css)"""
+    parts = []
+    for title, content in parse_report_sections(report) or [("", report)]:
+        critical = "Critical Considerations" in title
+        heading = ""
+        if title:
+            icon = next((icon for name, icon in SECTION_ICONS.items() if name in title), "")
+            if icon and not title.startswith(icon):
+                title = f"{icon} {title}"
+            heading = f"<h3>{_inline_html(title)}</h3>"
+        css_class = "report-section report-critical" if critical else "report-section"
+        parts.append(f"<section class='{css_class}'>{heading}{markdown_html(content)}</section>")
+    return "<div class='report'>" + "".join(parts) + "</div>"
+
+def generate_report_download(report_content, specialty):
+    """Generate a downloadable report file"""
+    # Create a timestamp for the filename
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{specialty}_Report_{timestamp}.txt"
+    
+    # Format the report content for download
+    formatted_report = f"AI SMART HOSPITAL - Medical Consultation Report\n"
+    formatted_report += f"Specialty: {specialty}\n"
+    formatted_report += f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    formatted_report += "="*50 + "\n\n"
+    
+    # Remove markdown syntax for plain text report
+    clean_report = re.sub(r'#{1,6}\s*', '', report_content)  # Remove headings
+    clean_report = re.sub(r'\*{1,2}(.*?)\*{1,2}', r'\1', clean_report)  # Remove bold/italic
+    clean_report = re.sub(r'-\s+', '* ', clean_report)  # Convert dashes to bullets
+    formatted_report += clean_report
+    
+    return formatted_report, filename
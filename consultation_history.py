@@ -0,0 +1,136 @@
+import os
+import json
+import zlib
+import sqlite3
+import datetime
+import threading
+
+# =============================
+# Consultation History
+# =============================
+# Finished consultations (problem, questions, answers and report) moved out
+# of st.session_state into a local SQLite database. The payload is stored as
+# zlib-compressed JSON next to a few small columns, so listing a session's
+# history reads only the index columns and a past report is decompressed
+# only when it is opened. Session state then holds just the active
+# consultation, however many a user runs.
+#
+# History is read back by session_id, a random id the server issues per
+# browser session and never puts in the URL. user_id is stored alongside but
+# never used for lookups: it comes from ?user= and the Profile ID box, so
+# anyone who knows or guesses a profile id could otherwise read its reports.
+
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join("data", "history.db"))
+
+# Characters of the problem kept uncompressed for the history list
+TITLE_LENGTH = 80
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS consultations (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    specialty TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    payload BLOB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS consultations_by_user
+    ON consultations (user_id, specialty, created_at);
+
+CREATE INDEX IF NOT EXISTS consultations_by_session
+    ON consultations (session_id, specialty, created_at);
+"""
+
+
+def compress(data):
+    return zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def decompress(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class ConsultationHistory:
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        # sqlite3 connections are not shareable across Streamlit's script threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, user_id, session_id, specialty, problem, questions, answers, report, user_data=None):
+        """Store a finished consultation; returns its id"""
+        payload = {
+            "problem": problem,
+            "questions": list(questions),
+            "answers": list(answers),
+            "report": report,
+            "user_data": user_data or {}
+        }
+        title = " ".join(problem.split())
+        if len(title) > TITLE_LENGTH:
+            title = title[:TITLE_LENGTH - 1].rstrip() + "…"
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO consultations (user_id, session_id, specialty, created_at, title, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, session_id, specialty or "General", int(datetime.datetime.now().timestamp()), title, compress(payload))
+            )
+        return cur.lastrowid
+
+    def recent(self, session_id, specialty=None, limit=20, offset=0):
+        """Newest-first summaries (no report text) for the history list"""
+        query = "SELECT id, specialty, created_at, title FROM consultations WHERE session_id = ?"
+        params = [session_id]
+        if specialty:
+            query += " AND specialty = ?"
+            params.append(specialty)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        return [
+            {
+                "id": row[0],
+                "specialty": row[1],
+                "created_at": datetime.datetime.fromtimestamp(row[2]),
+                "title": row[3]
+            }
+            for row in self._conn().execute(query, params)
+        ]
+
+    def count(self, session_id, specialty=None):
+        if specialty:
+            row = self._conn().execute(
+                "SELECT COUNT(*) FROM consultations WHERE session_id = ? AND specialty = ?", (session_id, specialty)
+            ).fetchone()
+        else:
+            row = self._conn().execute("SELECT COUNT(*) FROM consultations WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0]
+
+    def load(self, session_id, consultation_id):
+        """The full consultation, or None if it doesn't exist or belongs to another session"""
+        row = self._conn().execute(
+            "SELECT specialty, created_at, payload FROM consultations WHERE id = ? AND session_id = ?",
+            (consultation_id, session_id)
+        ).fetchone()
+        if row is None:
+            return None
+        consultation = decompress(row[2])
+        consultation.update(id=consultation_id, specialty=row[0], created_at=datetime.datetime.fromtimestamp(row[1]))
+        return consultation
+
+    def delete(self, session_id, consultation_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM consultations WHERE id = ? AND session_id = ?", (consultation_id, session_id))
@@ -0,0 +1,67 @@
+import numpy as np
+
+# =============================
+# Server-side Chart Downsampling
+# =============================
+# Keeps chart payloads to a fixed point budget however long the history is.
+# Line charts use Largest-Triangle-Three-Buckets (LTTB), which preserves the
+# visual shape of the series; bar charts use plain time-bucket aggregation.
+
+CHART_POINT_BUDGET = 300
+
+
+def lttb(x, y, threshold=CHART_POINT_BUDGET):
+    """Downsample a line series to at most `threshold` points. Returns (x, y) arrays."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # First and last points are always kept; the rest is split into equal buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0] = 0
+    keep[-1] = n - 1
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket acts as the third triangle vertex
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        ax, ay = x[selected], y[selected]
+        areas = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        selected = start + int(np.argmax(areas))
+        keep[i + 1] = selected
+    return x[keep], y[keep]
+
+
+def bucket_aggregate(x, y, buckets=CHART_POINT_BUDGET, how="mean"):
+    """Aggregate a series into `buckets` equal-width time buckets. Returns (bucket_start, value) arrays."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= buckets:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    index = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, buckets - 1)
+    counts = np.bincount(index, minlength=buckets)
+    if how == "mean":
+        values = np.bincount(index, weights=y, minlength=buckets)
+        values = np.divide(values, counts, out=np.zeros(buckets), where=counts > 0)
+    elif how == "sum":
+        values = np.bincount(index, weights=y, minlength=buckets)
+    elif how == "max":
+        values = np.full(buckets, -np.inf)
+        np.maximum.at(values, index, y)
+    elif how == "min":
+        values = np.full(buckets, np.inf)
+        np.minimum.at(values, index, y)
+    else:
+        raise ValueError(f"Unknown aggregation: {how}")
+
+    # Empty buckets are dropped rather than plotted as zeros
+    mask = counts > 0
+    return edges[:-1][mask], values[mask]
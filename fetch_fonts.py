@@ -0,0 +1,77 @@
+import os
+import argparse
+import urllib.request
+
+# =============================
+# Self-hosted Fonts
+# =============================
+# Montserrat (SIL Open Font License 1.1) is served from ./static/fonts so the
+# first paint needs no request to Google Fonts. This downloads the latin
+# subsets once, from the @fontsource/montserrat npm package, together with
+# the licence that has to ship next to them; commit the result and enable the
+# [[theme.fontFaces]] entries in .streamlit/config.toml.
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "fonts")
+SOURCE_URL = "https://cdn.jsdelivr.net/npm/@fontsource/montserrat@5"
+
+# Served file name -> font weight
+FONT_FILES = {
+    "Montserrat-Regular.woff2": 400,
+    "Montserrat-Medium.woff2": 500,
+    "Montserrat-SemiBold.woff2": 600,
+    "Montserrat-Bold.woff2": 700,
+}
+LICENSE_FILE = "OFL.txt"
+
+WOFF2_SIGNATURE = b"wOF2"
+FETCH_TIMEOUT = 30
+
+
+def font_url(weight, base=SOURCE_URL):
+    return f"{base}/files/montserrat-latin-{weight}-normal.woff2"
+
+
+def download(url, timeout=FETCH_TIMEOUT):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+def fetch_fonts(target=FONTS_DIR, base=SOURCE_URL, fetch=download):
+    """Download the font files and their licence into `target`; returns the paths written
+
+    Every file is checked before anything is written, so a proxy error page
+    never ends up served as a font.
+    """
+    files = {}
+    for name, weight in FONT_FILES.items():
+        data = fetch(font_url(weight, base))
+        if not data.startswith(WOFF2_SIGNATURE):
+            raise ValueError(f"{font_url(weight, base)} did not return a woff2 font")
+        files[name] = data
+    license_text = fetch(f"{base}/LICENSE")
+    if b"SIL OPEN FONT LICENSE" not in license_text.upper():
+        raise ValueError(f"{base}/LICENSE is not the SIL Open Font License")
+    files[LICENSE_FILE] = license_text
+
+    os.makedirs(target, exist_ok=True)
+    written = []
+    for name, data in files.items():
+        path = os.path.join(target, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        written.append(path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the self-hosted Montserrat font files into static/fonts.")
+    parser.add_argument("--target", default=FONTS_DIR, help="Directory to write the font files to")
+    parser.add_argument("--source", default=SOURCE_URL, help="Base URL of the @fontsource/montserrat package")
+    args = parser.parse_args()
+
+    for path in fetch_fonts(args.target, args.source):
+        print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+import io
+import os
+import csv
+import json
+import zipfile
+import argparse
+import datetime
+import xml.etree.ElementTree as ET
+
+from health_store import HealthStore, HEALTH_DB_PATH
+
+# =============================
+# Wearable / Fitness Export Import
+# =============================
+# Streams Apple Health (export.xml / export.zip), Google Fit (Takeout CSV or
+# raw JSON) and generic CSV/JSON exports into the health store. Files are
+# parsed incrementally and written in fixed-size batches, so memory stays
+# bounded however large the export is. Duplicate timestamps are skipped by
+# the store's (user, metric, ts) key.
+
+IMPORT_BATCH_SIZE = 5000
+
+# Largest single JSON value (one record, or the text before Google Fit's
+# "Data Points" array) held while parsing; beyond this the file is malformed
+# or not a format we read, and buffering more would only grow memory
+MAX_JSON_VALUE_CHARS = 1 << 20
+
+APPLE_HEALTH_TYPES = {
+    "HKQuantityTypeIdentifierBodyMass": "weight",
+    "HKQuantityTypeIdentifierBodyMassIndex": "bmi",
+    "HKQuantityTypeIdentifierBodyFatPercentage": "body_fat",
+    "HKQuantityTypeIdentifierDietaryEnergyConsumed": "calories",
+    "HKQuantityTypeIdentifierStepCount": "steps",
+    "HKQuantityTypeIdentifierHeartRate": "heart_rate"
+}
+
+GOOGLE_FIT_TYPES = {
+    "com.google.weight": "weight",
+    "com.google.body.fat.percentage": "body_fat",
+    "com.google.nutrition": "calories",
+    "com.google.step_count.delta": "steps",
+    "com.google.heart_rate.bpm": "heart_rate"
+}
+
+# Column names accepted in CSV/JSON exports (lower-cased) and the metric they feed
+COLUMN_ALIASES = {
+    "weight": "weight", "weight (kg)": "weight", "average weight (kg)": "weight", "body mass": "weight",
+    "bmi": "bmi",
+    "body_fat": "body_fat", "body fat": "body_fat", "body fat (%)": "body_fat", "body fat percentage": "body_fat",
+    "calories": "calories", "calories (kcal)": "calories", "energy (kcal)": "calories",
+    "steps": "steps", "step count": "steps",
+    "heart_rate": "heart_rate", "heart rate": "heart_rate", "average heart rate (bpm)": "heart_rate"
+}
+
+TIMESTAMP_COLUMNS = ("timestamp", "datetime", "date", "time", "start time", "startdate", "start_date")
+
+POUNDS_TO_KG = 0.45359237
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ProgressReader(io.RawIOBase):
+    """Binary stream wrapper that counts bytes read for progress reporting"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        return n
+
+
+def parse_timestamp(value):
+    """Parse ISO strings, Apple Health dates or epoch seconds/milliseconds"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        # Millisecond and nanosecond epochs are common in fitness exports
+        while value > 1e11:
+            value /= 1000
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+    value = str(value).strip()
+    if value.replace(".", "", 1).isdigit():
+        return parse_timestamp(float(value))
+    for fmt in ("%Y-%m-%d %H:%M:%S %z", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def to_float(value):
+    try:
+        return float(str(value).strip().replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+# =============================
+# Format-specific record streams
+# =============================
+# Each reader yields (metric, timestamp, value) tuples one at a time.
+
+def iter_apple_health(stream):
+    root = None
+    try:
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag == "Record":
+                metric = APPLE_HEALTH_TYPES.get(elem.get("type"))
+                if metric:
+                    ts = parse_timestamp(elem.get("startDate"))
+                    value = to_float(elem.get("value"))
+                    if ts is not None and value is not None:
+                        unit = elem.get("unit", "")
+                        if metric == "weight" and unit == "lb":
+                            value *= POUNDS_TO_KG
+                        elif metric == "body_fat" and unit == "%" and value <= 1:
+                            value *= 100  # Apple stores body fat as a fraction
+                        elif metric == "calories" and unit == "kJ":
+                            value /= 4.184
+                        yield metric, ts, value
+            # Drop parsed elements, and detach them from <HealthData>, so the tree
+            # never grows beyond one record
+            if elem.tag in ("Record", "Workout", "ActivitySummary", "Correlation", "ClinicalRecord"):
+                elem.clear()
+                root.clear()
+    except ET.ParseError as e:
+        line, column = e.position
+        raise ImportFormatError(f"The Apple Health export is not valid XML (line {line}, column {column})") from e
+
+
+def iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        yield from _iter_csv_rows(csv.DictReader(text))
+    except csv.Error as e:
+        raise ImportFormatError(f"The CSV file could not be read: {e}") from e
+
+
+def _iter_csv_rows(reader):
+    if not reader.fieldnames:
+        return
+    columns = {name: name.strip().lower() for name in reader.fieldnames}
+    ts_column = next((name for name, low in columns.items() if low in TIMESTAMP_COLUMNS), None)
+    if ts_column is None:
+        raise ImportFormatError("CSV needs a timestamp or date column")
+
+    # Long format: timestamp, metric, value
+    if {"metric", "value"} <= set(columns.values()):
+        metric_column = next(name for name, low in columns.items() if low == "metric")
+        value_column = next(name for name, low in columns.items() if low == "value")
+        for row in reader:
+            metric = COLUMN_ALIASES.get((row.get(metric_column) or "").strip().lower())
+            ts = parse_timestamp(row.get(ts_column))
+            value = to_float(row.get(value_column))
+            if metric and ts is not None and value is not None:
+                yield metric, ts, value
+        return
+
+    # Wide format: one column per metric (generic exports, Google Fit daily metrics)
+    metric_columns = {name: COLUMN_ALIASES[low] for name, low in columns.items() if low in COLUMN_ALIASES}
+    if not metric_columns:
+        raise ImportFormatError("CSV has no recognised metric columns")
+    for row in reader:
+        ts = parse_timestamp(row.get(ts_column))
+        if ts is None:
+            continue
+        for column, metric in metric_columns.items():
+            value = to_float(row.get(column))
+            if value is not None:
+                yield metric, ts, value
+
+
+def iter_json_values(stream, chunk_size=1 << 16):
+    """Yield objects from a JSON array, JSON Lines, or the "Data Points" array of a Google Fit file"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    in_array = False
+    json_lines = False
+
+    def fill():
+        nonlocal buffer, pos
+        chunk = text.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return bool(chunk)
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buffer):
+            if not fill():
+                return
+            continue
+
+        if in_array and buffer[pos] == "]":
+            return
+        if not in_array and not json_lines:
+            if buffer[pos] == "[":
+                in_array = True
+                pos += 1
+                continue
+            # Google Fit wraps its points in {"Data Source": ..., "Data Points": [...]}
+            marker = buffer.find('"Data Points"', pos)
+            bracket = buffer.find("[", marker) if marker != -1 else -1
+            if bracket != -1:
+                in_array = True
+                pos = bracket + 1
+                continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if len(buffer) - pos > MAX_JSON_VALUE_CHARS:
+                raise ImportFormatError(
+                    f"Invalid JSON export: no complete record in {MAX_JSON_VALUE_CHARS // 1024} KB of data"
+                )
+            # Value continues in the next chunk
+            if not fill():
+                raise ImportFormatError("Truncated or invalid JSON export")
+            continue
+        if not in_array:
+            json_lines = True
+        pos = end
+        yield value
+
+
+def iter_json(stream):
+    for item in iter_json_values(stream):
+        if not isinstance(item, dict):
+            continue
+
+        # Google Fit raw data point
+        if "dataTypeName" in item:
+            metric = GOOGLE_FIT_TYPES.get(item["dataTypeName"])
+            ts = parse_timestamp(to_float(item.get("startTimeNanos")))
+            values = item.get("fitValue") or []
+            if metric and ts is not None and values:
+                raw = values[0].get("value", {})
+                value = raw.get("fpVal", raw.get("intVal"))
+                if value is not None:
+                    yield metric, ts, float(value)
+            continue
+
+        lowered = {str(k).strip().lower(): v for k, v in item.items()}
+        ts_key = next((k for k in TIMESTAMP_COLUMNS if k in lowered), None)
+        ts = parse_timestamp(lowered.get(ts_key)) if ts_key else None
+        if ts is None:
+            continue
+        if "metric" in lowered and "value" in lowered:
+            metric = COLUMN_ALIASES.get(str(lowered["metric"]).strip().lower())
+            value = to_float(lowered["value"])
+            if metric and value is not None:
+                yield metric, ts, value
+            continue
+        for key, metric in COLUMN_ALIASES.items():
+            if key in lowered:
+                value = to_float(lowered[key])
+                if value is not None:
+                    yield metric, ts, value
+
+
+def detect_format(filename, head):
+    name = filename.lower()
+    if name.endswith(".xml") or head.lstrip().startswith(b"<?xml") or b"<HealthData" in head:
+        return "apple"
+    if name.endswith((".json", ".jsonl", ".ndjson")) or head.lstrip()[:1] in (b"[", b"{"):
+        return "json"
+    return "csv"
+
+
+def open_records(stream, filename):
+    """Pick a record iterator for an export file by name and leading bytes"""
+    head = stream.peek(512)[:512]
+    readers = {"apple": iter_apple_health, "json": iter_json, "csv": iter_csv}
+    return readers[detect_format(filename, head)](stream)
+
+
+def open_archive_member(stream):
+    """Open the export file inside a zip archive. Returns (member stream, name, uncompressed size)."""
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile as e:
+        raise ImportFormatError("The archive is damaged or is not a zip file") from e
+    infos = archive.infolist()
+    member = next((i for i in infos if i.filename.endswith("export.xml")), None)
+    if member is None:
+        member = next((i for i in infos if i.filename.lower().endswith((".csv", ".json", ".jsonl", ".xml"))), None)
+    if member is None:
+        raise ImportFormatError("Archive contains no supported export file")
+    return archive.open(member), member.filename, member.file_size
+
+
+# =============================
+# Import driver
+# =============================
+def import_export(store, user_id, stream, filename, total_bytes=None, progress=None, batch_size=IMPORT_BATCH_SIZE):
+    """Stream an export into the store in batches.
+
+    `progress(bytes_read, total_bytes, imported, duplicates)` is called after every batch.
+    Returns a summary dict.
+    """
+    if filename.lower().endswith(".zip"):
+        # Progress is tracked against the uncompressed member being parsed
+        stream, filename, total_bytes = open_archive_member(stream)
+    counter = ProgressReader(stream)
+    reader = io.BufferedReader(counter, buffer_size=1 << 16)
+    records = open_records(reader, filename)
+
+    imported = 0
+    duplicates = 0
+    batch = {}
+    batch_len = 0
+
+    def flush():
+        nonlocal imported, duplicates, batch, batch_len
+        for metric, points in batch.items():
+            added = store.add_measurements(user_id, metric, points.items(), source="import")
+            imported += added
+            duplicates += len(points) - added
+        batch = {}
+        batch_len = 0
+        if progress:
+            progress(counter.bytes_read, total_bytes, imported, duplicates)
+
+    try:
+        for metric, ts, value in records:
+            # Dedupe within the batch too; the store dedupes against history
+            points = batch.setdefault(metric, {})
+            key = int(ts.timestamp())
+            if key in points:
+                duplicates += 1
+                continue
+            points[key] = value
+            batch_len += 1
+            if batch_len >= batch_size:
+                flush()
+    except zipfile.BadZipFile as e:
+        # A corrupt member only shows up once its data is read (bad CRC, truncated archive)
+        raise ImportFormatError("The archive is damaged and could not be read to the end") from e
+    except UnicodeDecodeError as e:
+        raise ImportFormatError("The file is not UTF-8 text") from e
+    flush()
+
+    return {"imported": imported, "duplicates": duplicates, "bytes_read": counter.bytes_read}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a wearable or fitness export into the health store.")
+    parser.add_argument("path", help="Apple Health export.zip/export.xml, Google Fit file, or CSV/JSON export")
+    parser.add_argument("--user", required=True, help="Profile ID to import the measurements under")
+    parser.add_argument("--db", default=HEALTH_DB_PATH, help="Path to the health store database")
+    args = parser.parse_args()
+
+    store = HealthStore(args.db)
+    total = os.path.getsize(args.path)
+
+    def report(done, total_bytes, imported, duplicates):
+        pct = 100 * done / total_bytes if total_bytes else 0
+        print(f"\r{pct:5.1f}%  imported={imported}  duplicates={duplicates}", end="", flush=True)
+
+    with open(args.path, "rb") as f:
+        summary = import_export(store, args.user, f, args.path, total_bytes=total, progress=report)
+    print()
+    print(f"Imported {summary['imported']} measurements ({summary['duplicates']} duplicates skipped)")
+
+
+if __name__ == "__main__":
+    main()
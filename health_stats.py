@@ -0,0 +1,250 @@
+import json
+import math
+
+import numpy as np
+
+# =============================
+# Incremental Rolling Statistics
+# =============================
+# Keeps per-metric rolling mean, trend slope, rate of change and anomaly
+# flags up to date as measurements arrive. Each update is O(1): a fixed-size
+# ring buffer with running sums for the rolling window, plus exponentially
+# weighted mean/variance for anomaly detection. State is a small JSON blob
+# persisted next to the measurements.
+
+STATS_WINDOW = 30
+EWMA_ALPHA = 0.1
+ANOMALY_Z = 3.0
+ANOMALY_MIN_POINTS = 8
+SECONDS_PER_DAY = 86400.0
+
+METRIC_LABELS = {
+    "weight": ("weight", "kg"),
+    "bmi": ("BMI", ""),
+    "body_fat": ("body fat", "%"),
+    "calories": ("daily calories", "kcal"),
+    "steps": ("step count", ""),
+    "heart_rate": ("heart rate", "bpm")
+}
+
+
+class RollingStats:
+    def __init__(self, window=STATS_WINDOW, alpha=EWMA_ALPHA):
+        self.window = window
+        self.alpha = alpha
+        self.days = np.zeros(window)
+        self.values = np.zeros(window)
+        self.head = 0  # next slot to overwrite
+        self.size = 0
+        self.origin = None  # epoch seconds that x=0 days refers to
+        # Running sums over the window (x in days since origin)
+        self.sx = self.sy = self.sxx = self.sxy = self.syy = 0.0
+        self.updates_since_resync = 0
+        # Whole-history aggregates
+        self.count = 0
+        self.first_ts = self.last_ts = None
+        self.first_value = self.last_value = None
+        self.min = self.max = None
+        self.rate = None  # change per day between the last two points
+        # Exponentially weighted mean/variance for anomaly detection
+        self.ewma = None
+        self.ewm_var = 0.0
+        self.last_z = 0.0
+        self.last_anomaly = False
+
+    def update(self, ts, value):
+        """Add one point (epoch seconds, value); points must arrive in time order"""
+        ts = float(ts)
+        value = float(value)
+        if self.last_ts is not None and ts < self.last_ts:
+            raise ValueError("RollingStats.update needs points in time order; rebuild instead")
+        if self.origin is None:
+            self.origin = ts
+        day = (ts - self.origin) / SECONDS_PER_DAY
+
+        # Slide the window: drop the oldest point once full
+        if self.size == self.window:
+            old_day, old_value = self.days[self.head], self.values[self.head]
+            self.sx -= old_day
+            self.sy -= old_value
+            self.sxx -= old_day * old_day
+            self.sxy -= old_day * old_value
+            self.syy -= old_value * old_value
+        else:
+            self.size += 1
+        self.days[self.head] = day
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.window
+        self.sx += day
+        self.sy += value
+        self.sxx += day * day
+        self.sxy += day * value
+        self.syy += value * value
+
+        # Periodically recompute the sums from the buffer to cancel float drift
+        self.updates_since_resync += 1
+        if self.updates_since_resync >= self.window:
+            self._resync()
+
+        # Anomaly score is taken against the history *before* this point
+        if self.ewma is None:
+            self.ewma = value
+            self.last_z = 0.0
+        else:
+            std = math.sqrt(self.ewm_var)
+            self.last_z = (value - self.ewma) / std if std > 1e-9 else 0.0
+            diff = value - self.ewma
+            self.ewma += self.alpha * diff
+            self.ewm_var = (1 - self.alpha) * (self.ewm_var + self.alpha * diff * diff)
+        self.last_anomaly = self.count >= ANOMALY_MIN_POINTS and abs(self.last_z) >= ANOMALY_Z
+
+        if self.last_ts is not None and ts > self.last_ts:
+            self.rate = (value - self.last_value) / ((ts - self.last_ts) / SECONDS_PER_DAY)
+        if self.count == 0:
+            self.first_ts, self.first_value = ts, value
+            self.min = self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+        self.last_ts, self.last_value = ts, value
+        self.count += 1
+        return self.last_anomaly
+
+    def _resync(self):
+        days = self.days[:self.size]
+        values = self.values[:self.size]
+        self.sx = float(days.sum())
+        self.sy = float(values.sum())
+        self.sxx = float(days @ days)
+        self.sxy = float(days @ values)
+        self.syy = float(values @ values)
+        self.updates_since_resync = 0
+
+    @property
+    def mean(self):
+        return self.sy / self.size if self.size else None
+
+    @property
+    def std(self):
+        if self.size < 2:
+            return 0.0
+        var = (self.syy - self.sy * self.sy / self.size) / (self.size - 1)
+        return math.sqrt(max(var, 0.0))
+
+    @property
+    def slope(self):
+        """Least-squares trend over the window, in units per day"""
+        if self.size < 2:
+            return None
+        denom = self.size * self.sxx - self.sx * self.sx
+        if abs(denom) < 1e-12:
+            return None
+        return (self.size * self.sxy - self.sx * self.sy) / denom
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "window": self.size,
+            "mean": self.mean,
+            "std": self.std,
+            "slope_per_day": self.slope,
+            "rate_per_day": self.rate,
+            "first_ts": self.first_ts,
+            "first_value": self.first_value,
+            "last_ts": self.last_ts,
+            "last_value": self.last_value,
+            "min": self.min,
+            "max": self.max,
+            "z_score": self.last_z,
+            "anomaly": self.last_anomaly
+        }
+
+    def to_json(self):
+        # Store the window oldest-first so it can be replayed into a fresh buffer
+        order = [(self.head + i) % self.window for i in range(self.window)][-self.size:] if self.size else []
+        return json.dumps({
+            "window": self.window,
+            "alpha": self.alpha,
+            "origin": self.origin,
+            "points": [[float(self.days[i]), float(self.values[i])] for i in order],
+            "count": self.count,
+            "first": [self.first_ts, self.first_value],
+            "last": [self.last_ts, self.last_value],
+            "min": self.min,
+            "max": self.max,
+            "rate": self.rate,
+            "ewma": self.ewma,
+            "ewm_var": self.ewm_var,
+            "last_z": self.last_z,
+            "last_anomaly": self.last_anomaly
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        stats = cls(window=data["window"], alpha=data["alpha"])
+        stats.origin = data["origin"]
+        for i, (day, value) in enumerate(data["points"]):
+            stats.days[i] = day
+            stats.values[i] = value
+        stats.size = len(data["points"])
+        stats.head = stats.size % stats.window
+        stats._resync()
+        stats.count = data["count"]
+        stats.first_ts, stats.first_value = data["first"]
+        stats.last_ts, stats.last_value = data["last"]
+        stats.min = data["min"]
+        stats.max = data["max"]
+        stats.rate = data["rate"]
+        stats.ewma = data["ewma"]
+        stats.ewm_var = data["ewm_var"]
+        stats.last_z = data["last_z"]
+        stats.last_anomaly = data["last_anomaly"]
+        return stats
+
+
+# =============================
+# Insight Generation
+# =============================
+def _fmt(value, unit):
+    text = f"{value:,.1f}"
+    return f"{text} {unit}".strip() if unit else text
+
+
+def generate_insights(summaries):
+    """Turn per-metric summaries ({metric: RollingStats.summary()}) into readable insights"""
+    insights = []
+    for metric, s in summaries.items():
+        if not s or not s["count"]:
+            continue
+        label, unit = METRIC_LABELS.get(metric, (metric.replace("_", " "), ""))
+        if s["count"] == 1:
+            insights.append(f"Your first {label} reading is {_fmt(s['last_value'], unit)}. Record more to see trends.")
+            continue
+
+        slope = s["slope_per_day"]
+        span_days = (s["last_ts"] - s["first_ts"]) / SECONDS_PER_DAY
+        mean = s["mean"] or 0.0
+        # Treat less than 0.5% of the average per week as flat
+        if slope is None or abs(slope * 7) < 0.005 * abs(mean):
+            trend = f"Your {label} has been stable, averaging {_fmt(mean, unit)} over your recent readings"
+        else:
+            direction = "an upward" if slope > 0 else "a downward"
+            trend = f"Your {label} shows {direction} trend of {_fmt(abs(slope) * 7, unit)} per week over your recent readings"
+        insights.append(trend)
+
+        if span_days >= 1:
+            change = s["last_value"] - s["first_value"]
+            verb = "increased" if change > 0 else "decreased" if change < 0 else "stayed at"
+            if change:
+                insights.append(f"{label.capitalize()} has {verb} from {_fmt(s['first_value'], unit)} to {_fmt(s['last_value'], unit)} since you started tracking")
+
+        if metric == "calories" and mean and s["std"] / mean > 0.15:
+            insights.append(f"Your {label} vary quite a bit from day to day (±{_fmt(s['std'], unit)})")
+
+        if s["anomaly"]:
+            direction = "high" if s["z_score"] > 0 else "low"
+            insights.append(
+                f"⚠️ Your latest {label} reading ({_fmt(s['last_value'], unit)}) is unusually {direction} compared with your recent pattern. Double-check it or consult a professional if it persists."
+            )
+    return insights
@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import threading
+import datetime
+
+from health_stats import RollingStats
+
+# =============================
+# Health Measurement Store
+# =============================
+# Per-user time series of calculator results (BMI, body fat, calories, ...)
+# kept in a local SQLite database in WAL mode. Every insert also updates
+# weekly and monthly rollups in the same transaction so the analytics tab
+# reads precomputed aggregates instead of rescanning raw history. Rolling
+# statistics (health_stats.RollingStats) are maintained the same way.
+
+HEALTH_DB_PATH = os.getenv("HEALTH_DB_PATH", os.path.join("data", "health.db"))
+
+ROLLUP_PERIODS = ("week", "month")
+
+# metric_stats marker for statistics that need a full replay after a backfill
+STALE_STATS = "stale"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    user_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    source TEXT NOT NULL DEFAULT 'calculator',
+    PRIMARY KEY (user_id, metric, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollups (
+    user_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    last_ts INTEGER NOT NULL,
+    last_value REAL NOT NULL,
+    PRIMARY KEY (user_id, metric, period, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS metric_stats (
+    user_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (user_id, metric)
+) WITHOUT ROWID;
+"""
+
+
+def to_epoch(ts):
+    """Convert a datetime/date/epoch value to integer UTC seconds"""
+    if ts is None:
+        return int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    if isinstance(ts, (int, float)):
+        return int(ts)
+    if isinstance(ts, datetime.datetime):
+        if ts.tzinfo is None:
+            ts = ts.astimezone()
+        return int(ts.timestamp())
+    if isinstance(ts, datetime.date):
+        return to_epoch(datetime.datetime(ts.year, ts.month, ts.day))
+    raise TypeError(f"Unsupported timestamp: {ts!r}")
+
+
+def bucket_for(ts, period):
+    """Return the rollup bucket (ISO date of the period start) for an epoch timestamp"""
+    day = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).date()
+    if period == "week":
+        day = day - datetime.timedelta(days=day.weekday())
+    elif period == "month":
+        day = day.replace(day=1)
+    else:
+        raise ValueError(f"Unknown rollup period: {period}")
+    return day.isoformat()
+
+
+class HealthStore:
+    def __init__(self, path=HEALTH_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        # sqlite3 connections are not shareable across Streamlit's script threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_measurements(self, user_id, metric, points, source="calculator"):
+        """Append (ts, value) points; duplicates by timestamp are ignored. Returns rows inserted."""
+        conn = self._conn()
+        inserted = []
+        with conn:
+            for ts, value in points:
+                ts = to_epoch(ts)
+                value = float(value)
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO measurements (user_id, metric, ts, value, source) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, metric, ts, value, source)
+                )
+                if cur.rowcount != 1:
+                    continue
+                inserted.append((ts, value))
+                for period in ROLLUP_PERIODS:
+                    conn.execute(
+                        """
+                        INSERT INTO rollups (user_id, metric, period, bucket, count, total, min, max, last_ts, last_value)
+                        VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)
+                        ON CONFLICT (user_id, metric, period, bucket) DO UPDATE SET
+                            count = count + 1,
+                            total = total + excluded.total,
+                            min = MIN(min, excluded.min),
+                            max = MAX(max, excluded.max),
+                            last_value = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_value ELSE last_value END,
+                            last_ts = MAX(last_ts, excluded.last_ts)
+                        """,
+                        (user_id, metric, period, bucket_for(ts, period), value, value, value, ts, value)
+                    )
+            if inserted:
+                self._update_stats(conn, user_id, metric, inserted)
+        return len(inserted)
+
+    def _update_stats(self, conn, user_id, metric, inserted):
+        row = conn.execute(
+            "SELECT state FROM metric_stats WHERE user_id = ? AND metric = ?", (user_id, metric)
+        ).fetchone()
+        if row and row[0] == STALE_STATS:
+            return
+        stats = RollingStats.from_json(row[0]) if row else RollingStats()
+        inserted.sort()
+        if stats.last_ts is not None and inserted[0][0] < stats.last_ts:
+            # Backfilled history (e.g. an import older than existing readings) can't be
+            # applied incrementally; rebuild once on the next read instead of per batch
+            state = STALE_STATS
+        else:
+            for ts, value in inserted:
+                stats.update(ts, value)
+            state = stats.to_json()
+        conn.execute(
+            "INSERT OR REPLACE INTO metric_stats (user_id, metric, state) VALUES (?, ?, ?)",
+            (user_id, metric, state)
+        )
+
+    def _rebuild_stats(self, user_id, metric):
+        conn = self._conn()
+        stats = RollingStats()
+        with conn:
+            for ts, value in conn.execute(
+                "SELECT ts, value FROM measurements WHERE user_id = ? AND metric = ? ORDER BY ts", (user_id, metric)
+            ):
+                stats.update(ts, value)
+            conn.execute(
+                "INSERT OR REPLACE INTO metric_stats (user_id, metric, state) VALUES (?, ?, ?)",
+                (user_id, metric, stats.to_json())
+            )
+        return stats
+
+    def add_measurement(self, user_id, metric, value, ts=None, source="calculator"):
+        return self.add_measurements(user_id, metric, [(ts, value)], source=source)
+
+    def get_measurements(self, user_id, metric, start=None, end=None):
+        """Raw points for a user/metric in [start, end], oldest first"""
+        start = to_epoch(start) if start is not None else 0
+        end = to_epoch(end) if end is not None else 2**62
+        rows = self._conn().execute(
+            "SELECT ts, value FROM measurements WHERE user_id = ? AND metric = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (user_id, metric, start, end)
+        ).fetchall()
+        return [(datetime.datetime.fromtimestamp(ts, datetime.timezone.utc), value) for ts, value in rows]
+
+    def get_rollups(self, user_id, metric, period, start=None, end=None):
+        """Precomputed weekly/monthly aggregates as dicts, oldest bucket first"""
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown rollup period: {period}")
+        start = bucket_for(to_epoch(start), period) if start is not None else ""
+        end = bucket_for(to_epoch(end), period) if end is not None else "9999"
+        rows = self._conn().execute(
+            """
+            SELECT bucket, count, total, min, max, last_value FROM rollups
+            WHERE user_id = ? AND metric = ? AND period = ? AND bucket BETWEEN ? AND ?
+            ORDER BY bucket
+            """,
+            (user_id, metric, period, start, end)
+        ).fetchall()
+        return [
+            {
+                "bucket": datetime.date.fromisoformat(bucket),
+                "count": count,
+                "mean": total / count,
+                "total": total,
+                "min": low,
+                "max": high,
+                "last": last
+            }
+            for bucket, count, total, low, high, last in rows
+        ]
+
+    def get_stats(self, user_id, metric):
+        """Current rolling statistics summary for a user/metric, or None if there is no data"""
+        row = self._conn().execute(
+            "SELECT state FROM metric_stats WHERE user_id = ? AND metric = ?", (user_id, metric)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] == STALE_STATS:
+            return self._rebuild_stats(user_id, metric).summary()
+        return RollingStats.from_json(row[0]).summary()
+
+    def version(self, user_id, metric):
+        """Changes whenever a metric gains readings; cheap enough to use in cache keys"""
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(count), 0) FROM rollups WHERE user_id = ? AND metric = ? AND period = 'month'",
+            (user_id, metric)
+        ).fetchone()
+        return row[0]
+
+    def count_measurements(self, user_id, metric=None):
+        if metric is None:
+            row = self._conn().execute("SELECT COUNT(*) FROM measurements WHERE user_id = ?", (user_id,)).fetchone()
+        else:
+            row = self._conn().execute(
+                "SELECT COUNT(*) FROM measurements WHERE user_id = ? AND metric = ?", (user_id, metric)
+            ).fetchone()
+        return row[0]
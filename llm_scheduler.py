@@ -0,0 +1,164 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+# =============================
+# Priority-aware LLM Scheduler
+# =============================
+# Every Groq call takes a slot from one process-wide scheduler before it is
+# sent. Calls belong to a priority class:
+#
+#   interactive  follow-up questions and report chat (a patient is waiting)
+#   report       assessment reports
+#   background   chat summaries and stale report refreshes
+#   batch        batch_consult.py
+#
+# A waiting call starts when its class is under its concurrency limit and the
+# process is under LLM_MAX_CONCURRENCY; the best waiting call goes first (by
+# class, then earliest deadline). LLM_INTERACTIVE_RESERVED of the process
+# slots are only ever given to interactive calls, so short questions never
+# queue behind reports or batch jobs. After a 429 or a nearly spent
+# rate-limit window the scheduler is "tight" for the retry-after period:
+# reports drop to half their limit and background and batch calls pause.
+#
+# A call's deadline is when its caller's timeout runs out. A call that would
+# start with less than MIN_CALL_SECONDS of it left, queued or not, fails with
+# QueueTimeout; the HTTP timeout of a call that did start is what remains.
+
+PRIORITIES = ("interactive", "report", "background", "batch")
+KIND_PRIORITY = {"question": "interactive", "chat": "interactive", "report": "report", "summary": "background"}
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", "4"))
+CLASS_LIMITS = {
+    "interactive": int(os.getenv("LLM_LIMIT_INTERACTIVE", "16")),
+    "report": int(os.getenv("LLM_LIMIT_REPORT", "8")),
+    "background": int(os.getenv("LLM_LIMIT_BACKGROUND", "2")),
+    "batch": int(os.getenv("LLM_LIMIT_BATCH", "4")),
+}
+
+# Remaining requests in Groq's window at or below which the scheduler turns tight
+TIGHT_REMAINING_REQUESTS = 2
+TIGHT_SECONDS = 5.0
+# A call never starts with less than this much of its deadline left
+MIN_CALL_SECONDS = 2.0
+
+
+class QueueTimeout(Exception):
+    """A call was still waiting for a slot when its deadline passed"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    def __init__(self, total=LLM_MAX_CONCURRENCY, reserved=LLM_INTERACTIVE_RESERVED, limits=None):
+        self.total = total
+        self.reserved = min(reserved, total - 1)
+        self.limits = dict(CLASS_LIMITS if limits is None else limits)
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self.waiting = []  # heap of (class rank, deadline, seq)
+        self.tight_until = 0.0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _limit(self, priority, now):
+        limit = self.limits[priority]
+        if now < self.tight_until:
+            if priority == "report":
+                return max(1, limit // 2)
+            if priority in ("background", "batch"):
+                return 0
+        return limit
+
+    def _startable(self, priority, now):
+        if self.running[priority] >= self._limit(priority, now):
+            return False
+        in_flight = sum(self.running.values())
+        if priority == "interactive":
+            return in_flight < self.total
+        return in_flight < self.total - self.reserved
+
+    def _may_start(self, entry, now):
+        """True if no better waiting call could start in its place"""
+        if not self._startable(PRIORITIES[entry[0]], now):
+            return False
+        for other in self.waiting:
+            if other < entry and self._startable(PRIORITIES[other[0]], now):
+                return False
+        return True
+
+    def has_room(self, priority):
+        """True if a call of this class would start now, ahead of no queued call as good as it"""
+        rank = PRIORITIES.index(priority)
+        with self._cond:
+            now = time.monotonic()
+            return self._startable(priority, now) and not any(entry[0] <= rank for entry in self.waiting)
+
+    @contextmanager
+    def slot(self, priority, deadline):
+        """Wait for a slot; yields the seconds left until the deadline"""
+        queued = time.monotonic()
+        entry = (PRIORITIES.index(priority), deadline, next(self._seq))
+        with self._cond:
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    # Checked before starting too, so a call never gets a timeout under MIN_CALL_SECONDS
+                    left = deadline - now - MIN_CALL_SECONDS
+                    if left <= 0:
+                        metrics.inc("llm_queue_timeouts_total", priority=priority)
+                        raise QueueTimeout(
+                            f"No LLM capacity for this {priority} request in time; please try again.",
+                            retry_after=max(self.tight_until - now, 1.0)
+                        )
+                    if self._may_start(entry, now):
+                        break
+                    # Tight mode ends without a release, so wake up for it too
+                    wake = self.tight_until - now if self.tight_until > now else left
+                    self._cond.wait(min(left, wake))
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self._cond.notify_all()
+            self.running[priority] += 1
+        metrics.observe("llm_queue_seconds", time.monotonic() - queued, priority=priority)
+        try:
+            yield deadline - time.monotonic()
+        finally:
+            with self._cond:
+                self.running[priority] -= 1
+                self._cond.notify_all()
+
+    def note_response(self, status_code, headers):
+        """Turn tight after a 429 or when Groq's request window is nearly spent"""
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if status_code != 429 and not (remaining and remaining.isdigit() and int(remaining) <= TIGHT_REMAINING_REQUESTS):
+            return
+        retry_after = headers.get("retry-after")
+        try:
+            seconds = float(retry_after) if retry_after else TIGHT_SECONDS
+        except ValueError:
+            seconds = TIGHT_SECONDS
+        with self._cond:
+            self.tight_until = max(self.tight_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "running": dict(self.running),
+                "waiting": {p: sum(1 for e in self.waiting if PRIORITIES[e[0]] == p) for p in PRIORITIES},
+                "tight": time.monotonic() < self.tight_until
+            }
+
+
+def priority_for(kind, priority=None):
+    return priority or KIND_PRIORITY.get(kind, "interactive")
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# =============================
+# Record/Replay Transport
+# =============================
+# consultation.groq_completion sends every request through a transport:
+#
+#   GROQ_TRANSPORT=live    the pooled requests.Session (default)
+#   GROQ_TRANSPORT=record  live, and append each exchange to GROQ_FIXTURES
+#   GROQ_TRANSPORT=replay  answer from GROQ_FIXTURES without any network
+#
+# Fixtures are JSON Lines, one exchange per line: a fingerprint of the
+# request (model, messages, max_tokens, temperature, stream; not the key or
+# URL), the status, a few headers, the body, and when each body chunk arrived
+# ([seconds_since_send, bytes] pairs, so SSE streams keep their pacing).
+# GROQ_REPLAY_SPEED=1 replays at the recorded pace, 10 ten times faster and
+# 0 (default) instantly. Repeated identical requests replay their recordings
+# in order, and the last one is reused after that.
+
+GROQ_TRANSPORT = os.getenv("GROQ_TRANSPORT", "live").lower()
+GROQ_FIXTURES = os.getenv("GROQ_FIXTURES", os.path.join("fixtures", "groq.jsonl"))
+GROQ_REPLAY_SPEED = float(os.getenv("GROQ_REPLAY_SPEED", "0"))
+
+# Response headers worth keeping in fixtures (rate limits drive retry logic)
+RECORDED_HEADERS = ("content-type", "retry-after", "x-ratelimit-remaining-requests", "x-ratelimit-remaining-tokens")
+
+
+def fingerprint(payload):
+    request = {k: payload.get(k) for k in ("model", "messages", "max_tokens", "temperature", "stream")}
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:24]
+
+
+class ReplayResponse:
+    """Just enough of requests.Response for consultation.groq_completion"""
+
+    def __init__(self, status_code, headers, body, chunks=None, speed=0.0):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.content = body
+        self.chunks = chunks or [[0.0, len(body)]]
+        self.speed = speed
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=None):
+        """Yield the body in its recorded chunks, paced by GROQ_REPLAY_SPEED"""
+        start = time.perf_counter()
+        offset = 0
+        for at, size in self.chunks:
+            if self.speed:
+                delay = at / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            yield self.content[offset:offset + size]
+            offset += size
+
+
+class LiveTransport:
+    def __init__(self, session):
+        self.session = session
+        self.served = 0  # requests sent, for benchmarks
+        self.lock = threading.Lock()
+
+    def post(self, url, headers, json, timeout):
+        with self.lock:
+            self.served += 1
+        return self.session.post(url, headers=headers, json=json, timeout=timeout)
+
+
+class RecordingTransport:
+    """Calls the API and appends each exchange, with chunk timings, to a fixture file"""
+
+    def __init__(self, session, path=GROQ_FIXTURES):
+        self.session = session
+        self.path = path
+        self.served = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _write(self, entry):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def post(self, url, headers, json, timeout):
+        entry = {"fingerprint": fingerprint(json), "model": json.get("model"), "max_tokens": json.get("max_tokens")}
+        with self.lock:
+            self.served += 1
+        sent = time.perf_counter()
+        try:
+            r = self.session.post(url, headers=headers, json=json, timeout=timeout, stream=True)
+            chunks = []
+            body = b""
+            for chunk in r.iter_content(chunk_size=None):
+                chunks.append([round(time.perf_counter() - sent, 4), len(chunk)])
+                body += chunk
+        except requests.Timeout:
+            self._write(dict(entry, error="timeout", elapsed=round(time.perf_counter() - sent, 4)))
+            raise
+        except requests.RequestException as e:
+            self._write(dict(entry, error=str(e), elapsed=round(time.perf_counter() - sent, 4)))
+            raise
+        kept = {k: r.headers[k] for k in RECORDED_HEADERS if k in r.headers}
+        self._write(dict(entry, status=r.status_code, headers=kept, chunks=chunks, body=body.decode("utf-8", errors="replace")))
+        return ReplayResponse(r.status_code, kept, body, chunks)
+
+
+class ReplayTransport:
+    """Serves recorded exchanges; raises for requests that were never recorded"""
+
+    def __init__(self, path=GROQ_FIXTURES, speed=GROQ_REPLAY_SPEED):
+        self.path = path
+        self.speed = speed
+        self.recordings = {}
+        self.positions = {}
+        self.served = 0
+        self.lock = threading.Lock()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.recordings.setdefault(entry["fingerprint"], []).append(entry)
+
+    def _next(self, key):
+        with self.lock:
+            entries = self.recordings.get(key)
+            if not entries:
+                return None
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            self.served += 1
+            return entries[min(position, len(entries) - 1)]
+
+    def post(self, url, headers, json, timeout):
+        key = fingerprint(json)
+        entry = self._next(key)
+        if entry is None:
+            raise requests.ConnectionError(f"No recorded Groq response for request {key} in {self.path}")
+        if "error" in entry:
+            if self.speed:
+                time.sleep(min(entry.get("elapsed", 0) / self.speed, timeout))
+            raise requests.Timeout() if entry["error"] == "timeout" else requests.ConnectionError(entry["error"])
+        response = ReplayResponse(entry["status"], entry.get("headers"), entry["body"].encode("utf-8"), entry.get("chunks"), self.speed)
+        if not json.get("stream"):
+            # A buffered client only sees the response once the last chunk is in
+            response.content = b"".join(response.iter_content())
+            response.speed = 0.0
+        return response
+
+
+def create_transport(session, mode=GROQ_TRANSPORT, path=GROQ_FIXTURES, speed=GROQ_REPLAY_SPEED):
+    if mode == "live":
+        return LiveTransport(session)
+    if mode == "record":
+        return RecordingTransport(session, path)
+    if mode == "replay":
+        return ReplayTransport(path, speed)
+    raise ValueError(f"Unknown GROQ_TRANSPORT mode: {mode}")
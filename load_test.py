@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from admission import ADMISSION_POLL_SECONDS
+from bench_consultation import free_port, start_mock, percentiles, SPECIALTIES, PROBLEM, ANSWERS
+
+# =============================
+# Concurrent-session Load Generator
+# =============================
+# Simulates N concurrent browser sessions against one `streamlit run bot.py`
+# replica, speaking Streamlit's websocket protocol directly (BackMsg
+# rerun requests in, ForwardMsg deltas out) so reruns queue exactly as
+# they would behind real users. Virtual users walk the checkups or Medical
+# Lab journeys with randomised think times while the LLM is served by
+# mock_groq.py.
+#
+# Concurrency is stepped up level by level. Each level reports throughput,
+# per-rerun latency, queueing delay (latency above the single-user
+# baseline for the same step), server CPU and memory per session. The
+# saturation point is the last level before throughput stops scaling or
+# p95 latency exceeds --latency-factor x the baseline.
+#
+# Past MAX_ACTIVE_CONSULTATIONS concurrent reports, users land in the
+# admission waiting room. Like the browser's polling fragment, a virtual
+# user then reruns every ADMISSION_POLL_SECONDS until its report starts;
+# these polls are not latency samples, but the time spent waiting is
+# reported per level as the admission wait:
+#
+#   python load_test.py --levels 1,2,4,8,16,32 --duration 60 --think 2.0 --output load_results.json
+#
+# Pass --url to target an already running replica (and --pid for its
+# process metrics) instead of starting one.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+# ScriptFinishedStatus values from Streamlit's ForwardMsg proto
+FINISHED_EARLY_FOR_RERUN = 2
+
+# Shown by bot.py's render_waiting_room while a session waits for admission
+WAITING_ROOM_TEXT = "in line"
+
+
+class SessionError(Exception):
+    pass
+
+
+class BrowserSession:
+    """One simulated browser tab connected to the app's websocket"""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self.widgets = {}  # widget id -> element type, from the latest render
+        self.values = {}  # widget id -> persistent WidgetState (text inputs etc.)
+        self.elements = []
+        self.alerts = []  # st.info/warning/error texts from the latest render
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=self.timeout)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, trigger=None):
+        """Request a rerun and wait for the script to finish. Returns wall time in seconds."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        for widget_id, state in self.values.items():
+            if widget_id in self.widgets:
+                msg.rerun_script.widget_states.widgets.append(state)
+        if trigger:
+            msg.rerun_script.widget_states.widgets.append(WidgetState(id=trigger, trigger_value=True))
+
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        widgets = {}
+        elements = []
+        alerts = []
+        while True:
+            raw = await asyncio.wait_for(self.ws.recv(), self.timeout)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "exception":
+                    raise SessionError(f"app raised {element.exception.message}")
+                widget_id = getattr(getattr(element, element_type), "id", "")
+                elements.append(element_type)
+                if element_type == "alert":
+                    alerts.append(element.alert.body)
+                if widget_id:
+                    widgets[widget_id] = element_type
+            elif kind == "script_finished":
+                if fwd.script_finished == FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun(): the server starts the next run on its own
+                    widgets, elements, alerts = {}, [], []
+                    continue
+                self.widgets = widgets
+                self.elements = elements
+                self.alerts = alerts
+                return time.perf_counter() - start
+
+    def find(self, element_type, key=None):
+        for widget_id, kind in self.widgets.items():
+            if kind == element_type and (key is None or widget_id.endswith(f"-{key}")):
+                return widget_id
+        raise SessionError(f"no {element_type} widget{f' with key {key}' if key else ''} on the page")
+
+    def has(self, element_type, key):
+        return any(kind == element_type and widget_id.endswith(f"-{key}") for widget_id, kind in self.widgets.items())
+
+    def set_text(self, widget_id, text):
+        self.values[widget_id] = WidgetState(id=widget_id, string_value=text)
+
+    def waiting(self):
+        return any(WAITING_ROOM_TEXT in body for body in self.alerts)
+
+
+class VirtualUser:
+    def __init__(self, url, rng, think_mean, timeout, samples, admission_waits=None):
+        self.url = url
+        self.rng = rng
+        self.think_mean = think_mean
+        self.timeout = timeout
+        self.samples = samples
+        self.admission_waits = admission_waits if admission_waits is not None else []
+
+    async def step(self, session, name, trigger=None):
+        if self.think_mean:
+            await asyncio.sleep(self.rng.expovariate(1.0 / self.think_mean))
+        elapsed = await session.rerun(trigger)
+        self.samples.setdefault(name, []).append(elapsed)
+
+    async def wait_for_admission(self, session):
+        """Poll the waiting room like its run_every fragment does; returns the seconds waited"""
+        if not session.waiting():
+            return 0.0
+        start = time.perf_counter()
+        while session.waiting():
+            if time.perf_counter() - start > self.timeout:
+                raise SessionError(f"still in the waiting room after {self.timeout:.0f}s")
+            await asyncio.sleep(ADMISSION_POLL_SECONDS)
+            await session.rerun()
+        return time.perf_counter() - start
+
+    async def consultation(self, specialty):
+        session = BrowserSession(self.url, self.timeout)
+        await session.connect()
+        try:
+            await self.step(session, "consultation.home")
+            await self.step(session, "consultation.open_checkups", session.find("button", "checkups_btn"))
+            await self.step(session, "consultation.select_specialty", session.find("button", f"spec_{specialty}"))
+            # A distinct problem per session so LLM calls miss the shared cache
+            session.set_text(session.find("text_area"), f"{PROBLEM} (case {self.rng.getrandbits(32):08x})")
+            await self.step(session, "consultation.problem")
+            for i, answer in enumerate(ANSWERS):
+                # Adaptive questioning may move on to the report before every answer is used
+                if not session.has("text_input", f"q_{i}"):
+                    break
+                session.set_text(session.find("text_input", f"q_{i}"), answer)
+                await self.step(session, f"consultation.answer_{i + 1}", session.find("button", f"submit_{i}"))
+            self.admission_waits.append(await self.wait_for_admission(session))
+            if "download_button" not in session.elements:
+                raise SessionError("report download button missing")
+        finally:
+            await session.close()
+
+    async def lab(self):
+        session = BrowserSession(self.url, self.timeout)
+        await session.connect()
+        try:
+            await self.step(session, "lab.home")
+            await self.step(session, "lab.open_lab", session.find("button", "lab_btn"))
+            await self.step(session, "lab.bmi", session.find("button", "bmi_calc"))
+            await self.step(session, "lab.body_fat", session.find("button", "bf_calc"))
+            await self.step(session, "lab.calories", session.find("button", "cal_calc"))
+        finally:
+            await session.close()
+
+
+# =============================
+# Server process metrics (Linux /proc)
+# =============================
+def process_rss(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def process_cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, TypeError):
+        return None
+
+
+async def run_level(url, pid, sessions, duration, think_mean, lab_share, timeout, seed):
+    """Run `sessions` virtual users for `duration` seconds and summarise the level"""
+    samples = {}
+    admission_waits = []
+    journeys = {"consultation": 0, "lab": 0}
+    errors = []
+    deadline = time.monotonic() + duration
+    base_rss = process_rss(pid)
+    base_cpu = process_cpu_seconds(pid)
+    peak_rss = base_rss
+
+    async def user_loop(index):
+        rng = random.Random(seed * 1000 + index)
+        user = VirtualUser(url, rng, think_mean, timeout, samples, admission_waits)
+        while time.monotonic() < deadline:
+            kind = "lab" if rng.random() < lab_share else "consultation"
+            try:
+                if kind == "lab":
+                    await user.lab()
+                else:
+                    await user.consultation(rng.choice(SPECIALTIES))
+                journeys[kind] += 1
+            except (SessionError, OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                errors.append(f"{kind}: {e!r}")
+
+    async def sample_memory():
+        nonlocal peak_rss
+        while time.monotonic() < deadline:
+            rss = process_rss(pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+            await asyncio.sleep(0.25)
+
+    started = time.perf_counter()
+    await asyncio.gather(sample_memory(), *(user_loop(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    end_cpu = process_cpu_seconds(pid)
+
+    all_reruns = [v for values in samples.values() for v in values]
+    return {
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "reruns": len(all_reruns),
+        "reruns_per_s": len(all_reruns) / elapsed,
+        "journeys_per_min": sum(journeys.values()) / elapsed * 60,
+        "journeys": journeys,
+        "latency": percentiles(all_reruns),
+        "steps": {name: percentiles(values) for name, values in samples.items()},
+        "admission_wait": percentiles(admission_waits),
+        "admission_waited": sum(1 for wait in admission_waits if wait > 0),
+        "server_cpu_utilisation": (end_cpu - base_cpu) / elapsed if base_cpu is not None and end_cpu is not None else None,
+        "memory_per_session_mb": max(peak_rss - base_rss, 0) / sessions / 1e6 if base_rss is not None else None,
+        "server_rss_mb": peak_rss / 1e6 if peak_rss is not None else None,
+        "errors": errors
+    }
+
+
+def add_queueing(level, baseline):
+    """Queueing delay: how much slower each step ran than with a single user"""
+    weighted = 0.0
+    total = 0
+    for name, stats in level["steps"].items():
+        base = baseline["steps"].get(name)
+        if base and stats:
+            weighted += max(stats["p50"] - base["p50"], 0.0) * stats["count"]
+            total += stats["count"]
+    level["queueing_delay_s"] = weighted / total if total else 0.0
+
+
+def find_saturation(levels, scale_threshold=1.1, latency_factor=3.0):
+    """Highest concurrency that still scaled throughput and kept p95 within latency_factor x baseline"""
+    baseline_p95 = levels[0]["latency"].get("p95", 0)
+    saturation = levels[0]["sessions"]
+    for prev, level in zip(levels, levels[1:]):
+        scaled = level["reruns_per_s"] >= prev["reruns_per_s"] * scale_threshold
+        fast = level["latency"].get("p95", float("inf")) <= baseline_p95 * latency_factor
+        if not (scaled and fast):
+            break
+        saturation = level["sessions"]
+    return saturation
+
+
+# =============================
+# App server process
+# =============================
+def start_app(port, env):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH,
+         "--server.headless", "true",
+         "--server.port", str(port),
+         "--server.enableXsrfProtection", "false",
+         "--browser.gatherUsageStats", "false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("streamlit server did not start")
+
+
+def print_level(level):
+    lat = level["latency"]
+    cpu = level["server_cpu_utilisation"]
+    mem = level["memory_per_session_mb"]
+    wait = level["admission_wait"]
+    print(f"{level['sessions']:8d} {level['reruns_per_s']:8.2f} {level['journeys_per_min']:11.1f} "
+          f"{lat.get('p50', float('nan')) * 1000:8.0f} {lat.get('p95', float('nan')) * 1000:8.0f} "
+          f"{level['queueing_delay_s'] * 1000:9.0f} {cpu * 100 if cpu is not None else float('nan'):7.0f}% "
+          f"{mem if mem is not None else float('nan'):10.2f} {wait.get('p95', 0.0):10.1f} {len(level['errors']):6d}", flush=True)
+
+
+async def run_levels(url, pid, args, levels):
+    results = []
+    # Untimed warm-up so first-run imports and caches aren't charged to the baseline
+    warm = VirtualUser(url, random.Random(0), 0, args.timeout, {})
+    await warm.lab()
+    await warm.consultation(SPECIALTIES[0])
+    print(f"{'sessions':>8} {'rerun/s':>8} {'journey/min':>11} {'p50 ms':>8} {'p95 ms':>8} {'queue ms':>9} {'cpu':>8} {'MB/session':>10} {'wait p95 s':>10} {'errors':>6}")
+    for sessions in levels:
+        level = await run_level(url, pid, sessions, args.duration, args.think, args.lab_share, args.timeout, args.seed)
+        add_queueing(level, results[0] if results else level)
+        results.append(level)
+        print_level(level)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent user sessions against bot.py to find one replica's saturation point.")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma-separated concurrent session counts; 1 is always measured first as the baseline")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to hold each level")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean think time between user actions (seconds, exponential)")
+    parser.add_argument("--lab-share", type=float, default=0.3, help="Fraction of journeys that use the Medical Lab instead of checkups")
+    parser.add_argument("--latency", default="lognormal:-0.7,0.5", help="Mock LLM latency distribution (see mock_groq.py)")
+    parser.add_argument("--latency-factor", type=float, default=3.0, help="p95 latency over baseline that counts as saturated")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for a single rerun")
+    parser.add_argument("--url", help="Websocket URL of a running replica, e.g. ws://host:8501/_stcore/stream")
+    parser.add_argument("--pid", type=int, help="Process id of the running replica, for CPU and memory metrics")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    levels = sorted({int(v) for v in args.levels.split(",") if v.strip()} | {1})
+    mock = app = None
+    try:
+        if args.url:
+            url, pid = args.url, args.pid
+        else:
+            mock_port = free_port()
+            mock = start_mock(args.latency, mock_port)
+            app_port = free_port()
+            data_dir = tempfile.mkdtemp(prefix="load_health_")
+            env = dict(
+                os.environ,
+                GROQ_URL=f"http://127.0.0.1:{mock_port}/openai/v1/chat/completions",
+                GROQ_API_KEY=os.environ.get("BENCH_GROQ_API_KEY", "bench-key"),
+                HEALTH_DB_PATH=os.path.join(data_dir, "health.db"),
+                HISTORY_DB_PATH=os.path.join(data_dir, "history.db"),
+                SHARED_CACHE_PATH=os.path.join(data_dir, "cache.db"),
+                SIMILAR_DB_PATH=os.path.join(data_dir, "similar.db"),
+                NEAR_DUPLICATE_THRESHOLD="2",
+                ADAPTIVE_QUESTIONS=os.environ.get("ADAPTIVE_QUESTIONS", "0")
+            )
+            app = start_app(app_port, env)
+            url, pid = f"ws://127.0.0.1:{app_port}/_stcore/stream", app.pid
+        results = asyncio.run(run_levels(url, pid, args, levels))
+    finally:
+        for proc in (app, mock):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+    saturation = find_saturation(results, latency_factor=args.latency_factor)
+    print(f"Saturation point: ~{saturation} concurrent sessions per replica")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"levels": results, "saturation_sessions": saturation, "config": vars(args)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
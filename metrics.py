@@ -0,0 +1,212 @@
+import os
+import time
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# =============================
+# Hot-path Instrumentation
+# =============================
+# Tiny in-process counters and histograms exposed in the Prometheus text
+# format, either on an HTTP endpoint (METRICS_PORT) or as a periodically
+# rewritten file (METRICS_FILE, e.g. for node_exporter's textfile
+# collector). Instrumentation is off unless one of those or METRICS_ENABLED
+# is set; when off, every call returns after a single flag check.
+
+ENABLED = bool(os.getenv("METRICS_ENABLED") or os.getenv("METRICS_PORT") or os.getenv("METRICS_FILE"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "15"))
+
+# Seconds; spans quick reruns through long report generations. Histograms of
+# other quantities (counts) pass their own buckets to observe()
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "llm_requests_total": "LLM API calls by kind and outcome",
+    "llm_request_seconds": "LLM API call latency",
+    "llm_tokens_total": "Tokens reported in the LLM usage block",
+    "llm_retries_total": "LLM calls retried after a retryable failure",
+    "llm_queue_seconds": "Time LLM calls waited for a scheduler slot by priority class",
+    "llm_queue_timeouts_total": "LLM calls whose deadline passed while queued",
+    "llm_budget_decisions_total": "Token budget decisions (allow, shrink, fallback_model, queued, exhausted)",
+    "admission_decisions_total": "Report generations admitted, queued, abandoned or reclaimed",
+    "admission_wait_seconds": "Time sessions waited in line before report generation",
+    "cache_requests_total": "Shared cache lookups by namespace and result (hit, miss, wait)",
+    "near_duplicate_lookups_total": "Near-duplicate report lookups by result (hit, miss)",
+    "near_duplicate_search_seconds": "Time to score a consultation against the similarity index",
+    "near_duplicate_refreshes_total": "Background regenerations of stale reused reports",
+    "consultation_questions": "Follow-up questions answered per consultation by mode and how questioning ended (sum / count is the average)",
+    "consultation_seconds": "Time from the first follow-up question to the finished report",
+    "rerun_seconds": "Streamlit script rerun duration by page",
+    "report_render_seconds": "Time to parse and render the assessment report",
+    "calculator_seconds": "Medical Lab calculator time",
+    "measurement_write_seconds": "Time to store calculator results for analytics",
+}
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> (bucket bounds, [bucket counts..., overflow (+Inf) count, sum, count])
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Add a value to a histogram; `buckets` are the upper bounds, fixed by the first observation"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = (tuple(buckets), [0] * (len(buckets) + 3))
+        bounds, hist = entry
+        # Values above the top bucket land in the overflow slot right after it
+        hist[bisect.bisect_left(bounds, value)] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def timer(name, **labels):
+    """Context manager that records its duration into a histogram"""
+    return _Timer(name, labels) if ENABLED else _NOOP
+
+
+def start_rerun():
+    return time.perf_counter() if ENABLED else None
+
+
+def finish_rerun(started, page):
+    if started is not None:
+        observe("rerun_seconds", time.perf_counter() - started, page=page)
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (
+        f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus():
+    """Current metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: (bounds, list(hist)) for k, (bounds, hist) in _histograms.items()}
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (bounds, hist) in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(bounds, hist):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist[-2]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# =============================
+# Exporters
+# =============================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def dump_to_file(path):
+    # Write then rename so scrapers never read a half-written file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+def _dump_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            dump_to_file(path)
+        except OSError:
+            pass
+
+
+_exporters_started = False
+
+
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_DUMP_INTERVAL):
+    """Start the /metrics endpoint and/or file dumper once per process"""
+    global _exporters_started
+    with _lock:
+        if _exporters_started or not ENABLED:
+            return
+        _exporters_started = True
+    if port:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if path:
+        threading.Thread(target=_dump_loop, args=(path, interval), name="metrics-dump", daemon=True).start()
@@ -0,0 +1,368 @@
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# =============================
+# Local Mock Groq Server
+# =============================
+# A stand-in for Groq's OpenAI-compatible /openai/v1/chat/completions
+# endpoint, for load tests, benchmarks and CI without network or quota:
+#
+#   python mock_groq.py --port 8787 --latency lognormal:-0.5,0.4 --error-429 0.05
+#   GROQ_URL=http://127.0.0.1:8787/openai/v1/chat/completions streamlit run bot.py
+#
+# Responses are deterministic for a given prompt (and --seed): follow-up
+# question requests get a short question, report requests get a canned
+# report with the headings the app parses, shaped by the specialty in the
+# prompt. Streaming (SSE), latency distributions, injected 429/5xx errors
+# and a real requests-per-minute limit with rate-limit headers are supported.
+
+CHAT_PATH = "/openai/v1/chat/completions"
+
+SPECIALTY_DETAILS = {
+    "Nutritionist": ("nutritional", "a food diary and balanced meals with lean protein, whole grains and vegetables", "a vitamin D and B12 check"),
+    "Physician": ("clinical", "hydration, regular sleep and over-the-counter pain relief as directed", "a basic blood panel and blood pressure check"),
+    "Mental Health": ("psychological", "daily mindfulness practice and a consistent sleep routine", "a validated screening questionnaire"),
+    "Orthopedic": ("musculoskeletal", "rest, ice, compression and gentle range-of-motion exercises", "an X-ray if pain persists beyond two weeks"),
+    "Dentist": ("dental", "brushing twice daily with fluoride toothpaste and flossing", "a dental examination and X-rays"),
+}
+
+ROLE_TO_SPECIALTY = {
+    "Clinical Nutritionist": "Nutritionist",
+    "Board-Certified Physician": "Physician",
+    "Clinical Psychologist": "Mental Health",
+    "Orthopedic Surgeon": "Orthopedic",
+    "Prosthodontist": "Dentist",
+}
+
+QUESTIONS = [
+    "How long have you had these symptoms?",
+    "Does anything make it better or worse?",
+    "Have you noticed any other symptoms?",
+    "Are you taking any medications currently?",
+    "How severe is it on a 1-10 scale?",
+    "Has this happened to you before?",
+]
+
+
+def parse_latency(spec):
+    """Build a latency sampler from 'fixed:S', 'uniform:A,B', 'normal:MEAN,STD' or 'lognormal:MU,SIGMA' (seconds)"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token, close enough for load shaping
+    return max(1, len(text) // 4)
+
+
+class MockGroqConfig:
+    def __init__(self, latency="fixed:0", tokens_per_second=0, error_429=0.0, error_5xx=0.0,
+                 rpm_limit=0, tpm_limit=0, seed=0):
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.tokens_per_second = tokens_per_second
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.seed = seed
+
+
+class MockGroqState:
+    """Shared counters and the sliding one-minute window used for rate limiting"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.rng = random.Random(config.seed)
+        self.requests = deque()  # (time, tokens) within the last minute
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "server_errors": 0, "stream": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def admit(self, tokens):
+        """Record a request; returns (allowed, rate-limit headers, retry_after)"""
+        with self.lock:
+            now = time.monotonic()
+            while self.requests and now - self.requests[0][0] >= 60:
+                self.requests.popleft()
+            used_requests = len(self.requests)
+            used_tokens = sum(t for _, t in self.requests)
+            reset = 60 - (now - self.requests[0][0]) if self.requests else 0.0
+            rpm = self.config.rpm_limit or 1_000_000
+            tpm = self.config.tpm_limit or 1_000_000_000
+            allowed = used_requests < rpm and used_tokens + tokens <= tpm
+            if allowed:
+                self.requests.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+            headers = {
+                "x-ratelimit-limit-requests": str(rpm),
+                "x-ratelimit-remaining-requests": str(max(rpm - used_requests, 0)),
+                "x-ratelimit-reset-requests": f"{reset:.2f}s",
+                "x-ratelimit-limit-tokens": str(tpm),
+                "x-ratelimit-remaining-tokens": str(max(tpm - used_tokens, 0)),
+                "x-ratelimit-reset-tokens": f"{reset:.2f}s",
+            }
+            return allowed, headers, max(reset, 0.1)
+
+    def draw(self):
+        with self.lock:
+            return self.rng.random(), self.config.latency(self.rng)
+
+    def count(self, key, delta=1):
+        with self.lock:
+            self.stats[key] += delta
+            if key == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+
+CHAT_ANSWERS = [
+    "That's a reasonable question. Based on your assessment, keep following the plan for now and note any change in symptoms.",
+    "Generally yes, but check with a pharmacist first if you take other medications regularly.",
+    "Give the recommendations about two weeks; if nothing improves, book an appointment with your doctor."
+]
+
+
+def canned_reply(messages, max_tokens, seed=0):
+    """Deterministic reply for a chat request: a short question or a specialty-shaped report"""
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    digest = int(hashlib.sha256(f"{seed}:{prompt}".encode()).hexdigest(), 16)
+    system = str(messages[0].get("content", "")) if messages else ""
+
+    # Report chat (report_chat.py): a running summary or a short answer
+    if "running summary" in system:
+        return "Patient asked about their assessment; the specialist advised following the plan and checking medications with a pharmacist."
+    if "answering follow-up questions" in system:
+        return CHAT_ANSWERS[digest % len(CHAT_ANSWERS)]
+
+    # Adaptive questioning: JSON with a sufficiency flag, after one or two answers
+    answered = re.search(r"Questions answered so far: (\d+)", prompt)
+    if answered:
+        if int(answered.group(1)) >= 1 + digest % 2:
+            return json.dumps({"sufficient": True, "question": ""})
+        return json.dumps({"sufficient": False, "question": QUESTIONS[digest % len(QUESTIONS)]})
+
+    if "follow-up question" in system or max_tokens <= 64:
+        return QUESTIONS[digest % len(QUESTIONS)]
+
+    specialty = next((s for role, s in ROLE_TO_SPECIALTY.items() if role in prompt), None)
+    focus, care, tests = SPECIALTY_DETAILS.get(specialty, ("general health", "rest, hydration and a balanced routine", "a check-up with your doctor"))
+    return f"""### 📝 Initial Assessment
+- Your description points to a {focus} concern that is most often benign but worth monitoring.
+- Likely contributing factors include stress, sleep, diet and recent changes in activity.
+- Case reference #{digest % 100000:05d}.
+
+### 💡 Professional Recommendations
+- Start with {care}.
+- Keep a short daily log of symptoms, triggers and what helped.
+- Limit caffeine and alcohol and keep regular meal times.
+- Arrange {tests} if symptoms continue.
+
+### 💊 Comprehensive Management Plan
+- **Week 1:** Begin the recommendations above and record symptoms daily.
+- **Week 2:** Review the log and adjust routines that seem to trigger symptoms.
+- **Week 3:** Gradually return to normal activity levels.
+- **Week 4:** Reassess; book a follow-up appointment if there is no clear improvement.
+
+### ⚠️ Critical Considerations
+- Seek urgent care for sudden severe pain, fever, breathing difficulty or confusion.
+- Check with a pharmacist before combining medications.
+- This is AI-generated advice and not a substitute for professional medical consultation.
+"""
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set per server by make_server
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path in ("/health", "/openai/v1/models"):
+            self.send_json(200, {"status": "ok", "stats": self.state.stats, "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self.send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        if self.path != CHAT_PATH:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self.send_json(401, {"error": {"message": "Invalid API Key", "type": "invalid_request_error"}})
+            return
+
+        state = self.state
+        state.count("requests")
+        messages = payload.get("messages") or []
+        max_tokens = int(payload.get("max_tokens") or 1024)
+        prompt_tokens = estimate_tokens("".join(str(m.get("content", "")) for m in messages))
+
+        allowed, rate_headers, reset = state.admit(prompt_tokens + max_tokens)
+        roll, delay = state.draw()
+        if not allowed or roll < state.config.error_429:
+            state.count("rate_limited")
+            rate_headers["retry-after"] = f"{reset:.0f}" if not allowed else "1"
+            self.send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "tokens", "code": "rate_limit_exceeded"}}, rate_headers)
+            return
+        if roll < state.config.error_429 + state.config.error_5xx:
+            state.count("server_errors")
+            status = 503 if int(roll * 1000) % 2 else 500
+            self.send_json(status, {"error": {"message": "Service unavailable (mock)", "type": "internal_server_error"}}, rate_headers)
+            return
+
+        state.count("in_flight")
+        try:
+            content = canned_reply(messages, max_tokens, state.config.seed)
+            # Respect max_tokens the same way the real API truncates output
+            content = content[:max_tokens * 4]
+            completion_tokens = estimate_tokens(content)
+            time.sleep(delay)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "queue_time": 0.0,
+                "prompt_time": 0.0,
+                "completion_time": completion_tokens / state.config.tokens_per_second if state.config.tokens_per_second else 0.0,
+                "total_time": delay,
+            }
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            model = payload.get("model", "mock-model")
+            if payload.get("stream"):
+                state.count("stream")
+                self.stream_reply(completion_id, model, content, usage, rate_headers)
+            else:
+                if state.config.tokens_per_second:
+                    time.sleep(usage["completion_time"])
+                self.send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage,
+                    "x_groq": {"id": completion_id}
+                }, rate_headers)
+            state.count("ok")
+        finally:
+            state.count("in_flight", -1)
+
+    def stream_reply(self, completion_id, model, content, usage, headers):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, extra=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        # Emit roughly one token (four characters) per chunk
+        per_chunk = 1 / self.state.config.tokens_per_second if self.state.config.tokens_per_second else 0
+        for i in range(0, len(content), 4):
+            event({"content": content[i:i + 4]})
+            if per_chunk:
+                time.sleep(per_chunk)
+        # Groq reports usage on the final chunk under x_groq
+        event({}, "stop", {"x_groq": {"id": completion_id, "usage": usage}})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(config=None, host="127.0.0.1", port=0):
+    """Create (but don't start) a mock server; port 0 picks a free port"""
+    state = MockGroqState(config or MockGroqConfig())
+    handler = type("BoundMockGroqHandler", (MockGroqHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    """Start a mock server on a background thread. Returns (server, chat completions URL)."""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}{CHAT_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of Groq's chat completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default="fixed:0.2", help="fixed:S | uniform:A,B | normal:MEAN,STD | lognormal:MU,SIGMA (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Generation speed; 0 returns the whole reply at once")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="Fraction of requests answered with 500/503")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before real 429s (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute before real 429s (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockGroqConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_429=args.error_429,
+        error_5xx=args.error_5xx,
+        rpm_limit=args.rpm,
+        tpm_limit=args.tpm,
+        seed=args.seed
+    )
+    server = make_server(config, args.host, args.port)
+    print(f"Mock Groq listening on http://{args.host}:{server.server_port}{CHAT_PATH}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import os
+import time
+import pstats
+import cProfile
+import datetime
+import threading
+from collections import deque
+
+# =============================
+# Per-rerun Profiler
+# =============================
+# Wraps Streamlit script reruns in cProfile when switched on (PROFILE_RERUNS=1
+# for every session, or ?profile=1 for an admin session), keeps the last
+# PROFILE_WINDOW profiles per page in memory and aggregates them into a
+# hotspot table. Profiles can be dumped as standard .prof files for
+# snakeviz, flameprof or gprof2dot:
+#
+#   flameprof data/profiles/checkups-20250101_120000.prof > checkups.svg
+
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "").lower() in ("1", "true", "yes")
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "20"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("data", "profiles"))
+PROFILE_TOP_N = 15
+
+_local = threading.local()
+_lock = threading.Lock()
+_windows = {}  # page -> deque of (finished_at, duration_s, cProfile.Profile)
+
+
+def start(page, enabled=PROFILE_RERUNS):
+    """Begin profiling the current rerun on this thread"""
+    # A rerun cut short by st.rerun() never reaches stop(); keep its profile too
+    stop()
+    if not enabled:
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return  # another profiler already owns this thread
+    _local.active = (page, time.perf_counter(), profile)
+
+
+def stop():
+    active = getattr(_local, "active", None)
+    if active is None:
+        return
+    _local.active = None
+    page, started, profile = active
+    profile.disable()
+    with _lock:
+        window = _windows.setdefault(page, deque(maxlen=PROFILE_WINDOW))
+        window.append((time.time(), time.perf_counter() - started, profile))
+
+
+def _profiles(page):
+    with _lock:
+        return [profile for _, _, profile in _windows.get(page, ())]
+
+
+def summary():
+    """Rerun count, mean and max duration (ms) of the profiled window per page"""
+    with _lock:
+        windows = {page: list(window) for page, window in _windows.items()}
+    result = {}
+    for page, window in windows.items():
+        durations = [duration for _, duration, _ in window]
+        if durations:
+            result[page] = {
+                "count": len(durations),
+                "mean_ms": sum(durations) / len(durations) * 1000,
+                "max_ms": max(durations) * 1000
+            }
+    return result
+
+
+def aggregate(page):
+    """pstats.Stats combining every profile in a page's window, or None"""
+    profiles = _profiles(page)
+    if not profiles:
+        return None
+    stats = pstats.Stats(profiles[0])
+    if len(profiles) > 1:
+        stats.add(*profiles[1:])
+    return stats
+
+
+def hotspots(page, top=PROFILE_TOP_N, sort="tottime"):
+    """Top functions by own (tottime) or cumulative (cumtime) time, averaged per rerun"""
+    stats = aggregate(page)
+    if stats is None:
+        return []
+    reruns = len(_profiles(page)) or 1
+    rows = []
+    for (filename, line, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        location = f"{os.path.basename(filename)}:{line}" if line else filename
+        rows.append({
+            "function": f"{func} ({location})",
+            "calls": calls // reruns,
+            "tottime": tottime * 1000 / reruns,
+            "cumtime": cumtime * 1000 / reruns
+        })
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:top]
+
+
+def dump_profiles(directory=PROFILE_DIR):
+    """Write each page's aggregated window as a .prof file; returns the paths"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    paths = []
+    for page in summary():
+        stats = aggregate(page)
+        if stats is None:
+            continue
+        path = os.path.join(directory, f"{page}-{stamp}.prof")
+        stats.dump_stats(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,118 @@
+import os
+import re
+
+from consultation import GroqError, groq_chat, llm_has_room, parse_report_sections
+from token_budget import estimate_tokens
+
+# =============================
+# Follow-up Chat on the Report
+# =============================
+# Patients can ask questions about their generated assessment. Every request
+# has the same bounded shape, so latency and cost don't grow with the
+# conversation:
+#
+#   system prompt + report digest     (extractive, built once per report)
+#   running summary of older turns    (folded in incrementally, capped)
+#   the CHAT_WINDOW_MESSAGES to CHAT_WINDOW_MESSAGES + CHAT_FOLD_BATCH
+#   newest messages verbatim
+#   the new question
+#
+# The prompt is trimmed to CHAT_PROMPT_TOKENS (digest first, then the oldest
+# window messages) and replies are capped at CHAT_MAX_TOKENS.
+
+CHAT_PROMPT_TOKENS = int(os.getenv("CHAT_PROMPT_TOKENS", "1800"))
+CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", "400"))
+CHAT_WINDOW_MESSAGES = 6  # three question/answer turns
+CHAT_FOLD_BATCH = 4  # summarize two turns per call rather than one every turn
+CHAT_DISPLAY_MESSAGES = 40  # older, already summarized messages leave session state
+DIGEST_TOKENS = 700
+SUMMARY_MAX_TOKENS = 200
+CHAT_TIMEOUT = 30
+
+
+def _truncate_tokens(text, tokens):
+    # Matches estimate_tokens' four characters per token
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def report_digest(report, max_tokens=DIGEST_TOKENS):
+    """Section titles and leading points of a report, within max_tokens"""
+    sections = parse_report_sections(report) or [("Assessment", report)]
+    per_section = max(max_tokens // len(sections), 40)
+    parts = []
+    for title, content in sections:
+        # Drop markdown emphasis and collapse the bullets onto one line
+        content = re.sub(r"\*{1,2}(.*?)\*{1,2}", r"\1", content)
+        points = [line.strip(" -*•\t") for line in content.splitlines() if line.strip(" -*•\t")]
+        parts.append(f"{title}: " + _truncate_tokens("; ".join(points), per_section))
+    return "\n".join(parts)
+
+
+def chat_system_prompt(specialty, digest, summary):
+    prompt = f"""You are a {specialty or 'healthcare'} specialist answering follow-up questions about the assessment you gave this patient.
+Answer in at most a few short paragraphs, stay consistent with the assessment, and recommend seeing a professional for anything urgent or outside its scope.
+
+ASSESSMENT DIGEST:
+{digest}"""
+    if summary:
+        prompt += f"\n\nEARLIER IN THIS CONVERSATION:\n{summary}"
+    return prompt
+
+
+def build_chat_messages(specialty, digest, summary, window, question, prompt_tokens=CHAT_PROMPT_TOKENS):
+    """Messages for one chat request, trimmed to prompt_tokens"""
+    window = list(window)
+    while True:
+        messages = [{"role": "system", "content": chat_system_prompt(specialty, digest, summary)}]
+        messages += [{"role": m["role"], "content": m["content"]} for m in window]
+        messages.append({"role": "user", "content": question})
+        if estimate_tokens(messages) <= prompt_tokens:
+            return messages
+        if window:
+            window = window[1:]
+        elif len(digest) > 200:
+            digest = _truncate_tokens(digest, len(digest) // 8)
+        else:
+            # Only an oversized question is left; keep its end, which usually holds the ask
+            messages[-1]["content"] = question[-(prompt_tokens * 2):]
+            return messages
+
+
+def request_chat_reply(api_key, specialty, digest, summary, window, question, budget=None):
+    """Answer one follow-up question about the report; raises GroqError on failure"""
+    messages = build_chat_messages(specialty, digest, summary, window, question)
+    return groq_chat(api_key, messages, max_tokens=CHAT_MAX_TOKENS, timeout=CHAT_TIMEOUT, kind="chat", budget=budget).strip()
+
+
+def fallback_summary(summary, evicted):
+    lines = [summary] if summary else []
+    for message in evicted:
+        who = "Patient" if message["role"] == "user" else "Specialist"
+        lines.append(f"{who}: {_truncate_tokens(message['content'], 40)}")
+    return _truncate_tokens("\n".join(lines[-12:]), SUMMARY_MAX_TOKENS)
+
+
+def fold_summary(api_key, summary, evicted, budget=None):
+    """Fold messages leaving the window into the running summary (bounded in size)
+
+    Folding runs in the patient's rerun, so it never queues for a background
+    slot (none are given out while the scheduler is tight after a 429): with
+    no room right now the extractive fallback_summary is used instead.
+    """
+    if not llm_has_room("summary"):
+        return fallback_summary(summary, evicted)
+    transcript = "\n".join(
+        f"{'Patient' if m['role'] == 'user' else 'Specialist'}: {_truncate_tokens(m['content'], 300)}" for m in evicted
+    )
+    messages = [
+        {"role": "system", "content": "You maintain a running summary of a patient's follow-up conversation with a specialist. Keep facts, symptoms, medications and advice given; drop pleasantries. Reply with the updated summary only, under 120 words."},
+        {"role": "user", "content": f"CURRENT SUMMARY:\n{summary or '(empty)'}\n\nNEW MESSAGES:\n{transcript}"}
+    ]
+    try:
+        updated = groq_chat(api_key, messages, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.2, timeout=CHAT_TIMEOUT, kind="summary", budget=budget)
+        return _truncate_tokens(updated.strip(), SUMMARY_MAX_TOKENS)
+    except GroqError:
+        return fallback_summary(summary, evicted)
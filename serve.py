@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+import argparse
+
+import warmup
+
+# =============================
+# Production Entry Point
+# =============================
+# `python serve.py [streamlit flags...]` warms the process up before Streamlit
+# accepts its first session, then runs bot.py in the same process so the
+# resolved config, pooled connections and loaded modules carry over:
+#
+#   READINESS_PORT=8502 python serve.py --server.port 8501 --server.headless true
+#
+# Point the load balancer's health check at :READINESS_PORT/ready (503 until
+# warm, or while the key is missing or rejected) and its liveness check at
+# /health. Plain `streamlit run bot.py` still works; it warms up in the
+# background on the first session instead.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm up, start the readiness probe, then serve bot.py with Streamlit.")
+    parser.add_argument("--readiness-port", type=int, default=warmup.READINESS_PORT, help="Port for /ready and /health (0 disables)")
+    args, streamlit_args = parser.parse_known_args()
+
+    start = time.perf_counter()
+    warmup.ensure_warm(warmup.resolve_api_key(), background=False, port=args.readiness_port)
+    _, state = warmup.readiness()
+    for name, check in state["checks"].items():
+        print(f"  {name:<10} {'ok' if check['ok'] else 'FAILED' if check['ok'] is False else 'unknown'}  {check['detail']}", file=sys.stderr)
+    print(f"Warm-up {state['status']} in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    from streamlit.web import cli
+    sys.argv = ["streamlit", "run", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py"), *streamlit_args]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import os
+import time
+import uuid
+import zlib
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import metrics
+
+# =============================
+# Shared Cache Tier
+# =============================
+# st.cache_* lives inside one Streamlit process, so every replica behind the
+# load balancer warms its own copy. This module offers one interface with two
+# backends:
+#
+#   SQLiteCache  a WAL-mode SQLite file that every replica on the host opens
+#                (SHARED_CACHE=sqlite, the default; SHARED_CACHE_PATH)
+#   MemoryCache  a bounded in-process LRU (SHARED_CACHE=memory)
+#
+# get_or_compute() is atomic across processes: the first caller takes a
+# short lease on the key and computes, while the others wait for its result
+# instead of repeating the work (for LLM calls, instead of paying twice).
+
+SHARED_CACHE = os.getenv("SHARED_CACHE", "sqlite").lower()
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join("data", "cache.db"))
+MEMORY_CACHE_ENTRIES = int(os.getenv("MEMORY_CACHE_ENTRIES", "1024"))
+
+# How long a computing replica owns a key before others may take over
+LEASE_SECONDS = 90
+POLL_SECONDS = 0.05
+
+# Values above this many pickled bytes are zlib-compressed
+COMPRESS_OVER = 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cache_leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def make_key(namespace, *parts):
+    """Stable key for a namespace and any picklable parts"""
+    digest = hashlib.sha256(pickle.dumps(parts, protocol=4)).hexdigest()[:32]
+    return f"{namespace}:{digest}"
+
+
+def _namespace(key):
+    return key.split(":", 1)[0]
+
+
+def encode(value):
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > COMPRESS_OVER:
+        return b"z" + zlib.compress(data, 6)
+    return b"p" + data
+
+
+def decode(blob):
+    blob = bytes(blob)
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return pickle.loads(data)
+
+
+class MemoryCache:
+    """Per-process LRU with the same interface as SQLiteCache"""
+
+    def __init__(self, max_entries=MEMORY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] is not None and entry[0] < time.time():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl if ttl else None, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def get_or_compute(self, key, compute, ttl=None, store_if=None):
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            metrics.inc("cache_requests_total", namespace=_namespace(key), result="hit")
+            return value
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.get(key, missing)
+            if value is not missing:
+                metrics.inc("cache_requests_total", namespace=_namespace(key), result="wait")
+                return value
+            metrics.inc("cache_requests_total", namespace=_namespace(key), result="miss")
+            try:
+                value = compute()
+                if store_if is None or store_if(value):
+                    self.set(key, value, ttl)
+            finally:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+            return value
+
+
+class SQLiteCache:
+    """Cache shared by every process that opens the same SQLite file"""
+
+    def __init__(self, path=SHARED_CACHE_PATH, lease_seconds=LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        # sqlite3 connections are not shareable across Streamlit's script threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return default
+        try:
+            return decode(row[0])
+        except Exception:
+            return default  # written by an incompatible version; recompute
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, encode(value), now + ttl if ttl else None)
+            )
+            # Occasional sweep so expired entries don't accumulate
+            if hash(key) % 100 == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+
+    def delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _take_lease(self, key, owner):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM cache_leases WHERE key = ? AND expires_at < ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO cache_leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, owner, now + self.lease_seconds)
+            )
+        return cur.rowcount == 1
+
+    def _release_lease(self, key, owner):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache_leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def get_or_compute(self, key, compute, ttl=None, store_if=None):
+        """Return the cached value, or compute it in exactly one process and share it
+
+        `store_if(value)` returning False keeps a computed value out of the cache.
+        """
+        missing = object()
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        delay = POLL_SECONDS
+        waited = False
+        while True:
+            value = self.get(key, missing)
+            if value is not missing:
+                metrics.inc("cache_requests_total", namespace=_namespace(key), result="wait" if waited else "hit")
+                return value
+            if self._take_lease(key, owner):
+                break
+            # Another replica is computing; its lease expiry bounds the wait
+            waited = True
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        metrics.inc("cache_requests_total", namespace=_namespace(key), result="miss")
+        try:
+            # The previous owner may have finished between our get and the lease
+            value = self.get(key, missing)
+            if value is missing:
+                value = compute()
+                if store_if is None or store_if(value):
+                    self.set(key, value, ttl)
+            return value
+        finally:
+            self._release_lease(key, owner)
+
+
+def create_cache(kind=SHARED_CACHE, path=SHARED_CACHE_PATH):
+    if kind == "memory":
+        return MemoryCache()
+    if kind == "sqlite":
+        return SQLiteCache(path)
+    raise ValueError(f"Unknown SHARED_CACHE backend: {kind}")
@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import zlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+
+# =============================
+# Near-duplicate Consultations
+# =============================
+# "headache for a week" and "I've had headaches for one week" should get the
+# same report without another 4096-token completion. Each finished
+# consultation's problem and answers are normalized (lowercase, stop words
+# dropped, number words as digits, light stemming) and reduced to a MinHash
+# signature; a new consultation is compared with every signature of the same
+# specialty in one vectorized NumPy pass. Signatures and reports live in a
+# local SQLite file so all replicas on the host share them, and each process
+# keeps an in-memory matrix per specialty that it tops up incrementally.
+
+SIMILAR_DB_PATH = os.getenv("SIMILAR_DB_PATH", os.path.join("data", "similar.db"))
+# Estimated Jaccard similarity needed to reuse a report (above 1 disables reuse)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# Reused reports older than this are regenerated in the background (0 disables)
+NEAR_DUPLICATE_REFRESH_DAYS = float(os.getenv("NEAR_DUPLICATE_REFRESH_DAYS", "7"))
+
+NUM_PERM = 128
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240101)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+STOPWORDS = {
+    "i", "im", "ive", "id", "me", "my", "myself", "we", "our", "you", "your", "it", "its", "this", "that",
+    "the", "and", "or", "but", "so", "of", "for", "to", "in", "on", "at", "by", "with", "from", "about",
+    "is", "am", "are", "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does",
+    "did", "doing", "get", "got", "getting", "feel", "feeling", "really", "very", "just", "also", "some",
+    "there", "since", "past", "last", "like", "bit", "lot", "quite", "experiencing", "experience", "suffering"
+}
+# Folded into the next word ("no fever" -> "not_fever") so negated complaints don't match
+NEGATIONS = {"no", "not", "never", "without", "dont", "doesnt", "didnt", "cant", "cannot", "wont", "isnt", "arent", "nor"}
+NUMBER_WORDS = {
+    "a": "1", "an": "1", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6",
+    "seven": "7", "eight": "8", "nine": "9", "ten": "10", "couple": "2", "few": "3", "several": "3"
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_index (
+    id INTEGER PRIMARY KEY,
+    specialty TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    signature BLOB NOT NULL,
+    report BLOB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS report_index_by_specialty ON report_index (specialty, id);
+"""
+
+
+def _stem(word):
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ied"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize(text):
+    """Tokens that survive normalization, in order"""
+    tokens = []
+    negate = False
+    for word in re.findall(r"[a-z0-9]+", text.lower().replace("'", "")):
+        if word in NEGATIONS:
+            negate = True
+            continue
+        word = NUMBER_WORDS.get(word, word)
+        if word in STOPWORDS:
+            continue
+        tokens.append(f"not_{_stem(word)}" if negate else _stem(word))
+        negate = False
+    return tokens
+
+
+def consultation_text(problem, answers):
+    return " ".join([problem] + [str(answer) for answer in answers])
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint32 values) of the text's normalized word set"""
+    shingles = set(normalize(text))
+    if not shingles:
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+class SimilarityIndex:
+    def __init__(self, path=SIMILAR_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._specialties = {}  # specialty -> {"ids", "created", "signatures", "last_id"}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        # sqlite3 connections are not shareable across Streamlit's script threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _matrix(self, specialty):
+        """The specialty's signature matrix, including rows added by other replicas"""
+        with self._lock:
+            entry = self._specialties.setdefault(specialty, {
+                "ids": np.empty(0, dtype=np.int64),
+                "created": np.empty(0, dtype=np.int64),
+                "signatures": np.empty((0, NUM_PERM), dtype=np.uint32),
+                "last_id": 0
+            })
+            rows = self._conn().execute(
+                "SELECT id, created_at, signature FROM report_index WHERE specialty = ? AND id > ? ORDER BY id",
+                (specialty, entry["last_id"])
+            ).fetchall()
+            if rows:
+                entry["ids"] = np.concatenate([entry["ids"], np.array([r[0] for r in rows], dtype=np.int64)])
+                entry["created"] = np.concatenate([entry["created"], np.array([r[1] for r in rows], dtype=np.int64)])
+                entry["signatures"] = np.vstack([
+                    entry["signatures"],
+                    np.frombuffer(b"".join(r[2] for r in rows), dtype=np.uint32).reshape(len(rows), NUM_PERM)
+                ])
+                entry["last_id"] = rows[-1][0]
+            return entry["ids"], entry["created"], entry["signatures"]
+
+    def find(self, specialty, text, threshold=NEAR_DUPLICATE_THRESHOLD):
+        """Best match at or above the threshold as {"id", "similarity", "age_days", "report"}, or None"""
+        ids, created, signatures = self._matrix(specialty)
+        if not len(ids) or not normalize(text):
+            return None
+        with metrics.timer("near_duplicate_search_seconds"):
+            similarity = (signatures == signature(text)[None, :]).mean(axis=1)
+            # Prefer the most similar entry, then the newest
+            best = int(np.lexsort((ids, similarity))[-1])
+        if similarity[best] < threshold:
+            metrics.inc("near_duplicate_lookups_total", result="miss")
+            return None
+        row = self._conn().execute("SELECT report FROM report_index WHERE id = ?", (int(ids[best]),)).fetchone()
+        if row is None:
+            return None
+        metrics.inc("near_duplicate_lookups_total", result="hit")
+        return {
+            "id": int(ids[best]),
+            "similarity": float(similarity[best]),
+            "age_days": (time.time() - created[best]) / 86400,
+            "report": zlib.decompress(row[0]).decode("utf-8")
+        }
+
+    def add(self, specialty, text, report):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO report_index (specialty, created_at, signature, report) VALUES (?, ?, ?, ?)",
+                (specialty, int(time.time()), signature(text).tobytes(), zlib.compress(report.encode("utf-8"), 6))
+            )
+        return cur.lastrowid
+
+
+# One background worker per process; a stale entry is refreshed at most once at a time
+_refresh_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def refresh_in_background(index, match, specialty, text, generate):
+    """Regenerate a stale reused report off the request path and add it to the index"""
+    if not NEAR_DUPLICATE_REFRESH_DAYS or match["age_days"] < NEAR_DUPLICATE_REFRESH_DAYS:
+        return False
+    with _refreshing_lock:
+        if match["id"] in _refreshing:
+            return False
+        _refreshing.add(match["id"])
+
+    def run():
+        try:
+            index.add(specialty, text, generate())
+            metrics.inc("near_duplicate_refreshes_total", result="ok")
+        except Exception:
+            metrics.inc("near_duplicate_refreshes_total", result="error")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(match["id"])
+
+    _refresh_pool.submit(run)
+    return True
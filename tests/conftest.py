@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mock_groq(monkeypatch):
+    """A local mock Groq server that consultation.py calls instead of the real API"""
+    import consultation
+    from mock_groq import start_mock_server
+
+    server, url = start_mock_server()
+    monkeypatch.setattr(consultation, "GROQ_URL", url)
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,67 @@
+import pytest
+
+import admission
+from admission import AdmissionControl, client_key
+
+
+def test_client_key_prefers_the_load_balancer_address():
+    assert client_key("203.0.113.9", "10.0.0.2", "profile") == "ip:203.0.113.9"
+    # Only the last hop is trusted; earlier entries come from the client
+    assert client_key("1.2.3.4, 203.0.113.9", "10.0.0.2", "profile") == "ip:203.0.113.9"
+    assert client_key(None, "198.51.100.7", "profile") == "ip:198.51.100.7"
+    assert client_key("", None, "profile") == "id:profile"
+
+
+def test_admits_up_to_capacity_then_queues():
+    control = AdmissionControl(capacity=2)
+    assert control.enter("a", "t1") == 0
+    assert control.enter("b", "t2") == 0
+    assert control.enter("c", "t3") == 1
+    assert control.enter("t1-again", "t1") == 0  # admitted tickets stay admitted
+    assert control.snapshot() == {"capacity": 2, "active": 2, "waiting": 1}
+
+
+def test_clients_take_turns():
+    control = AdmissionControl(capacity=0)
+    for ticket in ("a1", "a2", "a3"):
+        control.enter("a", ticket)
+    control.enter("b", "b1")
+    control.enter("c", "c1")
+    control.enter("b", "b2")
+    assert control._order() == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+
+def test_running_consultations_count_as_turns_taken():
+    control = AdmissionControl(capacity=2)
+    assert control.enter("tabs", "t1") == 0
+    assert control.enter("tabs", "t2") == 0
+    control.enter("tabs", "t3")
+    control.enter("other", "o1")
+    assert control._order() == ["o1", "t3"]
+    control.leave("t1")
+    assert control.enter("tabs", "t3") == 2
+    assert control.enter("other", "o1") == 0
+
+
+def test_unpolled_tickets_expire(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    control = AdmissionControl(capacity=1)
+    assert control.enter("a", "t1") == 0
+    assert control.enter("b", "t2") == 1
+    clock[0] += admission.TICKET_TTL + 1
+    assert control.enter("a", "t1") == 0
+    assert control.snapshot()["waiting"] == 0
+    clock[0] += admission.ACTIVE_TTL + 1
+    assert control.enter("c", "t3") == 0
+    assert control.snapshot()["active"] == 1
+
+
+@pytest.mark.parametrize("capacity", [1, 3])
+def test_leave_frees_the_slot_for_the_next_in_line(capacity):
+    control = AdmissionControl(capacity=capacity)
+    for i in range(capacity):
+        assert control.enter(f"c{i}", f"t{i}") == 0
+    assert control.enter("late", "late") == 1
+    control.leave("t0")
+    assert control.enter("late", "late") == 0
@@ -0,0 +1,50 @@
+import json
+import time
+
+from batch_consult import RateLimiter, load_checkpoint, read_cases, run_batch
+
+
+def write_cases(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": i, "specialty": "Physician", "problem": f"headache {i}", "answers": ["two days"]}) + "\n")
+        f.write("not json\n")
+
+
+def test_read_cases_skips_bad_lines_and_stringifies_ids(tmp_path):
+    path = tmp_path / "cases.jsonl"
+    write_cases(path, 2)
+    assert [case["id"] for case in read_cases(path)] == ["0", "1"]
+
+
+def test_load_checkpoint_ignores_truncated_lines(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"id": "a", "status": "ok"}\n{"id": "b", "status": "error"}\n{"id": "c", "sta', encoding="utf-8")
+    assert load_checkpoint(path) == {"a", "b"}
+    assert load_checkpoint(path, retry_errors=True) == {"a"}
+    assert load_checkpoint(tmp_path / "missing.jsonl") == set()
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(per_minute=1200, burst=1)
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.14
+
+
+def test_run_batch_writes_reports_and_resumes(tmp_path, mock_groq):
+    cases, output = tmp_path / "cases.jsonl", tmp_path / "out.jsonl"
+    write_cases(cases, 5)
+    counts = run_batch(cases, output, "test-key", concurrency=2, per_minute=0, limit=3)
+    assert counts == {"ok": 3, "error": 0, "skipped": 0}
+
+    # An interrupted write leaves a partial line; the next run starts a fresh one
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "4", "sta')
+    counts = run_batch(cases, output, "test-key", concurrency=2, per_minute=0)
+    assert counts == {"ok": 2, "error": 0, "skipped": 3}
+
+    results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()[:3]]
+    assert all(r["status"] == "ok" and r["sections"] and r["report_text"] for r in results)
+    assert load_checkpoint(output) == {"0", "1", "2", "3", "4"}
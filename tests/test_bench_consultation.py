@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import subprocess
+
+from bench_consultation import Recorder, check_budget, percentiles
+from mock_groq import start_mock_server
+
+BENCH_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench_consultation.py")
+
+
+def test_percentiles():
+    stats = percentiles([1, 2, 3, 4, 100])
+    assert stats["count"] == 5
+    assert stats["p50"] == 3
+    assert stats["max"] == 100
+    assert percentiles([]) == {}
+
+
+def test_recorder_times_steps():
+    rec = Recorder()
+    assert rec.step("home", lambda: "ok") == "ok"
+    rec.step("home", lambda: None)
+    assert len(rec.samples["home"]["wall"]) == 2
+    assert len(rec.samples["home"]["cpu"]) == 2
+
+
+def test_check_budget_reports_each_exceeded_limit():
+    results = {
+        "journeys": {"consultation.total": percentiles([1.0, 2.0])},
+        "llm_calls_per_consultation": percentiles([4, 5]),
+        "steps": {"lab.bmi": {"wall": percentiles([0.1]), "cpu": percentiles([0.6])}},
+    }
+    budget = {
+        "consultation.total": {"p95": 5.0},
+        "lab.bmi.cpu": {"p50": 0.5},
+        "llm_calls_per_consultation": {"max": 4},
+        "lab.calories": {"p95": 1.0},
+    }
+    failures = check_budget(results, budget)
+    assert len(failures) == 3
+    assert any(f.startswith("lab.bmi.cpu.p50") for f in failures)
+    assert any(f.startswith("llm_calls_per_consultation.max") for f in failures)
+    assert "lab.calories.p95: no measurement" in failures
+
+
+def run_cli(tmp_path, *args, **env):
+    output = tmp_path / f"results-{len(list(tmp_path.glob('results-*')))}.json"
+    proc = subprocess.run(
+        [sys.executable, BENCH_PATH, "--iterations", "1", "--output", str(output), *args],
+        env=dict(os.environ, **env), capture_output=True, text=True, timeout=300
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    return json.loads(output.read_text(encoding="utf-8"))
+
+
+def test_live_record_then_replay(tmp_path):
+    """A --live run recorded with GROQ_TRANSPORT=record replays without any server"""
+    server, url = start_mock_server()
+    fixtures = tmp_path / "bench.jsonl"
+    try:
+        recorded = run_cli(tmp_path, "--live", GROQ_URL=url, GROQ_API_KEY="live-key", GROQ_TRANSPORT="record", GROQ_FIXTURES=str(fixtures))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert recorded["mock_latency"] == "live"
+    assert server.state.stats["requests"] == len(fixtures.read_text(encoding="utf-8").splitlines()) > 0
+
+    replayed = run_cli(tmp_path, "--replay", str(fixtures), "--replay-speed", "0")
+    assert replayed["errors"] == []
+    assert replayed["llm_calls_per_consultation"]["max"] == recorded["llm_calls_per_consultation"]["max"] > 0
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+BOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+
+
+@pytest.fixture
+def app(mock_groq, monkeypatch, tmp_path):
+    """The app on the Physician consultation page, with its databases under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    at = AppTest.from_file(BOT, default_timeout=30).run()
+    at.button(key="checkups_btn").click().run()
+    at.button(key="spec_Physician").click().run()
+    return at
+
+
+def test_consecutive_problem_edits_are_all_kept(app):
+    app.text_area(key="problem_input").input("Knee pain after running").run()
+    app.text_input(key="q_0").input("two weeks").run()
+    app.button(key="submit_0").click().run()
+    assert app.session_state.answers == ["two weeks"]
+
+    # Cosmetic edit, then straight away a substantive one, without a rerun in between
+    app.text_area(key="problem_input").input("  knee PAIN, after running! ").run()
+    assert app.session_state.problem == "  knee PAIN, after running! "
+    assert app.session_state.answers == ["two weeks"]
+    app.text_area(key="problem_input").input("Shoulder pain when lifting").run()
+    assert app.session_state.problem == "Shoulder pain when lifting"
+    assert app.session_state.answers == []
+    assert app.text_area(key="problem_input").value == "Shoulder pain when lifting"
+    assert not app.exception
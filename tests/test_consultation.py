@@ -0,0 +1,111 @@
+import re
+
+import pytest
+
+import consultation
+from consultation import (
+    fallback_question, markdown_html, normalize_problem, parse_follow_up, problem_fingerprint, report_html, request_follow_up
+)
+
+
+def test_cosmetic_edits_keep_the_fingerprint():
+    original = "I've had a headache for a week."
+    assert problem_fingerprint(original) == problem_fingerprint("  i've HAD a headache,  for a week ")
+    assert normalize_problem(original) == "i ve had a headache for a week"
+
+
+def test_substantive_edits_change_the_fingerprint():
+    assert problem_fingerprint("headache for a week") != problem_fingerprint("headache for a month")
+    assert problem_fingerprint("headache") != problem_fingerprint("no headache")
+    assert len(problem_fingerprint("")) == 16
+
+
+REPORT = """### 📝 Initial Assessment
+Likely a **tension-type** headache.
+
+### 💡 Professional Recommendations
+1. Take *regular* breaks.
+2. Drink water.
+   - At least 2 litres.
+
+### ⚠️ Critical Considerations
+- Seek urgent care for sudden severe pain.
+"""
+
+
+def test_report_html_sections_and_classes():
+    rendered = report_html(REPORT)
+    assert rendered.startswith("<div class='report'>") and rendered.endswith("</div>")
+    assert rendered.count("<section class='report-section'>") == 2
+    assert rendered.count("<section class='report-section report-critical'>") == 1
+    assert "<h3>📝 Initial Assessment</h3>" in rendered
+    assert "<p>Likely a <strong>tension-type</strong> headache.</p>" in rendered
+    assert "<ol><li>Take <em>regular</em> breaks.</li><li>Drink water.<ul><li>At least 2 litres.</li></ul></li></ol>" in rendered
+
+
+def test_report_html_adds_missing_icons_and_handles_untitled_text():
+    assert "<h3>📋 Comprehensive Management Plan</h3>" in report_html("### Comprehensive Management Plan\n- rest")
+    # Text before any ### heading: its first line is the title, as in parse_report_sections
+    assert report_html("Summary\nAll good") == "<div class='report'><section class='report-section'><h3>Summary</h3><p>All good</p></section></div>"
+    assert report_html("") == "<div class='report'><section class='report-section'></section></div>"
+
+
+def test_report_html_escapes_model_output():
+    hostile = "### <img src=x onerror=alert(1)> Title\n- <script>alert('x')</script> & **<b>bold</b>**\nline with </li></ul> in it"
+    rendered = report_html(hostile)
+    assert "<script" not in rendered and "<img" not in rendered and "<b>" not in rendered
+    assert "&lt;script&gt;alert('x')&lt;/script&gt; &amp;" in rendered
+    assert "<strong>&lt;b&gt;bold&lt;/b&gt;</strong>" in rendered
+    # Only the renderer's own tags remain
+    tags = set(re.findall(r"</?([a-z0-9]+)", rendered))
+    assert tags <= {"div", "section", "h3", "h4", "p", "br", "ul", "ol", "li", "strong", "em"}
+
+
+def test_blank_line_ends_a_list_before_an_unindented_paragraph():
+    assert markdown_html("- a\n- b\n\nAfter the list") == "<ul><li>a</li><li>b</li></ul><p>After the list</p>"
+    assert markdown_html("1. a\n\nNext\nline") == "<ol><li>a</li></ol><p>Next<br>line</p>"
+
+
+def test_list_continuations_stay_in_their_item():
+    # Wrapped text without a blank line, and indented text after one
+    assert markdown_html("- a\nwrapped") == "<ul><li>a<br>wrapped</li></ul>"
+    assert markdown_html("- a\n  - n\n\n  more about a") == "<ul><li>a<ul><li>n</li></ul><br>more about a</li></ul>"
+
+
+def test_list_types_and_headings():
+    assert markdown_html("1. x\n\n- y") == "<ol><li>x</li></ol><ul><li>y</li></ul>"
+    assert markdown_html("- x\n#### Next steps\ntext") == "<ul><li>x</li></ul><h4>Next steps</h4><p>text</p>"
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ('{"sufficient": false, "question": "How long has it hurt?"}', ("How long has it hurt?", False)),
+    ('```json\n{"sufficient": true, "question": ""}\n```', ("", True)),
+    ('Sure! {"sufficient": false, "question": " Any fever? "}', ("Any fever?", False)),
+    ('"How long has it hurt?"', ("How long has it hurt?", False)),
+    # Cut off at max_tokens, or otherwise broken: never shown to the patient
+    ('{"sufficient": false, "question": "How long has', ("", False)),
+    ('{"sufficient": false, question: "x"}', ("", False)),
+    ('Sure! {"sufficient": false, "question": "Any fev', ("", False)),
+    # Plain text that happens to contain braces is still the question
+    ("Do you use the {prescribed} inhaler daily?", ("Do you use the {prescribed} inhaler daily?", False)),
+    ("Is it worse {morning} or {evening}?", ("Is it worse {morning} or {evening}?", False)),
+    # Only a real true is sufficient
+    ('{"sufficient": "false", "question": "Any fever?"}', ("Any fever?", False)),
+    ('{"sufficient": "True", "question": ""}', ("", True)),
+    ('{"sufficient": 1, "question": "Any fever?"}', ("Any fever?", False)),
+])
+def test_parse_follow_up(reply, expected):
+    assert parse_follow_up(reply) == expected
+
+
+def test_truncated_adaptive_reply_falls_back_to_a_generic_question(monkeypatch):
+    monkeypatch.setattr(consultation, "groq_chat", lambda *args, **kwargs: '{"sufficient": false, "question": "Does the pain')
+    step = request_follow_up("key", "Physician", "Knee pain", [], 1, adaptive=True)
+    assert step == {"question": fallback_question("Knee pain"), "sufficient": False}
+
+
+def test_sufficient_only_after_the_minimum_answers(monkeypatch):
+    monkeypatch.setattr(consultation, "groq_chat", lambda *args, **kwargs: '{"sufficient": true, "question": ""}')
+    assert request_follow_up("key", "Physician", "Knee pain", ["a"] * consultation.MIN_FOLLOW_UP_QUESTIONS, 2, adaptive=True)["sufficient"]
+    early = request_follow_up("key", "Physician", "Knee pain", [], 1, adaptive=True)
+    assert early == {"question": fallback_question("Knee pain"), "sufficient": False}
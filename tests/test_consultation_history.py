@@ -0,0 +1,63 @@
+import pytest
+
+from consultation_history import TITLE_LENGTH, ConsultationHistory, compress, decompress
+
+
+@pytest.fixture
+def history(tmp_path):
+    return ConsultationHistory(str(tmp_path / "history.db"))
+
+
+def save(history, session="s", specialty="Physician", problem="Headache for a week", report="### 📝 Initial Assessment\n- rest"):
+    return history.save("u", session, specialty, problem, ["How long?"], ["A week"], report, {"age": 30})
+
+
+def test_compress_round_trip():
+    data = {"report": "é" * 1000, "answers": ["a"]}
+    blob = compress(data)
+    assert len(blob) < 200
+    assert decompress(blob) == data
+
+
+def test_save_and_load(history):
+    consultation_id = save(history)
+    loaded = history.load("s", consultation_id)
+    assert loaded["problem"] == "Headache for a week"
+    assert loaded["answers"] == ["A week"]
+    assert loaded["user_data"] == {"age": 30}
+    assert loaded["specialty"] == "Physician"
+
+
+def test_other_sessions_cannot_load_or_delete(history):
+    consultation_id = save(history)
+    assert history.load("someone-else", consultation_id) is None
+    history.delete("someone-else", consultation_id)
+    assert history.count("s") == 1
+    history.delete("s", consultation_id)
+    assert history.count("s") == 0
+
+
+def test_profile_id_does_not_unlock_history(history):
+    # user_id comes from ?user= / the Profile ID box, so it must not be a lookup key
+    consultation_id = save(history)
+    assert history.recent("u") == []
+    assert history.count("u") == 0
+    assert history.load("u", consultation_id) is None
+
+
+def test_recent_is_newest_first_and_filtered(history):
+    first = save(history, specialty="Dentist")
+    second = save(history, specialty="Physician")
+    third = save(history, specialty="Physician")
+    assert [c["id"] for c in history.recent("s")] == [third, second, first]
+    assert [c["id"] for c in history.recent("s", specialty="Physician", limit=1, offset=1)] == [second]
+    assert history.count("s", specialty="Dentist") == 1
+    assert "report" not in history.recent("s")[0]
+
+
+def test_long_problems_get_a_short_title(history):
+    save(history, problem="pain  " * 100)
+    title = history.recent("s")[0]["title"]
+    assert len(title) == TITLE_LENGTH
+    assert title.endswith("…")
+    assert "  " not in title
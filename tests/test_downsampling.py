@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from downsampling import bucket_aggregate, lttb
+
+
+def test_lttb_keeps_short_series():
+    x, y = lttb([0, 1, 2], [5, 6, 7], threshold=10)
+    assert list(x) == [0, 1, 2]
+    assert list(y) == [5, 6, 7]
+
+
+def test_lttb_respects_budget_and_endpoints():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 200)
+    dx, dy = lttb(x, y, threshold=300)
+    assert len(dx) == len(dy) == 300
+    assert (dx[0], dx[-1]) == (0, 9999)
+    assert np.all(np.diff(dx) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(5_000, dtype=float)
+    y = np.zeros(5_000)
+    y[2_345] = 100.0
+    dx, dy = lttb(x, y, threshold=50)
+    assert 100.0 in dy
+    assert 2_345 in dx
+
+
+def test_bucket_aggregate_mean_and_sum():
+    x = np.arange(100, dtype=float)
+    y = np.ones(100)
+    bx, by = bucket_aggregate(x, y, buckets=10)
+    assert len(bx) == 10
+    assert np.allclose(by, 1.0)
+    _, sums = bucket_aggregate(x, y, buckets=10, how="sum")
+    assert sums.sum() == 100
+
+
+def test_bucket_aggregate_drops_empty_buckets():
+    x = np.array([0, 1, 2, 97, 98, 99], dtype=float)
+    y = np.array([1, 2, 3, 4, 5, 6], dtype=float)
+    bx, by = bucket_aggregate(x, y, buckets=5, how="max")
+    assert list(by) == [3, 6]
+    assert bx[0] == 0
+
+
+def test_bucket_aggregate_rejects_unknown_aggregation():
+    with pytest.raises(ValueError):
+        bucket_aggregate(np.arange(20), np.arange(20), buckets=5, how="median")
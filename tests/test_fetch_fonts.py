@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from fetch_fonts import FONT_FILES, LICENSE_FILE, fetch_fonts, font_url
+
+LICENSE = b"SIL OPEN FONT LICENSE Version 1.1 - 26 February 2007"
+
+
+def fake_fetch(responses):
+    def fetch(url):
+        return responses.get(url, b"wOF2" + url.encode())
+    return fetch
+
+
+def test_writes_fonts_and_licence(tmp_path):
+    written = fetch_fonts(str(tmp_path), "https://cdn.test", fake_fetch({"https://cdn.test/LICENSE": LICENSE}))
+    assert sorted(os.path.basename(path) for path in written) == sorted([*FONT_FILES, LICENSE_FILE])
+    assert (tmp_path / "Montserrat-Bold.woff2").read_bytes() == b"wOF2" + font_url(700, "https://cdn.test").encode()
+    assert (tmp_path / LICENSE_FILE).read_bytes() == LICENSE
+
+
+def test_error_page_is_never_written_as_a_font(tmp_path):
+    responses = {font_url(600, "https://cdn.test"): b"<html>blocked</html>", "https://cdn.test/LICENSE": LICENSE}
+    with pytest.raises(ValueError, match="woff2"):
+        fetch_fonts(str(tmp_path), "https://cdn.test", fake_fetch(responses))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,132 @@
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import health_import
+from health_import import ImportFormatError, import_export, iter_apple_health, iter_csv, iter_json
+from health_store import HealthStore
+
+APPLE_EXPORT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <Record type="HKQuantityTypeIdentifierBodyMass" unit="lb" value="176.37" startDate="2024-01-01 08:00:00 +0000"/>
+ <Record type="HKQuantityTypeIdentifierBodyFatPercentage" unit="%" value="0.21" startDate="2024-01-01 08:00:00 +0000"/>
+ <Record type="HKQuantityTypeIdentifierDietaryEnergyConsumed" unit="kJ" value="8368" startDate="2024-01-02 08:00:00 +0000"/>
+ <Record type="HKQuantityTypeIdentifierFlightsClimbed" unit="count" value="3" startDate="2024-01-02 08:00:00 +0000"/>
+ <Correlation type="HKCorrelationTypeIdentifierFood">
+  <Record type="HKQuantityTypeIdentifierStepCount" unit="count" value="1200" startDate="2024-01-03 08:00:00 +0000"/>
+ </Correlation>
+ <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="30"/>
+</HealthData>
+"""
+
+
+def records(reader, data):
+    return list(reader(io.BufferedReader(io.BytesIO(data))))
+
+
+def test_apple_health_units_and_types():
+    rows = records(iter_apple_health, APPLE_EXPORT)
+    values = {metric: value for metric, _, value in rows}
+    assert set(values) == {"weight", "body_fat", "calories", "steps"}
+    assert values["weight"] == pytest.approx(80.0, abs=0.01)
+    assert values["body_fat"] == pytest.approx(21.0)
+    assert values["calories"] == pytest.approx(2000.0)
+
+
+def test_apple_health_detaches_processed_elements(monkeypatch):
+    roots = []
+    iterparse = ET.iterparse
+
+    def spy(*args, **kwargs):
+        for event, elem in iterparse(*args, **kwargs):
+            if not roots:
+                roots.append(elem)
+            yield event, elem
+
+    monkeypatch.setattr(health_import.ET, "iterparse", spy)
+    export = b"<HealthData>" + b"".join(
+        b'<Record type="HKQuantityTypeIdentifierStepCount" unit="count" value="%d" startDate="%d"/>' % (i, 1704096000 + i)
+        for i in range(20_000)
+    )
+    # iterparse works a read buffer ahead, so the root holds at most one buffer's worth of records
+    largest = 0
+    for count, _ in enumerate(iter_apple_health(io.BufferedReader(io.BytesIO(export + b"</HealthData>"))), 1):
+        largest = max(largest, len(roots[0]))
+    assert count == 20_000
+    assert largest < 2_000
+
+
+def test_apple_health_parse_error_is_a_format_error():
+    with pytest.raises(ImportFormatError, match="not valid XML"):
+        records(iter_apple_health, b"<HealthData><Record type='x'></HealthData>")
+
+
+def test_csv_wide_and_long_formats():
+    wide = records(iter_csv, b"Date,Weight (kg),Steps\n2024-01-01,80.5,1000\n")
+    assert sorted(m for m, _, _ in wide) == ["steps", "weight"]
+    long = records(iter_csv, b"timestamp,metric,value\n2024-01-01T08:00:00,bmi,22.1\n")
+    assert [(m, v) for m, _, v in long] == [("bmi", 22.1)]
+    with pytest.raises(ImportFormatError):
+        records(iter_csv, b"weight\n80\n")
+
+
+def test_csv_parse_error_is_a_format_error():
+    # A field past csv.field_size_limit() makes the csv module raise csv.Error
+    with pytest.raises(ImportFormatError, match="CSV"):
+        records(iter_csv, b'date,weight\n2024-01-01,"' + b"8" * 200_000 + b'"\n')
+
+
+def test_json_google_fit_points():
+    data = b'{"Data Source": "x", "Data Points": [{"dataTypeName": "com.google.weight", "startTimeNanos": 1704096000000000000, "fitValue": [{"value": {"fpVal": 79.5}}]}]}'
+    ((metric, ts, value),) = records(iter_json, data)
+    assert (metric, value) == ("weight", 79.5)
+    assert ts.year == 2024
+
+
+def test_json_buffer_is_capped_on_malformed_input(monkeypatch):
+    monkeypatch.setattr(health_import, "MAX_JSON_VALUE_CHARS", 4096)
+    # An unterminated string never decodes, however much more is read
+    with pytest.raises(ImportFormatError, match="no complete record"):
+        records(iter_json, b'[{"weight": "' + b"8" * 200_000 + b'"}]')
+
+
+def test_json_google_fit_preamble_within_the_cap(monkeypatch):
+    monkeypatch.setattr(health_import, "MAX_JSON_VALUE_CHARS", 4096)
+
+    def values(preamble):
+        data = b'{"Data Source": "' + b"x" * preamble + b'", "Data Points": [{"a": 1}]}'
+        # Small chunks, so "Data Points" is not in the first one
+        return list(health_import.iter_json_values(io.BufferedReader(io.BytesIO(data)), chunk_size=1024))
+
+    assert values(3000) == [{"a": 1}]
+    with pytest.raises(ImportFormatError, match="no complete record"):
+        values(10_000)
+
+
+def test_import_export_batches_and_dedupes(tmp_path):
+    store = HealthStore(str(tmp_path / "health.db"))
+    calls = []
+    csv_data = b"date,weight\n" + b"".join(b"2024-01-%02d,%d\n" % (d, 80 + d) for d in range(1, 11)) + b"2024-01-01,90\n"
+    summary = import_export(store, "u", io.BytesIO(csv_data), "export.csv", progress=lambda *a: calls.append(a), batch_size=4)
+    assert (summary["imported"], summary["duplicates"]) == (10, 1)
+    assert len(calls) >= 3
+    again = import_export(store, "u", io.BytesIO(csv_data), "export.csv")
+    assert again["imported"] == 0
+
+
+def test_import_export_zip(tmp_path):
+    store = HealthStore(str(tmp_path / "health.db"))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("apple_health_export/export.xml", APPLE_EXPORT)
+    buffer.seek(0)
+    summary = import_export(store, "u", buffer, "export.zip")
+    assert summary["imported"] == 4
+
+
+def test_import_export_bad_zip_is_a_format_error(tmp_path):
+    store = HealthStore(str(tmp_path / "health.db"))
+    with pytest.raises(ImportFormatError, match="zip"):
+        import_export(store, "u", io.BytesIO(b"not a zip archive"), "export.zip")
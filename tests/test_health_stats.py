@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from health_stats import SECONDS_PER_DAY, RollingStats, generate_insights
+from health_store import HealthStore
+
+DAY = int(SECONDS_PER_DAY)
+START = 1704067200
+
+
+def test_window_matches_numpy():
+    rng = np.random.default_rng(7)
+    values = 70 + rng.normal(0, 1, 100) + np.arange(100) * 0.05
+    stats = RollingStats(window=30)
+    for i, value in enumerate(values):
+        stats.update(START + i * DAY, value)
+    tail = values[-30:]
+    assert stats.count == 100
+    assert stats.mean == pytest.approx(tail.mean())
+    assert stats.std == pytest.approx(tail.std(ddof=1))
+    assert stats.slope == pytest.approx(np.polyfit(np.arange(70, 100), tail, 1)[0])
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_out_of_order_update_is_rejected():
+    stats = RollingStats()
+    stats.update(START + DAY, 1.0)
+    with pytest.raises(ValueError):
+        stats.update(START, 2.0)
+
+
+def test_anomaly_after_enough_history():
+    stats = RollingStats()
+    for i in range(20):
+        assert not stats.update(START + i * DAY, 80.0 + (i % 2) * 0.2)
+    assert stats.update(START + 20 * DAY, 95.0)
+    assert stats.last_z > 3
+
+
+def test_json_round_trip_continues_identically():
+    a = RollingStats(window=5)
+    for i in range(12):
+        a.update(START + i * DAY, i * 1.5)
+    b = RollingStats.from_json(a.to_json())
+    for i in range(12, 20):
+        a.update(START + i * DAY, i * 1.5)
+        b.update(START + i * DAY, i * 1.5)
+    assert b.summary() == pytest.approx(a.summary())
+
+
+def test_store_rebuilds_stats_after_backfill(tmp_path):
+    store = HealthStore(str(tmp_path / "health.db"))
+    store.add_measurements("u", "bmi", [(START + i * DAY, 20.0 + i) for i in range(10, 20)])
+    store.add_measurements("u", "bmi", [(START + i * DAY, 20.0 + i) for i in range(10)])
+    summary = store.get_stats("u", "bmi")
+    assert summary["count"] == 20
+    assert summary["first_value"] == 20.0
+    assert summary["slope_per_day"] == pytest.approx(1.0)
+
+
+def test_insights_describe_trend_and_first_reading():
+    rising = RollingStats()
+    for i in range(10):
+        rising.update(START + i * DAY, 80 + i * 0.5)
+    single = RollingStats()
+    single.update(START, 22.0)
+    insights = generate_insights({"weight": rising.summary(), "bmi": single.summary(), "steps": None})
+    assert any("upward trend" in line and "weight" in line for line in insights)
+    assert any(line.startswith("Your first BMI reading is 22.0") for line in insights)
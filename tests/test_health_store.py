@@ -0,0 +1,55 @@
+import datetime
+
+import pytest
+
+from health_store import HealthStore, bucket_for, to_epoch
+
+DAY = 86400
+# Monday 2024-01-01 00:00 UTC
+MONDAY = 1704067200
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HealthStore(str(tmp_path / "health.db"))
+
+
+def test_to_epoch_accepts_dates_and_numbers():
+    assert to_epoch(MONDAY) == MONDAY
+    assert to_epoch(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)) == MONDAY
+    with pytest.raises(TypeError):
+        to_epoch("2024-01-01")
+
+
+def test_bucket_for_week_and_month():
+    assert bucket_for(MONDAY + 3 * DAY, "week") == "2024-01-01"
+    assert bucket_for(MONDAY + 40 * DAY, "month") == "2024-02-01"
+    with pytest.raises(ValueError):
+        bucket_for(MONDAY, "year")
+
+
+def test_duplicate_timestamps_are_ignored(store):
+    assert store.add_measurements("u", "bmi", [(MONDAY, 22.0), (MONDAY + DAY, 22.5)]) == 2
+    assert store.add_measurements("u", "bmi", [(MONDAY, 30.0)]) == 0
+    assert [v for _, v in store.get_measurements("u", "bmi")] == [22.0, 22.5]
+    assert store.count_measurements("u") == 2
+
+
+def test_rollups_follow_inserts(store):
+    store.add_measurements("u", "weight", [(MONDAY, 80.0), (MONDAY + DAY, 82.0), (MONDAY + 8 * DAY, 79.0)])
+    weeks = store.get_rollups("u", "weight", "week")
+    assert [w["count"] for w in weeks] == [2, 1]
+    assert weeks[0]["mean"] == 81.0
+    assert (weeks[0]["min"], weeks[0]["max"], weeks[0]["last"]) == (80.0, 82.0, 82.0)
+    (month,) = store.get_rollups("u", "weight", "month")
+    assert month["count"] == 3
+    assert store.version("u", "weight") == 3
+
+
+def test_measurements_are_per_user_and_metric(store):
+    store.add_measurement("a", "bmi", 22.0, ts=MONDAY)
+    store.add_measurement("b", "bmi", 25.0, ts=MONDAY)
+    store.add_measurement("a", "calories", 2100, ts=MONDAY)
+    assert store.get_measurements("a", "bmi")[0] == (datetime.datetime.fromtimestamp(MONDAY, datetime.timezone.utc), 22.0)
+    assert store.count_measurements("a") == 2
+    assert store.count_measurements("b", "calories") == 0
@@ -0,0 +1,136 @@
+import time
+import threading
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import MIN_CALL_SECONDS, LLMScheduler, QueueTimeout, priority_for
+
+LIMITS = {"interactive": 4, "report": 2, "background": 1, "batch": 1}
+
+
+def hold(scheduler, priority, started, release, deadline=None):
+    """Take a slot on a thread and keep it until `release` is set"""
+    def run():
+        with scheduler.slot(priority, deadline or time.monotonic() + 30):
+            started.append(priority)
+            release.wait(10)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_priority_for_kinds():
+    assert priority_for("question") == "interactive"
+    assert priority_for("report") == "report"
+    assert priority_for("summary") == "background"
+    assert priority_for("report", "batch") == "batch"
+
+
+def test_yields_the_time_left():
+    scheduler = LLMScheduler(total=4, reserved=1, limits=LIMITS)
+    with scheduler.slot("report", time.monotonic() + 10) as remaining:
+        assert 9 < remaining <= 10
+        assert scheduler.snapshot()["running"]["report"] == 1
+    assert scheduler.snapshot()["running"]["report"] == 0
+
+
+def test_class_limit_and_reserved_interactive_slots():
+    scheduler = LLMScheduler(total=3, reserved=1, limits=LIMITS)
+    release = threading.Event()
+    started = []
+    threads = [hold(scheduler, "report", started, release) for _ in range(3)]
+    wait_for(lambda: len(started) == 2)
+    # The third report waits (class limit), but the reserved slot still serves interactive calls
+    with scheduler.slot("interactive", time.monotonic() + 5):
+        assert scheduler.snapshot()["waiting"]["report"] == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert started == ["report"] * 3
+
+
+def test_better_class_goes_first():
+    scheduler = LLMScheduler(total=2, reserved=1, limits=dict(LIMITS, report=1, batch=1))
+    release = threading.Event()
+    started = []
+    blocker = hold(scheduler, "report", started, release)
+    wait_for(lambda: started == ["report"])
+    order = []
+    next_release = threading.Event()
+    waiting = [hold(scheduler, "batch", order, next_release), hold(scheduler, "report", order, next_release)]
+    wait_for(lambda: sum(scheduler.snapshot()["waiting"].values()) == 2)
+    release.set()
+    wait_for(lambda: len(order) == 1)
+    assert order == ["report"]
+    next_release.set()
+    for thread in [blocker, *waiting]:
+        thread.join(5)
+    assert order == ["report", "batch"]
+
+
+def test_queued_call_times_out_before_its_deadline():
+    scheduler = LLMScheduler(total=2, reserved=1, limits=dict(LIMITS, report=1))
+    release = threading.Event()
+    started = []
+    blocker = hold(scheduler, "report", started, release)
+    wait_for(lambda: started)
+    start = time.monotonic()
+    with pytest.raises(QueueTimeout) as excinfo:
+        with scheduler.slot("report", start + MIN_CALL_SECONDS + 0.2):
+            pass
+    assert time.monotonic() - start < 1.0
+    assert excinfo.value.retry_after >= 1.0
+    assert scheduler.snapshot()["waiting"]["report"] == 0
+    release.set()
+    blocker.join(5)
+
+
+def test_free_slot_still_refuses_a_call_with_too_little_time_left():
+    scheduler = LLMScheduler(total=4, reserved=1, limits=LIMITS)
+    for left in (MIN_CALL_SECONDS / 2, 0, -1):
+        with pytest.raises(QueueTimeout):
+            with scheduler.slot("interactive", time.monotonic() + left):
+                pytest.fail("started with less than MIN_CALL_SECONDS left")
+    assert scheduler.snapshot()["running"]["interactive"] == 0
+
+
+def test_tight_mode_pauses_background_and_halves_reports(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "MIN_CALL_SECONDS", 0.1)
+    scheduler = LLMScheduler(total=8, reserved=1, limits=dict(LIMITS, report=4))
+    scheduler.note_response(200, {"x-ratelimit-remaining-requests": "50"})
+    assert not scheduler.snapshot()["tight"]
+    scheduler.note_response(429, {"retry-after": "0.5"})
+    assert scheduler.snapshot()["tight"]
+    now = time.monotonic()
+    assert scheduler._limit("report", now) == 2
+    assert scheduler._limit("background", now) == 0
+    start = time.monotonic()
+    # Background calls resume once the retry-after period ends, without any release
+    with scheduler.slot("background", start + 5):
+        assert time.monotonic() - start >= 0.4
+
+
+def test_has_room_reflects_limits_queue_and_tight_mode():
+    scheduler = LLMScheduler(total=4, reserved=1, limits=LIMITS)
+    assert scheduler.has_room("background")
+    release = threading.Event()
+    started = []
+    thread = hold(scheduler, "background", started, release)
+    wait_for(lambda: started)
+    assert not scheduler.has_room("background")
+    assert scheduler.has_room("interactive")
+    release.set()
+    thread.join(5)
+    assert scheduler.has_room("background")
+    scheduler.note_response(429, {"retry-after": "30"})
+    assert not scheduler.has_room("background")
+    assert scheduler.has_room("report")
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+import requests
+
+from llm_transport import RecordingTransport, ReplayTransport, ReplayResponse, create_transport, fingerprint
+from mock_groq import start_mock_server
+
+PAYLOAD = {"model": "m", "messages": [{"role": "user", "content": "hello"}], "max_tokens": 30, "temperature": 0.7}
+
+
+@pytest.fixture
+def mock_url():
+    server, url = start_mock_server()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def test_fingerprint_ignores_key_and_url_but_not_messages():
+    assert fingerprint(PAYLOAD) == fingerprint(dict(PAYLOAD, user="x"))
+    assert fingerprint(PAYLOAD) != fingerprint(dict(PAYLOAD, messages=[{"role": "user", "content": "bye"}]))
+
+
+def test_record_then_replay(tmp_path, mock_url):
+    path = str(tmp_path / "groq.jsonl")
+    recorder = RecordingTransport(requests.Session(), path)
+    live = recorder.post(mock_url, {"Authorization": "Bearer k"}, PAYLOAD, timeout=10)
+    assert live.status_code == 200
+    assert recorder.served == 1
+
+    replay = ReplayTransport(path, speed=0)
+    replayed = replay.post("http://unused", {}, PAYLOAD, timeout=10)
+    assert replayed.json() == live.json()
+    assert replayed.headers["content-type"] == "application/json"
+    assert replay.served == 1
+    with pytest.raises(requests.ConnectionError, match="No recorded Groq response"):
+        replay.post("http://unused", {}, dict(PAYLOAD, max_tokens=31), timeout=10)
+
+
+def test_repeated_requests_replay_in_order(tmp_path):
+    path = tmp_path / "groq.jsonl"
+    key = fingerprint(PAYLOAD)
+    entries = [
+        {"fingerprint": key, "status": 429, "headers": {"retry-after": "1"}, "body": "{}"},
+        {"fingerprint": key, "status": 200, "headers": {}, "body": '{"n": 2}'},
+    ]
+    path.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+    replay = ReplayTransport(str(path))
+    statuses = [replay.post("", {}, PAYLOAD, 10).status_code for _ in range(3)]
+    assert statuses == [429, 200, 200]
+
+
+def test_recorded_timeouts_replay_as_timeouts(tmp_path):
+    path = tmp_path / "groq.jsonl"
+    path.write_text(json.dumps({"fingerprint": fingerprint(PAYLOAD), "error": "timeout", "elapsed": 30}) + "\n", encoding="utf-8")
+    with pytest.raises(requests.Timeout):
+        ReplayTransport(str(path)).post("", {}, PAYLOAD, 10)
+
+
+def test_replay_response_keeps_chunking():
+    response = ReplayResponse(200, {}, b"abcdef", [[0.0, 2], [0.01, 4]])
+    assert list(response.iter_content()) == [b"ab", b"cdef"]
+    assert response.text == "abcdef"
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        create_transport(requests.Session(), mode="proxy")
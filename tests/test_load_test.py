@@ -0,0 +1,66 @@
+import os
+import asyncio
+import random
+
+import pytest
+
+import load_test
+from load_test import SessionError, VirtualUser, add_queueing, find_saturation, process_cpu_seconds, process_rss
+
+
+def level(sessions, reruns_per_s, p95, steps=None):
+    return {"sessions": sessions, "reruns_per_s": reruns_per_s, "latency": {"p95": p95}, "steps": steps or {}}
+
+
+def test_find_saturation_stops_when_throughput_flattens():
+    levels = [level(1, 10, 0.1), level(2, 19, 0.12), level(4, 35, 0.2), level(8, 36, 0.25)]
+    assert find_saturation(levels) == 4
+
+
+def test_find_saturation_stops_when_latency_degrades():
+    levels = [level(1, 10, 0.1), level(2, 20, 0.2), level(4, 40, 0.5)]
+    assert find_saturation(levels) == 2
+
+
+def test_add_queueing_weights_by_step_count():
+    baseline = level(1, 10, 0.1, {"a": {"p50": 0.1, "count": 1}, "b": {"p50": 0.2, "count": 1}})
+    loaded = level(4, 30, 0.3, {"a": {"p50": 0.3, "count": 3}, "b": {"p50": 0.1, "count": 1}})
+    add_queueing(loaded, baseline)
+    assert abs(loaded["queueing_delay_s"] - 0.15) < 1e-9
+
+
+def test_process_metrics_for_this_process():
+    assert process_rss(os.getpid()) > 0
+    assert process_cpu_seconds(os.getpid()) >= 0
+    assert process_rss(None) is None
+
+
+class WaitingSession:
+    """Shows the waiting room for the first `polls` renders"""
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.reruns = 0
+
+    def waiting(self):
+        return self.reruns < self.polls
+
+    async def rerun(self, trigger=None):
+        self.reruns += 1
+
+
+def test_waiting_room_is_polled_until_admitted(monkeypatch):
+    monkeypatch.setattr(load_test, "ADMISSION_POLL_SECONDS", 0.01)
+    user = VirtualUser("ws://unused", random.Random(0), 0, 5, {})
+    session = WaitingSession(3)
+    waited = asyncio.run(user.wait_for_admission(session))
+    assert session.reruns == 3
+    assert waited >= 0.03
+    assert asyncio.run(user.wait_for_admission(WaitingSession(0))) == 0.0
+
+
+def test_waiting_room_gives_up_after_the_timeout(monkeypatch):
+    monkeypatch.setattr(load_test, "ADMISSION_POLL_SECONDS", 0.01)
+    user = VirtualUser("ws://unused", random.Random(0), 0, 0.05, {})
+    with pytest.raises(SessionError, match="waiting room"):
+        asyncio.run(user.wait_for_admission(WaitingSession(1000)))
@@ -0,0 +1,81 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+
+
+def lines_for(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    monkeypatch.setattr(metrics, "_counters", {})
+    metrics.inc("llm_requests_total", kind="report", status="200")
+    with metrics.timer("calculator_seconds"):
+        pass
+    assert metrics.render_prometheus() == "\n"
+
+
+def test_counters_with_labels(enabled):
+    metrics.inc("llm_requests_total", kind="report", status="200")
+    metrics.inc("llm_requests_total", 2, kind="report", status="200")
+    text = metrics.render_prometheus()
+    assert "# TYPE llm_requests_total counter" in text
+    assert 'llm_requests_total{kind="report",status="200"} 3' in text
+
+
+def test_label_values_are_escaped(enabled):
+    metrics.inc("rerun_total", page='say "hi"\n')
+    assert 'rerun_total{page="say \\"hi\\"\\n"} 1' in metrics.render_prometheus()
+
+
+def test_histogram_buckets_are_cumulative(enabled):
+    for seconds in (0.003, 0.2, 0.2, 4.0):
+        metrics.observe("rerun_seconds", seconds, page="home")
+    text = metrics.render_prometheus()
+    assert 'rerun_seconds_bucket{page="home",le="0.005"} 1' in text
+    assert 'rerun_seconds_bucket{page="home",le="0.25"} 3' in text
+    assert 'rerun_seconds_bucket{page="home",le="5"} 4' in text
+    assert 'rerun_seconds_count{page="home"} 4' in text
+    (total,) = lines_for(text, 'rerun_seconds_sum{page="home"}')
+    assert float(total.split()[-1]) == pytest.approx(4.403)
+
+
+def test_value_above_top_bucket_only_counts_in_inf(enabled):
+    metrics.observe("llm_request_seconds", 0.5, kind="report")
+    metrics.observe("llm_request_seconds", 90.0, kind="report")
+    text = metrics.render_prometheus()
+    assert 'llm_request_seconds_bucket{kind="report",le="60"} 1' in text
+    assert 'llm_request_seconds_bucket{kind="report",le="+Inf"} 2' in text
+    assert 'llm_request_seconds_sum{kind="report"} 90.5' in text
+    assert 'llm_request_seconds_count{kind="report"} 2' in text
+
+
+def test_timer_and_file_dump(enabled, tmp_path):
+    with metrics.timer("calculator_seconds", calculator="bmi"):
+        pass
+    path = tmp_path / "app.prom"
+    metrics.dump_to_file(str(path))
+    assert 'calculator_seconds_count{calculator="bmi"} 1' in path.read_text(encoding="utf-8")
+
+
+def test_histograms_with_their_own_buckets(enabled):
+    for questions in (0, 2, 3, 3, 12):
+        metrics.observe("consultation_questions", questions, buckets=(0, 1, 2, 3, 5, 10), mode="adaptive")
+    metrics.observe("consultation_seconds", 42.0, mode="adaptive")
+    text = metrics.render_prometheus()
+    assert 'consultation_questions_bucket{mode="adaptive",le="0"} 1' in text
+    assert 'consultation_questions_bucket{mode="adaptive",le="3"} 4' in text
+    assert 'consultation_questions_bucket{mode="adaptive",le="10"} 4' in text
+    assert 'consultation_questions_bucket{mode="adaptive",le="+Inf"} 5' in text
+    assert 'consultation_questions_sum{mode="adaptive"} 20' in text
+    assert not lines_for(text, 'consultation_questions_bucket{mode="adaptive",le="0.005"}')
+    # Other histograms keep the default seconds buckets
+    assert 'consultation_seconds_bucket{mode="adaptive",le="60"} 1' in text
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+import requests
+
+from consultation import parse_report_sections
+from mock_groq import MockGroqConfig, canned_reply, parse_latency, start_mock_server
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(**config):
+        server, url = start_mock_server(MockGroqConfig(**config))
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def chat(url, content="hello", max_tokens=512, **extra):
+    return requests.post(url, headers={"Authorization": "Bearer test"}, json={"messages": [{"role": "user", "content": content}], "max_tokens": max_tokens, **extra}, timeout=10)
+
+
+def test_parse_latency():
+    import random
+    rng = random.Random(0)
+    assert parse_latency("fixed:0.25")(rng) == 0.25
+    assert 1 <= parse_latency("uniform:1,2")(rng) <= 2
+    with pytest.raises(ValueError):
+        parse_latency("pareto:1")
+
+
+def test_canned_reply_is_deterministic_and_parseable():
+    messages = [{"role": "user", "content": "You are a Board-Certified Physician. Patient has a headache."}]
+    report = canned_reply(messages, 4096)
+    assert report == canned_reply(messages, 4096)
+    titles = [title for title, _ in parse_report_sections(report)]
+    assert len(titles) == 4 and "Critical Considerations" in titles[-1]
+    adaptive = json.loads(canned_reply([{"role": "user", "content": "Questions answered so far: 0"}], 60))
+    assert adaptive["sufficient"] is False and adaptive["question"]
+
+
+def test_server_answers_and_reports_usage(server):
+    srv, url = server()
+    r = chat(url)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["choices"][0]["message"]["content"]
+    assert body["usage"]["total_tokens"] > 0
+    # "ok" is counted after the response is written, "requests" before
+    assert srv.state.stats["requests"] == 1
+    assert requests.post(url, json={}, timeout=10).status_code == 401
+
+
+def test_rate_limit_returns_429_with_headers(server):
+    _, url = server(rpm_limit=2)
+    statuses = [chat(url).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    r = chat(url)
+    assert r.headers["x-ratelimit-remaining-requests"] == "0"
+    assert float(r.headers["retry-after"]) > 0
+
+
+def test_injected_errors(server):
+    _, url = server(error_5xx=1.0)
+    assert chat(url).status_code in (500, 503)
+
+
+def test_streaming_ends_with_done_and_usage(server):
+    _, url = server()
+    r = chat(url, stream=True)
+    events = [line[len("data: "):] for line in r.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    assert json.loads(events[-2])["x_groq"]["usage"]["completion_tokens"] > 0
+    content = "".join(json.loads(e)["choices"][0]["delta"].get("content", "") for e in events[:-1])
+    assert content
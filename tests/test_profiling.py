@@ -0,0 +1,60 @@
+import pstats
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def clean_windows(monkeypatch):
+    monkeypatch.setattr(profiling, "_windows", {})
+    yield
+    profiling.stop()
+
+
+def busy_function():
+    return sum(i * i for i in range(20_000))
+
+
+def profile_rerun(page):
+    profiling.start(page, enabled=True)
+    busy_function()
+    profiling.stop()
+
+
+def test_disabled_profiling_records_nothing():
+    profiling.start("home", enabled=False)
+    busy_function()
+    profiling.stop()
+    assert profiling.summary() == {}
+
+
+def test_window_summary_and_hotspots():
+    for _ in range(3):
+        profile_rerun("checkups")
+    assert profiling.summary()["checkups"]["count"] == 3
+    rows = profiling.hotspots("checkups", top=50, sort="cumtime")
+    busy = next(row for row in rows if row["function"].startswith("busy_function"))
+    assert busy["calls"] == 1
+    assert profiling.hotspots("missing") == []
+
+
+def test_window_keeps_last_profiles_only(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_WINDOW", 2)
+    for _ in range(5):
+        profile_rerun("lab")
+    assert profiling.summary()["lab"]["count"] == 2
+
+
+def test_start_closes_an_unfinished_rerun():
+    profiling.start("home", enabled=True)
+    profiling.start("lab", enabled=True)
+    profiling.stop()
+    assert set(profiling.summary()) == {"home", "lab"}
+
+
+def test_dump_profiles_writes_pstats_files(tmp_path):
+    profile_rerun("home")
+    (path,) = profiling.dump_profiles(str(tmp_path))
+    assert path.endswith(".prof")
+    assert pstats.Stats(path).total_calls > 0
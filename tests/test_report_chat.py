@@ -0,0 +1,80 @@
+import time
+
+import consultation
+import report_chat
+from report_chat import (
+    build_chat_messages, fallback_summary, fold_summary, report_digest, request_chat_reply
+)
+from token_budget import estimate_tokens
+
+REPORT = """### 📝 Initial Assessment
+- Likely **tension-type** headache.
+- Screen time is a trigger.
+
+### 💡 Professional Recommendations
+- Take regular breaks.
+- *Hydrate* through the day.
+"""
+
+
+def window(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " + "word " * 50})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "word " * 50})
+    return messages
+
+
+def test_digest_keeps_titles_and_points_without_markdown():
+    digest = report_digest(REPORT)
+    lines = digest.splitlines()
+    assert lines[0] == "📝 Initial Assessment: Likely tension-type headache.; Screen time is a trigger."
+    assert "*" not in digest
+    assert len(report_digest(REPORT * 50, max_tokens=100)) < len(REPORT * 50)
+
+
+def test_messages_fit_the_prompt_budget_by_dropping_oldest_turns():
+    digest = report_digest(REPORT)
+    messages = build_chat_messages("Physician", digest, "", window(10), "Can I take ibuprofen?", prompt_tokens=400)
+    assert estimate_tokens(messages) <= 400
+    assert messages[0]["role"] == "system" and digest in messages[0]["content"]
+    assert messages[-1] == {"role": "user", "content": "Can I take ibuprofen?"}
+    assert "question 9" in messages[-3]["content"]
+    assert not any("question 0 " in m["content"] for m in messages)
+
+
+def test_oversized_question_keeps_its_end():
+    question = "filler " * 2000 + "is it serious?"
+    messages = build_chat_messages("Physician", "short digest", "", [], question, prompt_tokens=200)
+    assert messages[-1]["content"].endswith("is it serious?")
+    assert len(messages[-1]["content"]) <= 400
+
+
+def test_summary_is_included_when_present():
+    messages = build_chat_messages("Physician", "digest", "Patient takes aspirin.", [], "ok?")
+    assert "EARLIER IN THIS CONVERSATION:\nPatient takes aspirin." in messages[0]["content"]
+
+
+def test_fallback_summary_is_bounded():
+    summary = ""
+    for i in range(20):
+        summary = fallback_summary(summary, window(2))
+    assert estimate_tokens([{"content": summary}]) <= 200 + 4
+
+
+def test_chat_and_summary_against_mock(mock_groq):
+    reply = request_chat_reply("test-key", "Physician", report_digest(REPORT), "", window(1), "Should I worry?")
+    assert reply
+    summary = fold_summary("test-key", "", window(2))
+    assert summary.startswith("Patient asked")
+
+
+def test_fold_does_not_wait_for_a_background_slot_when_tight(monkeypatch):
+    def no_call(*args, **kwargs):
+        raise AssertionError("fold_summary called Groq while the scheduler was tight")
+
+    monkeypatch.setattr(report_chat, "groq_chat", no_call)
+    monkeypatch.setattr(consultation._scheduler, "tight_until", time.monotonic() + 30)
+    started = time.monotonic()
+    assert fold_summary("test-key", "", window(2)) == fallback_summary("", window(2))
+    assert time.monotonic() - started < 1
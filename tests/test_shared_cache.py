@@ -0,0 +1,84 @@
+import time
+import threading
+
+import pytest
+
+from shared_cache import MemoryCache, SQLiteCache, create_cache, decode, encode, make_key
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    return create_cache(request.param, str(tmp_path / "cache.db"))
+
+
+def test_make_key_is_stable_and_namespaced():
+    assert make_key("llm", "model", [{"a": 1}]) == make_key("llm", "model", [{"a": 1}])
+    assert make_key("llm", "model", 1) != make_key("llm", "model", 2)
+    assert make_key("report_html", "x").startswith("report_html:")
+
+
+def test_encode_compresses_large_values():
+    assert encode("small")[:1] == b"p"
+    blob = encode("x" * 10_000)
+    assert blob[:1] == b"z" and len(blob) < 200
+    assert decode(blob) == "x" * 10_000
+
+
+def test_set_get_delete_and_ttl(cache):
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == {"v": 1}
+    cache.delete("k")
+    assert cache.get("k", "missing") == "missing"
+    cache.set("short", 1, ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+
+
+def test_get_or_compute_computes_once_across_threads(cache):
+    calls = []
+    barrier = threading.Barrier(4)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get_or_compute("llm:key", compute, ttl=60))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["answer"] * 4
+    assert len(calls) == 1
+
+
+def test_store_if_keeps_values_out(cache):
+    assert cache.get_or_compute("k", lambda: ("cut short", False), store_if=lambda v: v[1]) == ("cut short", False)
+    assert cache.get("k") is None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteCache(path).set("k", [1, 2, 3])
+    assert SQLiteCache(path).get("k") == [1, 2, 3]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_cache("redis")
@@ -0,0 +1,71 @@
+import time
+import threading
+
+import numpy as np
+import pytest
+
+import similar_reports
+from similar_reports import SimilarityIndex, consultation_text, normalize, refresh_in_background, signature
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SimilarityIndex(str(tmp_path / "similar.db"))
+
+
+def test_normalize_folds_wording():
+    assert normalize("I've had headaches for one week") == normalize("headache for 1 weeks")
+    assert normalize("no fever") == ["not_fever"]
+
+
+def test_signature_similarity_tracks_word_overlap():
+    a = signature("persistent headache afternoon screen")
+    assert signature("persistent headache afternoon screen").tolist() == a.tolist()
+    unrelated = signature("knee swelling after running")
+    assert (a == unrelated).mean() < 0.2
+    assert signature("").dtype == np.uint32
+
+
+def test_find_reuses_reports_within_a_specialty(index):
+    index.add("Physician", consultation_text("Headache for a week", ["Afternoons"]), "report A")
+    match = index.find("Physician", consultation_text("I've had headaches for one week", ["afternoon"]), threshold=0.8)
+    assert match["report"] == "report A"
+    assert match["similarity"] == 1.0
+    assert index.find("Dentist", "Headache for a week", threshold=0.8) is None
+    assert index.find("Physician", "Knee swelling after running", threshold=0.8) is None
+
+
+def test_negation_prevents_a_match(index):
+    index.add("Physician", "cough with fever", "report")
+    assert index.find("Physician", "cough without fever", threshold=0.8) is None
+
+
+def test_other_replicas_rows_are_picked_up(tmp_path):
+    path = str(tmp_path / "similar.db")
+    reader = SimilarityIndex(path)
+    assert reader.find("Physician", "back pain", threshold=0.5) is None
+    SimilarityIndex(path).add("Physician", "back pain", "shared report")
+    assert reader.find("Physician", "back pain", threshold=0.5)["report"] == "shared report"
+
+
+def test_prefers_newest_of_equal_matches(index):
+    index.add("Physician", "back pain", "old")
+    newest = index.add("Physician", "back pain", "new")
+    assert index.find("Physician", "back pain", threshold=0.5)["id"] == newest
+
+
+def test_refresh_only_for_stale_matches(index, monkeypatch):
+    monkeypatch.setattr(similar_reports, "NEAR_DUPLICATE_REFRESH_DAYS", 7)
+    assert not refresh_in_background(index, {"id": 1, "age_days": 1}, "Physician", "back pain", lambda: "new")
+    done = threading.Event()
+
+    def generate():
+        done.set()
+        return "fresh report"
+
+    assert refresh_in_background(index, {"id": 2, "age_days": 30}, "Physician", "back pain", generate)
+    assert done.wait(5)
+    deadline = time.monotonic() + 5
+    while index.find("Physician", "back pain", threshold=0.5) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.find("Physician", "back pain", threshold=0.5)["report"] == "fresh report"
@@ -0,0 +1,36 @@
+import os
+import re
+import tomllib
+
+from fetch_fonts import FONT_FILES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_config():
+    with open(os.path.join(ROOT, ".streamlit", "config.toml"), "rb") as f:
+        return tomllib.load(f)
+
+
+def test_theme_has_a_system_font_fallback():
+    config = load_config()
+    assert config["server"]["enableStaticServing"] is True
+    assert config["theme"]["font"].split(",")[-1].strip() == "sans-serif"
+
+
+def test_static_urls_point_at_existing_files():
+    """Anything served from app/static/ must exist under ./static, or the browser gets a 404"""
+    with open(os.path.join(ROOT, "bot.py"), encoding="utf-8") as f:
+        bot_text = f.read()
+    urls = re.findall(r"app/static/([\w./-]+)", bot_text)
+    assert "theme.css" in urls
+    urls += [face["url"].removeprefix("app/static/") for face in load_config()["theme"].get("fontFaces", [])]
+    for url in urls:
+        assert os.path.isfile(os.path.join(ROOT, "static", url)), url
+
+
+def test_font_faces_match_the_fetched_files():
+    """The (possibly commented-out) font faces name exactly the files fetch_fonts.py writes"""
+    with open(os.path.join(ROOT, ".streamlit", "config.toml"), encoding="utf-8") as f:
+        config_text = f.read()
+    assert set(re.findall(r"app/static/fonts/([\w.-]+)", config_text)) == set(FONT_FILES)
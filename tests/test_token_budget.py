@@ -0,0 +1,66 @@
+import pytest
+
+from token_budget import WINDOW_SECONDS, BudgetExceeded, TokenGovernor, TokenWindow, estimate_tokens
+
+MESSAGES = [{"role": "user", "content": "x" * 400}]  # about 100 prompt tokens
+PROMPT = estimate_tokens(MESSAGES)
+
+
+def test_token_window_slides():
+    window = TokenWindow()
+    start = window.add(100, 1000.0)
+    later = window.add(50, 1030.0)
+    assert window.used(1059.0) == 150
+    window.adjust(start, -40, 1059.0)
+    assert window.used(1059.0) == 110
+    assert window.seconds_until_free(60, 1059.0) == pytest.approx(start + WINDOW_SECONDS - 1059.0)
+    assert window.seconds_until_free(100, 1059.0) == pytest.approx(later + WINDOW_SECONDS - 1059.0)
+    assert window.used(later + WINDOW_SECONDS) == 0
+
+
+def test_allow_then_settle_with_real_usage():
+    governor = TokenGovernor(session_limit=5000, global_limit=0, min_completion=100)
+    grant = governor.acquire("s", MESSAGES, 1000)
+    assert (grant.max_tokens, grant.reserved) == (1000, PROMPT + 1000)
+    assert governor.remaining("s") == {"session": 5000 - PROMPT - 1000, "global": None}
+    governor.settle(grant, {"prompt_tokens": PROMPT, "completion_tokens": 200})
+    assert governor.remaining("s")["session"] == 5000 - PROMPT - 200
+
+
+def test_shrinks_max_tokens_to_the_room_left():
+    governor = TokenGovernor(session_limit=PROMPT + 600, global_limit=0, min_completion=100)
+    grant = governor.acquire("s", MESSAGES, 4096)
+    assert grant.max_tokens == 600
+
+
+def test_session_exhausted_raises_with_retry_after():
+    governor = TokenGovernor(session_limit=PROMPT + 150, global_limit=0, min_completion=100)
+    governor.acquire("s", MESSAGES, 100)
+    with pytest.raises(BudgetExceeded) as excinfo:
+        governor.acquire("s", MESSAGES, 100)
+    assert excinfo.value.status == 429
+    assert 0 < excinfo.value.retry_after <= WINDOW_SECONDS
+    # Other sessions keep their own budget
+    assert governor.acquire("other", MESSAGES, 100).max_tokens == 100
+
+
+def test_fallback_model_when_global_budget_is_spent():
+    governor = TokenGovernor(session_limit=0, global_limit=PROMPT + 150, min_completion=100, fallback_model="small-model", max_wait=0)
+    governor.acquire("a", MESSAGES, 100, model="big-model")
+    grant = governor.acquire("b", MESSAGES, 100, model="big-model")
+    assert grant.model == "small-model"
+    assert not grant.counts_global
+
+
+def test_global_exhausted_without_fallback():
+    governor = TokenGovernor(session_limit=0, global_limit=PROMPT + 150, min_completion=100, max_wait=0)
+    governor.acquire("a", MESSAGES, 100)
+    with pytest.raises(BudgetExceeded, match="busy"):
+        governor.acquire("b", MESSAGES, 100)
+
+
+def test_release_returns_the_reservation():
+    governor = TokenGovernor(session_limit=5000, global_limit=0)
+    scope = governor.scope("s")
+    scope.release(scope.acquire(MESSAGES, 1000, "m"))
+    assert scope.remaining()["session"] == 5000
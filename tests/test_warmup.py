@@ -0,0 +1,77 @@
+import json
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+import warmup
+
+
+@pytest.fixture(autouse=True)
+def cold_state(monkeypatch):
+    monkeypatch.setattr(warmup, "_state", {"status": "cold", "checks": {}, "started_at": None, "finished_at": None})
+    monkeypatch.setattr(warmup, "_probe_started", False)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(port, path):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as r:
+            return r.status, json.load(r)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_models_url_follows_groq_url(monkeypatch):
+    monkeypatch.setattr(warmup.consultation, "GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
+    assert warmup.models_url() == "https://api.groq.com/openai/v1/models"
+
+
+def test_warm_up_with_a_reachable_api(mock_groq):
+    warmup.ensure_warm("test-key", background=False, port=0)
+    ready, state = warmup.readiness()
+    assert ready
+    assert state["status"] == "ready"
+    assert set(state["checks"]) == {"api_key", "pool", "templates", "charts"}
+    assert not warmup.key_rejected()
+
+
+def test_missing_key_is_misconfigured_and_not_ready():
+    warmup.warm_up("")
+    ready, state = warmup.readiness()
+    assert not ready
+    assert state["status"] == "misconfigured"
+    assert warmup.key_rejected()
+
+
+def test_unreachable_api_is_degraded_but_ready(monkeypatch):
+    monkeypatch.setattr(warmup.consultation, "GROQ_URL", f"http://127.0.0.1:{free_port()}/openai/v1/chat/completions")
+    warmup.warm_up("test-key")
+    ready, state = warmup.readiness()
+    assert ready
+    assert state["status"] == "degraded"
+    assert state["checks"]["api_key"]["ok"] is None
+
+
+def test_warm_up_runs_once():
+    warmup.warm_up("")
+    first = warmup.readiness()[1]["finished_at"]
+    warmup.warm_up("test-key")
+    assert warmup.readiness()[1]["finished_at"] == first
+
+
+def test_probe_endpoints():
+    port = free_port()
+    warmup.start_probe_server(port)
+    assert get(port, "/health") == (200, {"status": "alive"})
+    status, state = get(port, "/ready")
+    assert status == 503 and state["status"] == "cold"
+    warmup.warm_up("")
+    assert get(port, "/ready")[0] == 503
+    assert get(port, "/nope")[0] == 404
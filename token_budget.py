@@ -0,0 +1,217 @@
+import os
+import time
+import threading
+from collections import deque
+
+import metrics
+from consultation import GroqError, GROQ_MODEL
+
+# =============================
+# Token Budget Governor
+# =============================
+# Tracks tokens from each completion's `usage` block per session and for the
+# whole process over a sliding hour, and decides how a new call may run:
+#
+#   1. as requested, when both budgets have room
+#   2. with a smaller max_tokens, when the room left still fits a useful answer
+#   3. on GROQ_FALLBACK_MODEL (Groq rate-limits each model separately), when
+#      the global budget of the main model is spent
+#   4. after waiting up to TOKEN_BUDGET_MAX_WAIT seconds for the window to free up
+#
+# Otherwise the call is refused with BudgetExceeded. Tokens are reserved up
+# front from an estimate and settled with the real usage afterwards, so
+# concurrent calls can't overshoot together. A limit of 0 disables that budget.
+
+SESSION_TOKENS_PER_HOUR = int(os.getenv("TOKEN_BUDGET_SESSION_HOURLY", "20000"))
+GLOBAL_TOKENS_PER_HOUR = int(os.getenv("TOKEN_BUDGET_GLOBAL_HOURLY", "0"))
+MIN_COMPLETION_TOKENS = int(os.getenv("TOKEN_BUDGET_MIN_COMPLETION", "512"))
+MAX_WAIT_SECONDS = float(os.getenv("TOKEN_BUDGET_MAX_WAIT", "20"))
+FALLBACK_MODEL = os.getenv("GROQ_FALLBACK_MODEL", "")
+
+WINDOW_SECONDS = 3600
+BUCKET_SECONDS = 60
+
+
+class BudgetExceeded(GroqError):
+    """Refused before calling Groq because a token budget is spent"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message, status=429, retry_after=retry_after)
+
+
+def estimate_tokens(messages):
+    # Roughly four characters per token for English prompts
+    return sum(len(m.get("content") or "") for m in messages) // 4 + 4 * len(messages)
+
+
+class TokenWindow:
+    """Tokens used over a sliding hour, kept in one-minute buckets"""
+
+    def __init__(self):
+        self.buckets = deque()  # [bucket_start, tokens]
+        self.total = 0
+
+    def _expire(self, now):
+        while self.buckets and self.buckets[0][0] <= now - WINDOW_SECONDS:
+            self.total -= self.buckets.popleft()[1]
+
+    def add(self, tokens, now):
+        """Add tokens to the current bucket; returns the bucket start for later adjustment"""
+        start = now - now % BUCKET_SECONDS
+        if self.buckets and self.buckets[-1][0] == start:
+            self.buckets[-1][1] += tokens
+        else:
+            self.buckets.append([start, tokens])
+        self.total += tokens
+        return start
+
+    def adjust(self, bucket_start, delta, now):
+        """Correct an earlier reservation; a bucket that already expired is left alone"""
+        self._expire(now)
+        for bucket in self.buckets:
+            if bucket[0] == bucket_start:
+                bucket[1] += delta
+                self.total += delta
+                return
+
+    def used(self, now):
+        self._expire(now)
+        return max(self.total, 0)
+
+    def seconds_until_free(self, tokens, now):
+        """How long until at least `tokens` have aged out of the window"""
+        self._expire(now)
+        freed = 0
+        for start, count in self.buckets:
+            freed += count
+            if freed >= tokens:
+                return max(start + WINDOW_SECONDS - now, 0.0)
+        return float(WINDOW_SECONDS)
+
+
+class Grant:
+    """Permission for one call: the model and max_tokens to use and what was reserved"""
+
+    __slots__ = ("key", "model", "max_tokens", "reserved", "counts_global", "buckets")
+
+    def __init__(self, key, model, max_tokens, reserved, counts_global):
+        self.key = key
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reserved = reserved
+        self.counts_global = counts_global
+        self.buckets = {}
+
+
+class BudgetScope:
+    """A governor bound to one session, passed to consultation calls as `budget`"""
+
+    def __init__(self, governor, key):
+        self.governor = governor
+        self.key = key
+
+    def acquire(self, messages, max_tokens, model):
+        return self.governor.acquire(self.key, messages, max_tokens, model)
+
+    def settle(self, grant, usage):
+        self.governor.settle(grant, usage)
+
+    def release(self, grant):
+        self.governor.settle(grant, {})
+
+    def remaining(self):
+        return self.governor.remaining(self.key)
+
+
+class TokenGovernor:
+    """Per-session and global hourly token budgets for one process"""
+
+    def __init__(self, session_limit=SESSION_TOKENS_PER_HOUR, global_limit=GLOBAL_TOKENS_PER_HOUR,
+                 min_completion=MIN_COMPLETION_TOKENS, fallback_model=FALLBACK_MODEL, max_wait=MAX_WAIT_SECONDS):
+        self.session_limit = session_limit
+        self.global_limit = global_limit
+        self.min_completion = min_completion
+        self.fallback_model = fallback_model
+        self.max_wait = max_wait
+        self.sessions = {}
+        self.global_window = TokenWindow()
+        self.lock = threading.Lock()
+
+    def scope(self, key):
+        return BudgetScope(self, key)
+
+    def _session(self, key, now):
+        window = self.sessions.get(key)
+        if window is None:
+            if len(self.sessions) > 10000:
+                # Forget sessions with nothing left in their window
+                self.sessions = {k: w for k, w in self.sessions.items() if w.used(now)}
+            window = self.sessions[key] = TokenWindow()
+        return window
+
+    def remaining(self, key):
+        """Tokens left this hour: {"session": n, "global": n}, None where unlimited"""
+        with self.lock:
+            now = time.time()
+            return {
+                "session": max(self.session_limit - self._session(key, now).used(now), 0) if self.session_limit else None,
+                "global": max(self.global_limit - self.global_window.used(now), 0) if self.global_limit else None
+            }
+
+    def acquire(self, key, messages, max_tokens, model=None):
+        """Reserve tokens for one call; returns a Grant or raises BudgetExceeded"""
+        model = model or GROQ_MODEL
+        prompt = estimate_tokens(messages)
+        needed = min(max_tokens, self.min_completion)
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self.lock:
+                now = time.time()
+                session = self._session(key, now)
+                session_left = self.session_limit - session.used(now) if self.session_limit else float("inf")
+                global_left = self.global_limit - self.global_window.used(now) if self.global_limit else float("inf")
+
+                if session_left < prompt + needed:
+                    metrics.inc("llm_budget_decisions_total", decision="session_exhausted")
+                    raise BudgetExceeded(
+                        "You've reached this session's hourly usage limit. Please try again later.",
+                        retry_after=session.seconds_until_free(prompt + needed - session_left, now)
+                    )
+                room = min(session_left, global_left) - prompt
+                if room >= needed:
+                    allowed = int(min(max_tokens, room))
+                    decision = "allow" if allowed == max_tokens else "shrink"
+                    grant = Grant(key, model, allowed, prompt + allowed, counts_global=True)
+                elif self.fallback_model and self.fallback_model != model:
+                    allowed = int(min(max_tokens, session_left - prompt))
+                    decision = "fallback_model"
+                    grant = Grant(key, self.fallback_model, allowed, prompt + allowed, counts_global=False)
+                else:
+                    grant = None
+                    wait = self.global_window.seconds_until_free(prompt + needed - global_left, now)
+
+                if grant is not None:
+                    grant.buckets["session"] = session.add(grant.reserved, now)
+                    if grant.counts_global:
+                        grant.buckets["global"] = self.global_window.add(grant.reserved, now)
+                    metrics.inc("llm_budget_decisions_total", decision=decision)
+                    return grant
+
+            if time.monotonic() + wait > deadline:
+                metrics.inc("llm_budget_decisions_total", decision="global_exhausted")
+                raise BudgetExceeded(
+                    "The service is busy right now. Please try again in a few minutes.",
+                    retry_after=wait
+                )
+            metrics.inc("llm_budget_decisions_total", decision="queued")
+            time.sleep(max(min(wait, deadline - time.monotonic()), 0.05))
+
+    def settle(self, grant, usage):
+        """Replace the reservation with the tokens Groq reports (none when the call failed)"""
+        used = int(usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)))
+        delta = used - grant.reserved
+        with self.lock:
+            now = time.time()
+            self._session(grant.key, now).adjust(grant.buckets["session"], delta, now)
+            if grant.counts_global:
+                self.global_window.adjust(grant.buckets["global"], delta, now)
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+import consultation
+from llm_transport import GROQ_TRANSPORT
+
+# =============================
+# Startup Warm-up and Readiness
+# =============================
+# One warm-up per process, before (serve.py) or alongside (plain
+# `streamlit run bot.py`) the first session:
+#
+#   config     resolve GROQ_API_KEY once (Streamlit secrets, then environment)
+#   api_key    validate it against Groq's /models endpoint
+#   pool       open WARMUP_CONNECTIONS pooled keep-alive connections
+#   templates  build every specialty prompt and compile the report regexes
+#   charts     build the Altair chart types once so schemas are loaded
+#
+# With READINESS_PORT set, /health answers 200 while the process is up and
+# /ready answers 200 only once warm-up has finished with a usable key, so the
+# load balancer sends traffic to warm replicas only. An unreachable Groq API
+# makes the replica "degraded" but still ready: the Medical Lab keeps working.
+
+READINESS_PORT = int(os.getenv("READINESS_PORT", "0") or 0)
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+WARMUP_TIMEOUT = 10
+
+SPECIALTIES = ["Nutritionist", "Physician", "Mental Health", "Orthopedic", "Dentist", "General"]
+
+_lock = threading.Lock()
+_state = {"status": "cold", "checks": {}, "started_at": None, "finished_at": None}
+
+
+def resolve_api_key():
+    """GROQ_API_KEY from Streamlit secrets, falling back to the environment"""
+    try:
+        import streamlit as st
+        key = st.secrets.get("GROQ_API_KEY", "")
+    except Exception:
+        key = ""
+    return key or os.getenv("GROQ_API_KEY", "")
+
+
+def models_url():
+    return consultation.GROQ_URL.rsplit("/chat/completions", 1)[0] + "/models"
+
+
+def _check(name, action):
+    start = time.perf_counter()
+    try:
+        ok, detail = action()
+    except Exception as e:
+        ok, detail = False, f"{type(e).__name__}: {e}"
+    with _lock:
+        _state["checks"][name] = {"ok": ok, "detail": detail, "seconds": round(time.perf_counter() - start, 3)}
+    return ok
+
+
+def validate_key(api_key):
+    if not api_key:
+        return False, "GROQ_API_KEY is not set"
+    if GROQ_TRANSPORT != "live":
+        return True, "not checked in record/replay mode"
+    try:
+        r = consultation._session.get(models_url(), headers={"Authorization": f"Bearer {api_key}"}, timeout=WARMUP_TIMEOUT)
+    except requests.RequestException as e:
+        return None, f"Groq API unreachable: {e}"
+    if r.status_code in (401, 403):
+        return False, f"Groq rejected the API key (HTTP {r.status_code})"
+    if r.status_code != 200:
+        return None, f"Groq API returned HTTP {r.status_code}"
+    return True, "valid"
+
+
+def open_connections(api_key, count=WARMUP_CONNECTIONS):
+    """Establish `count` keep-alive connections (TLS included) in the shared pool"""
+    def touch(_):
+        r = consultation._session.get(models_url(), headers={"Authorization": f"Bearer {api_key}"}, timeout=WARMUP_TIMEOUT)
+        r.content  # read fully so the connection returns to the pool
+        return r.status_code
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        statuses = list(pool.map(touch, range(count)))
+    return True, f"{len(statuses)} connections to {models_url().split('/')[2]}"
+
+
+def preload_templates():
+    for specialty in SPECIALTIES:
+        consultation.get_specialty_prompt(specialty, {}, "warm-up", ["warm-up"])
+        consultation.get_follow_up_prompt(specialty, "warm-up", [], 1)
+        consultation.get_adaptive_follow_up_prompt(specialty, "warm-up", [], 1, consultation.MAX_FOLLOW_UP_QUESTIONS)
+    sample = "### 📝 Initial Assessment\n- a\n### 💡 Professional Recommendations\n- **b**\n"
+    consultation.parse_report_sections(sample)
+    consultation.parse_follow_up('{"sufficient": false, "question": "warm-up"}')
+    consultation.report_html(sample)
+    consultation.generate_report_download(sample, "General")
+    return True, f"{len(SPECIALTIES)} specialties"
+
+
+def preload_chart_assets():
+    import altair as alt
+    import pandas as pd
+    frame = pd.DataFrame({"Date": pd.to_datetime(["2024-01-01", "2024-01-08"]), "Value": [1.0, 2.0], "Readings": [1, 1]})
+    for mark in (alt.Chart(frame).mark_line(point=True), alt.Chart(frame).mark_bar()):
+        mark.encode(x="Date:T", y="Value:Q", tooltip=["Date:T", "Value:Q", "Readings:Q"]).properties(height=300).to_dict()
+    return True, "line and bar charts"
+
+
+def warm_up(api_key):
+    """Run every warm-up step once per process; later calls do nothing"""
+    with _lock:
+        if _state["status"] != "cold":
+            return
+        _state.update(status="warming", started_at=time.time())
+
+    if _check("api_key", lambda: validate_key(api_key)) and GROQ_TRANSPORT == "live":
+        _check("pool", lambda: open_connections(api_key))
+    _check("templates", preload_templates)
+    _check("charts", preload_chart_assets)
+
+    with _lock:
+        key_ok = _state["checks"]["api_key"]["ok"]
+        if key_ok is False:
+            status = "misconfigured"
+        elif key_ok is None or not all(c["ok"] for c in _state["checks"].values()):
+            status = "degraded"
+        else:
+            status = "ready"
+        _state.update(status=status, finished_at=time.time())
+
+
+def ensure_warm(api_key, background=True, port=READINESS_PORT):
+    """Start the readiness probe and warm-up once; optionally wait for warm-up to finish"""
+    start_probe_server(port)
+    with _lock:
+        started = _state["status"] != "cold"
+    if not started:
+        if background:
+            threading.Thread(target=warm_up, args=(api_key,), name="warm-up", daemon=True).start()
+        else:
+            warm_up(api_key)
+
+
+def key_rejected():
+    with _lock:
+        return _state["checks"].get("api_key", {}).get("ok") is False and _state["status"] != "warming"
+
+
+def readiness():
+    """(ready, state) where ready means warm and holding a usable key"""
+    with _lock:
+        state = json.loads(json.dumps(_state))
+    return state["status"] in ("ready", "degraded"), state
+
+
+class _ProbeHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/health":
+            self._send(200, {"status": "alive"})
+        elif path == "/ready":
+            ready, state = readiness()
+            self._send(200 if ready else 503, state)
+        else:
+            self._send(404, {"error": "not found"})
+
+
+_probe_started = False
+
+
+def start_probe_server(port=READINESS_PORT):
+    global _probe_started
+    with _lock:
+        if _probe_started or not port:
+            return
+        _probe_started = True
+    server = ThreadingHTTPServer(("0.0.0.0", port), _ProbeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="readiness-probe", daemon=True).start()